@@ -1,4 +1,5 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, g
+from flask.json.provider import DefaultJSONProvider
 import logging
 import os
 import json
@@ -7,10 +8,29 @@ from datetime import datetime
 from config import Config
 from modules.ai.generator import AIContentGenerator
 from modules.maimai.api import MaimaiAPI
+from modules.database.base_dao import DEFAULT_PAGE_SIZE, CompactRecord
+from modules.database.manager import local_now, parse_datetime, serialize_datetime
+
+
+class AppJSONProvider(DefaultJSONProvider):
+    """
+    JSON输出：DAO返回的原生datetime在这里统一格式化为带业务时区偏移的ISO字符串（Flask默认为GMT格式），
+    紧凑记录（CompactRecord）输出为对象
+    """
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, datetime):
+            return serialize_datetime(o)
+        if isinstance(o, CompactRecord):
+            return o.as_dict()
+        return DefaultJSONProvider.default(o)
+
 
 # 创建Flask应用
 app = Flask(__name__, static_folder='static', static_url_path='/static')
 app.config.from_object(Config)
+app.json = AppJSONProvider(app)
 
 # 配置日志
 if not os.path.exists('logs'):
@@ -163,6 +183,22 @@ scheduled_publisher = ScheduledPublisher(scheduled_posts_store, maimai_api)
 daily_request_scheduler = get_database_scheduler(scheduled_requests_store)
 
 
+# N+1查询检测：每个请求作为一个检测作用域（DB_NPLUSONE=warn/raise 开启）
+from modules.database import nplusone
+
+
+@app.before_request
+def start_query_scope():
+    """请求开始时开启N+1检测作用域"""
+    g.query_scope = nplusone.start_scope(f"{request.method} {request.path}")
+
+
+@app.teardown_request
+def finish_query_scope(exc):
+    """请求结束时关闭N+1检测作用域"""
+    nplusone.finish_scope(g.pop('query_scope', None))
+
+
 @app.route('/')
 def index():
     """主页"""
@@ -327,14 +363,49 @@ def get_topic_info():
         return jsonify({'success': False, 'error': f'获取话题信息时发生错误：{str(e)}'}), 500
 
 
+def get_page_args():
+    """
+    解析列表接口的分页参数 cursor 和 limit
+    
+    两者都未提供时返回 None，表示返回全部数据（兼容旧前端）；limit 不是整数时抛出 ValueError
+    """
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit')
+    if cursor is None and limit is None:
+        return None
+    if not limit:
+        return cursor, DEFAULT_PAGE_SIZE
+    try:
+        return cursor, int(limit)
+    except ValueError:
+        raise ValueError(f"无效的limit参数: {limit}")
+
+
+def get_list_columns():
+    """解析列表接口的 fields 参数（逗号分隔的字段名），未提供时返回 None 表示全部字段"""
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
+
 # ===== 话题管理API =====
 
 @app.route('/api/topics', methods=['GET'])
 def get_topics():
-    """获取所有话题"""
+    """获取话题列表，支持 cursor/limit 游标分页"""
     try:
-        topics = topic_store.get_all_topics()
+        page_args = get_page_args()
+        columns = get_list_columns()
+        if page_args:
+            topics, next_cursor = topic_store.get_topics_page(*page_args, columns=columns)
+            return jsonify({'success': True, 'data': topics, 'next_cursor': next_cursor})
+        
+        # 全量列表直接交给 jsonify，使用紧凑记录减少大结果集的内存分配
+        topics = topic_store.get_all_topics(columns, compact=True)
         return jsonify({'success': True, 'data': topics})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         logger.error(f"获取话题列表失败: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -628,14 +699,23 @@ def schedule_publish():
 
 @app.route('/api/scheduled-posts', methods=['GET'])
 def get_scheduled_posts():
-    """获取所有定时发布任务"""
+    """获取定时发布任务，支持 cursor/limit 游标分页"""
     try:
-        posts = scheduled_posts_store.get_all_posts()
+        page_args = get_page_args()
+        columns = get_list_columns()
+        next_cursor = None
+        if page_args:
+            posts, next_cursor = scheduled_posts_store.get_posts_page(*page_args, columns=columns)
+        else:
+            posts = scheduled_posts_store.get_all_posts(columns, compact=True)
         return jsonify({
             'success': True,
             'data': posts,
+            'next_cursor': next_cursor,
             'pending_count': scheduled_posts_store.get_pending_count()
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         logger.error(f"获取定时发布任务异常：{str(e)}")
         return jsonify({'success': False, 'error': f'获取定时发布任务时发生错误：{str(e)}'}), 500
@@ -672,19 +752,12 @@ def update_scheduled_post(post_id):
         scheduled_at_str = data.get('scheduled_at')
 
         # 如果提供了scheduled_at，转换为datetime对象
+        # 支持ISO格式（前端datetime-local发送的格式）和 YYYY-MM-DD HH:MM:SS，带时区的时间转换为业务时区本地时间
         scheduled_at = None
         if scheduled_at_str:
-            try:
-                # 支持多种日期格式
-                from datetime import datetime
-                # 尝试ISO格式（前端datetime-local发送的格式）
-                scheduled_at = datetime.fromisoformat(scheduled_at_str.replace('Z', '+00:00'))
-            except ValueError:
-                try:
-                    # 尝试标准格式 YYYY-MM-DD HH:MM:SS
-                    scheduled_at = datetime.strptime(scheduled_at_str, '%Y-%m-%d %H:%M:%S')
-                except ValueError:
-                    return jsonify({'success': False, 'error': '日期格式错误，请使用ISO格式或YYYY-MM-DD HH:MM:SS'}), 400
+            scheduled_at = parse_datetime(scheduled_at_str)
+            if scheduled_at is None:
+                return jsonify({'success': False, 'error': '日期格式错误，请使用ISO格式或YYYY-MM-DD HH:MM:SS'}), 400
 
         success = scheduled_posts_store.update_post(post_id, title, content, scheduled_at)
         if not success:
@@ -729,24 +802,40 @@ def reschedule_post(post_id):
 
 # ===== 自动发布管理API =====
 
+def attach_topic_info(configs):
+    """为自动发布配置批量添加话题名称和分组（一次查询所有话题）"""
+    topic_ids = [config.get('topic_id') for config in configs if config.get('topic_id')]
+    topics = topic_store.get_topics_by_ids(topic_ids, ['id', 'name', 'group_name'])
+    for config in configs:
+        topic_id = config.get('topic_id')
+        if topic_id:
+            topic_data = topics.get(topic_id)
+            config['topic_name'] = topic_data.get('name', '') if topic_data else ''
+            config['topic_group'] = topic_data.get('group_name', '') if topic_data else ''
+
+
 @app.route('/api/auto-publish', methods=['GET'])
 def get_auto_publish_configs():
-    """获取所有自动发布配置"""
+    """获取自动发布配置，支持 cursor/limit 游标分页"""
     try:
-        configs = auto_publish_store.get_all_configs()
+        page_args = get_page_args()
+        columns = get_list_columns()
+        next_cursor = None
+        if page_args:
+            configs, next_cursor = auto_publish_store.get_configs_page(*page_args, columns=columns)
+        else:
+            configs = auto_publish_store.get_all_configs(columns)
         
-        # 为每个配置添加话题信息
-        for config in configs:
-            topic_id = config.get('topic_id')
-            if topic_id:
-                topic_data = topic_store.get_topic(topic_id)
-                config['topic_name'] = topic_data.get('name', '') if topic_data else ''
-                config['topic_group'] = topic_data.get('group_name', '') if topic_data else ''
+        # 为每个配置添加话题信息（一次批量查询）
+        attach_topic_info(configs)
         
         return jsonify({
             'success': True,
-            'data': configs
+            'data': configs,
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         logger.error(f"获取自动发布配置失败: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -842,11 +931,7 @@ def update_auto_publish_config(config_id):
             updated_config = auto_publish_store.get_config(config_id)
             
             # 添加话题信息
-            topic_id = updated_config.get('topic_id')
-            if topic_id:
-                topic_data = topic_store.get_topic(topic_id)
-                updated_config['topic_name'] = topic_data.get('name', '') if topic_data else ''
-                updated_config['topic_group'] = topic_data.get('group_name', '') if topic_data else ''
+            attach_topic_info([updated_config])
             
             return jsonify({
                 'success': True,
@@ -901,16 +986,12 @@ def toggle_auto_publish_config(config_id):
             updated_config = auto_publish_store.get_config(config_id)
             
             # 添加话题信息
-            topic_id = updated_config.get('topic_id')
-            if topic_id:
-                topic_data = topic_store.get_topic(topic_id)
-                updated_config['topic_name'] = topic_data.get('name', '') if topic_data else ''
-                updated_config['topic_group'] = topic_data.get('group_name', '') if topic_data else ''
+            attach_topic_info([updated_config])
             
             # 如果是激活配置，检查是否需要启动自动发布循环
             if is_active:
                 # 检查该配置是否有待发布的内容（包括未到发布时间的）
-                all_pending_posts = scheduled_posts_store.get_all_pending_posts()
+                all_pending_posts = scheduled_posts_store.get_all_pending_posts(['id', 'auto_publish_id'])
                 has_pending_for_config = any(
                     post.get('auto_publish_id') == config_id
                     for post in all_pending_posts
@@ -967,11 +1048,7 @@ def reset_auto_publish_posts(config_id):
             updated_config = auto_publish_store.get_config(config_id)
             
             # 添加话题信息
-            topic_id = updated_config.get('topic_id')
-            if topic_id:
-                topic_data = topic_store.get_topic(topic_id)
-                updated_config['topic_name'] = topic_data.get('name', '') if topic_data else ''
-                updated_config['topic_group'] = topic_data.get('group_name', '') if topic_data else ''
+            attach_topic_info([updated_config])
             
             return jsonify({
                 'success': True,
@@ -992,13 +1069,8 @@ def get_publishable_configs():
     try:
         configs = auto_publish_store.get_publishable_configs()
         
-        # 为每个配置添加话题信息
-        for config in configs:
-            topic_id = config.get('topic_id')
-            if topic_id:
-                topic_data = topic_store.get_topic(topic_id)
-                config['topic_name'] = topic_data.get('name', '') if topic_data else ''
-                config['topic_group'] = topic_data.get('group_name', '') if topic_data else ''
+        # 为每个配置添加话题信息（一次批量查询）
+        attach_topic_info(configs)
         
         return jsonify({
             'success': True,
@@ -1013,11 +1085,13 @@ def get_publishable_configs():
 def get_conversation_history(topic_id):
     """获取话题的AI对话历史"""
     try:
-        conversations = auto_publish_store.get_conversation_history(topic_id)
+        conversations = auto_publish_store.get_conversation_history(topic_id, get_list_columns())
         return jsonify({
             'success': True,
             'data': conversations
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         logger.error(f"获取对话历史失败: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1567,7 +1641,7 @@ def remove_keyword_from_group(group_name, keyword):
 
 @app.route('/api/drafts', methods=['GET'])
 def get_drafts():
-    """获取所有草稿"""
+    """获取草稿列表，支持 cursor/limit 游标分页"""
     try:
         from modules.database.dao import DraftDAO
         draft_dao = DraftDAO()
@@ -1576,18 +1650,29 @@ def get_drafts():
         source = request.args.get('source')
         topic_id = request.args.get('topic_id')
 
+        conditions = {}
         if source:
-            drafts = draft_dao.find_by_source(source)
+            conditions['source'] = source
         elif topic_id:
-            drafts = draft_dao.find_by_topic_id(topic_id)
+            conditions['topic_id'] = topic_id
+
+        page_args = get_page_args()
+        columns = get_list_columns()
+        next_cursor = None
+        if page_args:
+            drafts, next_cursor = draft_dao.find_page(('created_at', 'id'), *page_args, conditions=conditions,
+                                                      descending=True, columns=columns)
         else:
-            drafts = draft_dao.find_all(order_by='created_at DESC')
+            drafts = draft_dao.find_all(conditions, 'created_at DESC', columns=columns)
 
         return jsonify({
             'success': True,
             'data': drafts,
-            'count': len(drafts)
+            'count': len(drafts),
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         logger.error(f"获取草稿列表失败: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1810,7 +1895,7 @@ def batch_publish_drafts():
     """批量发布草稿（立即发布或定时发布）"""
     try:
         from modules.database.dao import DraftDAO
-        from datetime import datetime, timedelta
+        from datetime import timedelta
         import random
 
         data = request.get_json()
@@ -1836,11 +1921,14 @@ def batch_publish_drafts():
             'failed': []
         }
 
+        # 一次查询所有草稿
+        drafts = draft_dao.find_by_ids(draft_ids)
+
         if publish_mode == 'immediate':
             # 立即发布模式
             for draft_id in draft_ids:
                 try:
-                    draft = draft_dao.find_by_id(draft_id)
+                    draft = drafts.get(draft_id)
                     if not draft:
                         results['failed'].append({
                             'draft_id': draft_id,
@@ -1906,12 +1994,12 @@ def batch_publish_drafts():
 
         else:  # scheduled mode
             # 定时发布模式，支持智能跳过夜间时段
-            current_time = datetime.now()
+            current_time = local_now()
             scheduled_time = None  # 初始化为None
 
             for i, draft_id in enumerate(draft_ids):
                 try:
-                    draft = draft_dao.find_by_id(draft_id)
+                    draft = drafts.get(draft_id)
                     if not draft:
                         results['failed'].append({
                             'draft_id': draft_id,
@@ -1962,7 +2050,7 @@ def batch_publish_drafts():
                         results['success'].append({
                             'draft_id': draft_id,
                             'title': draft['title'],
-                            'scheduled_at': scheduled_time.isoformat()
+                            'scheduled_at': scheduled_time
                         })
                     else:
                         results['failed'].append({
@@ -2078,7 +2166,7 @@ def update_maimai_account(account_id):
             return jsonify({'success': False, 'error': '缺少请求数据'}), 400
 
         # 检查账号是否存在
-        account = account_dao.find_by_id(account_id)
+        account = account_dao.find_by_id(account_id, columns=['id'])
         if not account:
             return jsonify({'success': False, 'error': '账号不存在'}), 404
 
@@ -2125,7 +2213,7 @@ def delete_maimai_account(account_id):
         account_dao = MaimaiAccountDAO()
 
         # 检查是否为默认账号
-        account = account_dao.find_by_id(account_id)
+        account = account_dao.find_by_id(account_id, columns=['id', 'is_default'])
         if not account:
             return jsonify({'success': False, 'error': '账号不存在'}), 404
 
@@ -2154,7 +2242,7 @@ def set_default_maimai_account(account_id):
         account_dao = MaimaiAccountDAO()
 
         # 检查账号是否存在
-        account = account_dao.find_by_id(account_id)
+        account = account_dao.find_by_id(account_id, columns=['id', 'name'])
         if not account:
             return jsonify({'success': False, 'error': '账号不存在'}), 404
 
@@ -2180,7 +2268,7 @@ def toggle_maimai_account_active(account_id):
         account_dao = MaimaiAccountDAO()
 
         # 检查账号是否存在
-        account = account_dao.find_by_id(account_id)
+        account = account_dao.find_by_id(account_id, columns=['id', 'name'])
         if not account:
             return jsonify({'success': False, 'error': '账号不存在'}), 404
 
@@ -2201,6 +2289,65 @@ def toggle_maimai_account_active(account_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+
+@app.route('/api/admin/db-stats', methods=['GET'])
+def get_db_stats():
+    """数据库统计：按总耗时和调用次数排序的SQL语句、连接池、只读副本、合并写队列和读缓存状态"""
+    try:
+        from modules.database.manager import get_db_manager
+        from modules.database.cache import get_cache_stats
+        
+        try:
+            limit = int(request.args.get('limit', 20))
+        except ValueError:
+            return jsonify({'success': False, 'error': f"无效的limit参数: {request.args.get('limit')}"}), 400
+        
+        db = get_db_manager()
+        query_stats = db.query_stats
+        return jsonify({
+            'success': True,
+            'data': {
+                'summary': query_stats.summary(),
+                'top_by_total_time': query_stats.top(limit, 'total_time'),
+                'top_by_calls': query_stats.top(limit, 'calls'),
+                'pool': db.get_pool_stats(),
+                'replicas': db.get_replica_stats(),
+                'write_behind': db.write_behind.get_stats(),
+                'cache': get_cache_stats()
+            }
+        })
+    except Exception as e:
+        logger.error(f"获取数据库统计失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/admin/db-stats/reset', methods=['POST'])
+def reset_db_stats():
+    """清空SQL语句统计"""
+    try:
+        from modules.database.manager import get_db_manager
+        get_db_manager().query_stats.reset()
+        return jsonify({'success': True, 'message': '数据库统计已清空'})
+    except Exception as e:
+        logger.error(f"清空数据库统计失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/admin/publish-stats', methods=['GET'])
+def get_publish_stats():
+    """发布统计：按账号的限流排队等待时间、拒绝次数，以及定时发布处理器状态"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': {
+                'rate_limiter': maimai_api.rate_limiter.get_stats(),
+                'publisher': scheduled_publisher.get_status()
+            }
+        })
+    except Exception as e:
+        logger.error(f"获取发布统计失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 if __name__ == '__main__':
     logger.info("=== 脉脉自动发布系统启动 ===")
     logger.info(f"服务地址：http://localhost:{Config.PORT}")
@@ -2260,5 +2407,12 @@ if __name__ == '__main__':
         except Exception as e:
             logger.error(f"停止每日定时HTTP请求调度器时出错: {e}")
         
+        # 后台任务停止后写入合并写队列中剩余的计数/状态更新
+        try:
+            from modules.database.manager import get_db_manager
+            get_db_manager().write_behind.close()
+        except Exception as e:
+            logger.error(f"写入合并写队列剩余数据时出错: {e}")
+        
         logger.info("所有后台任务已停止")
         logger.info("=== 脉脉自动发布系统已退出 ===")
\ No newline at end of file
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引审计工具
+以示例参数调用各DAO的查询方法，对实际生成的SQL执行 EXPLAIN，
+报告全表扫描、文件排序、临时表等问题（写语句只分析执行计划，不会真正执行）
+
+用法:
+    python database/explain_audit.py                      # 审计MySQL（DATABASE_CONFIG）
+    python database/explain_audit.py --sqlite data/maimaichat.db
+    python database/explain_audit.py --json --strict      # 输出JSON，存在问题时退出码为1
+"""
+
+import json
+import logging
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from modules.database.manager import init_database_manager
+from modules.database.dialects import SQLiteDialect, is_read_only_sql
+from modules.database.query_stats import fingerprint_sql
+from modules.database.dao import (
+    AIConfigDAO, AIConversationDAO, AutoPublishConfigDAO, DraftDAO, KeywordDAO, KeywordGroupDAO,
+    MaimaiAccountDAO, PromptDAO, ScheduledPostDAO, ScheduledRequestDAO, TopicDAO
+)
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 数据库配置
+DATABASE_CONFIG = {
+    'host': '116.205.244.106',
+    'port': 3306,
+    'user': 'root',
+    'password': '202358hjq',
+    'database': 'maimaichat'
+}
+
+# 审计目录: (DAO类, 方法名, 位置参数, 关键字参数, 已知且可接受的问题说明)
+# 已知问题（如 LIKE '%关键词%' 无法使用索引、配置类小表排序）会在报告中标注，--strict 时不计入
+AUDIT_CATALOGUE = [
+    # 定时发布（调度器每次轮询都会执行）
+    (ScheduledPostDAO, 'find_all_pending_posts', (), {}, None),
+    (ScheduledPostDAO, 'peek_due', (20,), {}, "scheduled_at 为范围条件，只对已到期的行按 created_at 排序"),
+    (ScheduledPostDAO, 'next_due_time', (), {}, None),
+    (ScheduledPostDAO, 'get_next_post_to_publish', (), {}, "scheduled_at 为范围条件，只对已到期的行按 created_at 排序"),
+    (ScheduledPostDAO, 'get_pending_count', (), {}, None),
+    (ScheduledPostDAO, 'get_latest_scheduled_at', (), {}, None),
+    (ScheduledPostDAO, 'get_latest_scheduled_at', ('audit',), {}, None),
+    (ScheduledPostDAO, 'find_by_id', ('audit',), {}, None),
+    (ScheduledPostDAO, 'find_page', (), {'descending': True}, None),
+    (ScheduledPostDAO, 'mark_as_published', ('audit',), {}, None),
+    (ScheduledPostDAO, 'find_upcoming', (200,), {}, None),
+    (ScheduledPostDAO, 'claim_due_posts', ('audit', 100, 600), {}, "scheduled_at 为范围条件，只对已到期的行按 created_at 排序"),
+    (ScheduledPostDAO, 'renew_claim', ('audit', 'audit', 600), {}, None),
+    (ScheduledPostDAO, 'release_claims', ('audit', ['audit']), {}, None),
+    # 自动发布配置
+    (AutoPublishConfigDAO, 'find_publishable', (), {}, None),
+    (AutoPublishConfigDAO, 'find_active', (), {}, None),
+    (AutoPublishConfigDAO, 'find_by_topic_id', ('audit',), {}, None),
+    (AutoPublishConfigDAO, 'find_by_topic_and_prompt', ('audit', 'audit'), {}, None),
+    (AutoPublishConfigDAO, 'find_page', (), {}, None),
+    # AI对话历史
+    (AIConversationDAO, 'get_latest_by_config', ('audit',), {}, None),
+    (AIConversationDAO, 'get_latest_by_topic', ('audit',), {}, None),
+    (AIConversationDAO, 'find_by_config_id', ('audit',), {}, None),
+    (AIConversationDAO, 'find_by_topic_id', ('audit',), {}, None),
+    # 话题与关键词
+    (TopicDAO, 'find_by_group', ('audit',), {}, None),
+    (TopicDAO, 'find_by_circle_type', ('audit',), {}, None),
+    (TopicDAO, 'search_by_name', ('audit',), {}, "LIKE '%关键词%' 无法使用索引"),
+    (TopicDAO, 'get_all_groups', (), {}, None),
+    (TopicDAO, 'find_page', (), {}, None),
+    (KeywordGroupDAO, 'find_by_group_name', ('audit',), {}, None),
+    (KeywordGroupDAO, 'get_all_group_names', (), {}, None),
+    (KeywordDAO, 'find_by_group', ('audit',), {}, None),
+    (KeywordDAO, 'get_all_groups_with_keywords', (), {}, "一次读取全部关键词"),
+    # 草稿
+    (DraftDAO, 'find_by_source', ('audit',), {}, None),
+    (DraftDAO, 'find_by_topic_id', ('audit',), {}, None),
+    (DraftDAO, 'search_by_keyword', ('audit',), {}, "LIKE '%关键词%' 无法使用索引"),
+    (DraftDAO, 'find_by_tag', ('audit',), {}, "FIND_IN_SET 标签查询无法使用索引"),
+    (DraftDAO, 'find_page', (), {}, None),
+    # 账号、AI配置、提示词、定时请求（配置类小表，通常不超过百行）
+    (MaimaiAccountDAO, 'find_active', (), {}, "配置类小表"),
+    (MaimaiAccountDAO, 'find_default', (), {}, None),
+    (MaimaiAccountDAO, 'find_by_name', ('audit',), {}, None),
+    (AIConfigDAO, 'find_enabled', (), {}, None),
+    (AIConfigDAO, 'find_by_name', ('audit',), {}, "配置类小表"),
+    (PromptDAO, 'get_all_prompts', (), {}, "一次读取全部提示词"),
+    (ScheduledRequestDAO, 'find_enabled', (), {}, "配置类小表"),
+]
+
+# DAO之外直接执行的热点语句: (标签, SQL, 参数)
+AUDIT_STATEMENTS = [
+    ('AutoPublishGenerator._cancel_pending_posts', """
+    DELETE FROM scheduled_posts
+    WHERE auto_publish_id = %s AND status = 'pending'
+    """, ('audit',)),
+]
+
+
+class ExplainRecorder:
+    """
+    替换DAO的数据库管理器：拦截语句并执行 EXPLAIN，不执行语句本身
+
+    查询返回空结果，写操作返回0；始终视为处于事务中，使DAO跳过读缓存
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.dialect = db.dialect
+        self.label = None
+        # SQL指纹 -> 审计结果
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def _explain(self, sql: str, params: tuple = None):
+        fingerprint = fingerprint_sql(sql)
+        result = self.results.get(fingerprint)
+        if result is not None:
+            if self.label not in result['callers']:
+                result['callers'].append(self.label)
+            return
+
+        result = self.results[fingerprint] = {
+            'fingerprint': fingerprint,
+            'callers': [self.label],
+            'plan': [],
+            'issues': [],
+            'error': None
+        }
+        try:
+            plan = self.db.execute_query(self.dialect.explain_sql(sql), params)
+            result['plan'] = plan
+            result['issues'] = self.dialect.plan_issues(plan)
+        except Exception as e:
+            result['error'] = str(e)
+            logger.error(f"EXPLAIN 失败 [{self.label}]: {e}")
+
+    def execute_query(self, sql: str, params: tuple = None) -> List[Dict[str, Any]]:
+        self._explain(sql, params)
+        return []
+
+    def execute_query_tuples(self, sql: str, params: tuple = None):
+        self._explain(sql, params)
+        return (), []
+
+    def iter_query(self, sql: str, params: tuple = None, batch_size: int = 500):
+        self._explain(sql, params)
+        return iter(())
+
+    def iter_query_tuples(self, sql: str, params: tuple = None, batch_size: int = 500):
+        self._explain(sql, params)
+        return iter(())
+
+    def execute_update(self, sql: str, params: tuple = None) -> int:
+        self._explain(sql, params)
+        return 0
+
+    def execute_insert(self, sql: str, params: tuple = None) -> int:
+        return 0
+
+    def execute_batch(self, sql: str, params_list: List[tuple]) -> int:
+        return 0
+
+    def execute_statements(self, statements) -> int:
+        for sql, params in statements:
+            if is_read_only_sql(sql) or sql.lstrip().upper().startswith(('UPDATE', 'DELETE')):
+                self._explain(sql, params)
+        return 0
+
+    def in_transaction(self) -> bool:
+        return True
+
+    @contextmanager
+    def replica_reads(self):
+        yield
+
+    def current_transaction(self):
+        return None
+
+    @contextmanager
+    def transaction(self):
+        yield self
+
+
+def run_audit(db) -> List[Dict[str, Any]]:
+    """对审计目录中的全部查询执行 EXPLAIN，返回按SQL指纹去重的结果"""
+    recorder = ExplainRecorder(db)
+    accepted: Dict[str, str] = {}
+
+    for dao_class, method_name, args, kwargs, known_issue in AUDIT_CATALOGUE:
+        dao = dao_class()
+        dao.db = recorder
+        recorder.label = f"{dao_class.__name__}.{method_name}"
+        before = set(recorder.results)
+        try:
+            getattr(dao, method_name)(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"调用 {recorder.label} 失败: {e}")
+        if known_issue:
+            for fingerprint in set(recorder.results) - before:
+                accepted[fingerprint] = known_issue
+
+    for label, sql, params in AUDIT_STATEMENTS:
+        recorder.label = label
+        recorder.execute_update(sql, params)
+
+    results = list(recorder.results.values())
+    for result in results:
+        result['accepted'] = accepted.get(result['fingerprint'])
+    return results
+
+
+def print_report(results: List[Dict[str, Any]]):
+    """输出文本格式的审计报告"""
+    problems = [r for r in results if r['issues'] or r['error']]
+    print(f"\n共审计 {len(results)} 条语句，存在问题 {len(problems)} 条\n")
+    for result in results:
+        if result['error']:
+            status = '失败'
+        elif not result['issues']:
+            status = 'OK'
+        elif result['accepted']:
+            status = '已知'
+        else:
+            status = '问题'
+        print(f"[{status}] {', '.join(result['callers'])}")
+        print(f"    SQL: {result['fingerprint']}")
+        for issue in result['issues']:
+            print(f"    - {issue}")
+        if result['issues'] and result['accepted']:
+            print(f"    （已知: {result['accepted']}）")
+        if result['error']:
+            print(f"    - EXPLAIN 失败: {result['error']}")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='索引审计工具（EXPLAIN 热点查询）')
+    parser.add_argument('--sqlite', metavar='PATH', help='审计SQLite数据库文件（默认审计MySQL）')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出（包含完整执行计划）')
+    parser.add_argument('--strict', action='store_true', help='存在未标注为已知的问题时退出码为1')
+
+    args = parser.parse_args()
+
+    try:
+        if args.sqlite:
+            db = init_database_manager(dialect=SQLiteDialect(args.sqlite), instrument_queries=False)
+            db.create_database_if_not_exists()
+        else:
+            db = init_database_manager(**DATABASE_CONFIG, instrument_queries=False)
+
+        results = run_audit(db)
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=2, default=str))
+        else:
+            print_report(results)
+
+        unresolved = [r for r in results if r['error'] or (r['issues'] and not r['accepted'])]
+        sys.exit(1 if args.strict and unresolved else 0)
+    except Exception as e:
+        logger.error(f"执行失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+-- 迁移脚本: 006_add_pagination_indexes
+-- 创建时间: 2026-10-17
+-- 描述: 为列表接口的游标分页添加 (created_at, id) 复合索引
+-- 影响表: topics, drafts, scheduled_posts, auto_publish_configs
+
+-- ===============================================
+-- 前置检查
+-- ===============================================
+
+SELECT 'Checking pagination tables...' as status;
+
+-- ===============================================
+-- 执行迁移 - UP
+-- ===============================================
+
+-- 游标分页按 (created_at, id) 排序并从上一页最后一条记录之后继续扫描
+ALTER TABLE `topics` ADD INDEX `idx_created_at_id` (`created_at`, `id`);
+ALTER TABLE `drafts` ADD INDEX `idx_created_at_id` (`created_at`, `id`);
+ALTER TABLE `scheduled_posts` ADD INDEX `idx_created_at_id` (`created_at`, `id`);
+ALTER TABLE `auto_publish_configs` ADD INDEX `idx_created_at_id` (`created_at`, `id`);
+
+-- ===============================================
+-- 验证迁移结果
+-- ===============================================
+
+SELECT 'Verifying migration...' as status;
+SHOW INDEX FROM `topics` WHERE Key_name = 'idx_created_at_id';
+SHOW INDEX FROM `drafts` WHERE Key_name = 'idx_created_at_id';
+SHOW INDEX FROM `scheduled_posts` WHERE Key_name = 'idx_created_at_id';
+SHOW INDEX FROM `auto_publish_configs` WHERE Key_name = 'idx_created_at_id';
+
+-- ===============================================
+-- 回滚脚本 - DOWN（用于撤销迁移）
+-- ===============================================
+
+/*
+ALTER TABLE `topics` DROP INDEX `idx_created_at_id`;
+ALTER TABLE `drafts` DROP INDEX `idx_created_at_id`;
+ALTER TABLE `scheduled_posts` DROP INDEX `idx_created_at_id`;
+ALTER TABLE `auto_publish_configs` DROP INDEX `idx_created_at_id`;
+*/
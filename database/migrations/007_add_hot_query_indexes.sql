@@ -0,0 +1,54 @@
+-- 迁移脚本: 007_add_hot_query_indexes
+-- 创建时间: 2026-10-17
+-- 描述: 为高频查询添加复合索引（由 database/explain_audit.py 的审计结果确定）
+-- 影响表: scheduled_posts, ai_conversations, auto_publish_configs
+
+-- ===============================================
+-- 前置检查
+-- ===============================================
+
+SELECT 'Checking hot query tables...' as status;
+
+-- ===============================================
+-- 执行迁移 - UP
+-- ===============================================
+
+-- ScheduledPostDAO.find_pending_posts: WHERE status = ? AND scheduled_at <= ? ORDER BY created_at
+-- 等值列在前、范围列在后，只扫描已到期的待发布任务
+ALTER TABLE `scheduled_posts` ADD INDEX `idx_status_scheduled_created` (`status`, `scheduled_at`, `created_at`);
+
+-- 按自动发布配置查找待发布/重试任务: WHERE auto_publish_id = ? AND status = ?
+ALTER TABLE `scheduled_posts` ADD INDEX `idx_auto_publish_status` (`auto_publish_id`, `status`);
+
+-- idx_status 是新索引的最左前缀，删除冗余索引减少写入开销
+ALTER TABLE `scheduled_posts` DROP INDEX `idx_status`;
+
+-- AIConversationDAO.get_latest_by_config / get_latest_by_topic: WHERE x = ? ORDER BY created_at DESC LIMIT 1
+-- 按索引倒序读取第一条，无需排序
+ALTER TABLE `ai_conversations` ADD INDEX `idx_config_created` (`config_id`, `created_at`);
+ALTER TABLE `ai_conversations` ADD INDEX `idx_topic_created` (`topic_id`, `created_at`);
+
+-- AutoPublishConfigDAO.find_publishable: WHERE is_active = 1 ... ORDER BY last_published_at
+ALTER TABLE `auto_publish_configs` ADD INDEX `idx_active_last_published` (`is_active`, `last_published_at`);
+
+-- ===============================================
+-- 验证迁移结果
+-- ===============================================
+
+SELECT 'Verifying migration...' as status;
+SHOW INDEX FROM `scheduled_posts` WHERE Key_name IN ('idx_status_scheduled_created', 'idx_auto_publish_status');
+SHOW INDEX FROM `ai_conversations` WHERE Key_name IN ('idx_config_created', 'idx_topic_created');
+SHOW INDEX FROM `auto_publish_configs` WHERE Key_name = 'idx_active_last_published';
+
+-- ===============================================
+-- 回滚脚本 - DOWN（用于撤销迁移）
+-- ===============================================
+
+/*
+ALTER TABLE `scheduled_posts` ADD INDEX `idx_status` (`status`);
+ALTER TABLE `scheduled_posts` DROP INDEX `idx_status_scheduled_created`;
+ALTER TABLE `scheduled_posts` DROP INDEX `idx_auto_publish_status`;
+ALTER TABLE `ai_conversations` DROP INDEX `idx_config_created`;
+ALTER TABLE `ai_conversations` DROP INDEX `idx_topic_created`;
+ALTER TABLE `auto_publish_configs` DROP INDEX `idx_active_last_published`;
+*/
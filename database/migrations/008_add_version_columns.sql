@@ -0,0 +1,49 @@
+-- 迁移脚本: 008_add_version_columns
+-- 创建时间: 2026-10-17
+-- 描述: 为并发修改的表添加乐观锁版本号（BaseDAO.update_if_version / update_with_retry）
+-- 影响表: auto_publish_configs, scheduled_posts, ai_conversations
+
+-- ===============================================
+-- 前置检查
+-- ===============================================
+
+SELECT 'Checking version columns...' as status;
+
+-- ===============================================
+-- 执行迁移 - UP
+-- ===============================================
+
+-- 每次通过DAO更新时加一，比较并交换时作为条件
+ALTER TABLE `auto_publish_configs`
+ADD COLUMN `version` int(11) NOT NULL DEFAULT 0
+COMMENT '乐观锁版本号'
+AFTER `last_published_at`;
+
+ALTER TABLE `scheduled_posts`
+ADD COLUMN `version` int(11) NOT NULL DEFAULT 0
+COMMENT '乐观锁版本号'
+AFTER `failed_at`;
+
+ALTER TABLE `ai_conversations`
+ADD COLUMN `version` int(11) NOT NULL DEFAULT 0
+COMMENT '乐观锁版本号'
+AFTER `messages`;
+
+-- ===============================================
+-- 验证迁移结果
+-- ===============================================
+
+SELECT 'Verifying migration...' as status;
+SHOW COLUMNS FROM `auto_publish_configs` LIKE 'version';
+SHOW COLUMNS FROM `scheduled_posts` LIKE 'version';
+SHOW COLUMNS FROM `ai_conversations` LIKE 'version';
+
+-- ===============================================
+-- 回滚脚本 - DOWN（用于撤销迁移）
+-- ===============================================
+
+/*
+ALTER TABLE `auto_publish_configs` DROP COLUMN `version`;
+ALTER TABLE `scheduled_posts` DROP COLUMN `version`;
+ALTER TABLE `ai_conversations` DROP COLUMN `version`;
+*/
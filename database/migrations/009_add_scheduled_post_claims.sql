@@ -0,0 +1,47 @@
+-- 迁移脚本: 009_add_scheduled_post_claims
+-- 创建时间: 2026-10-17
+-- 描述: 定时发布任务的认领租约（ScheduledPostDAO.claim_due_posts），支持多个发布进程共用一个数据库
+-- 影响表: scheduled_posts
+
+-- ===============================================
+-- 前置检查
+-- ===============================================
+
+SELECT 'Checking scheduled_posts claim columns...' as status;
+
+-- ===============================================
+-- 执行迁移 - UP
+-- ===============================================
+
+-- 认领后状态为 claimed，claimed_by 为发布进程标识，lease_until 前其他进程不会处理该任务
+ALTER TABLE `scheduled_posts`
+ADD COLUMN `claimed_by` varchar(100) NULL DEFAULT NULL
+COMMENT '认领任务的发布进程'
+AFTER `failed_at`;
+
+ALTER TABLE `scheduled_posts`
+ADD COLUMN `lease_until` timestamp NULL DEFAULT NULL
+COMMENT '认领租约到期时间'
+AFTER `claimed_by`;
+
+-- 重新认领租约过期的任务: WHERE status = 'claimed' AND lease_until <= ? ORDER BY lease_until
+ALTER TABLE `scheduled_posts` ADD INDEX `idx_status_lease_until` (`status`, `lease_until`);
+
+-- ===============================================
+-- 验证迁移结果
+-- ===============================================
+
+SELECT 'Verifying migration...' as status;
+SHOW COLUMNS FROM `scheduled_posts` WHERE Field IN ('claimed_by', 'lease_until');
+SHOW INDEX FROM `scheduled_posts` WHERE Key_name = 'idx_status_lease_until';
+
+-- ===============================================
+-- 回滚脚本 - DOWN（用于撤销迁移）
+-- ===============================================
+
+/*
+UPDATE `scheduled_posts` SET `status` = 'pending' WHERE `status` = 'claimed';
+ALTER TABLE `scheduled_posts` DROP INDEX `idx_status_lease_until`;
+ALTER TABLE `scheduled_posts` DROP COLUMN `lease_until`;
+ALTER TABLE `scheduled_posts` DROP COLUMN `claimed_by`;
+*/
@@ -0,0 +1,40 @@
+-- 迁移脚本: 010_create_publish_rate_buckets
+-- 创建时间: 2026-10-17
+-- 描述: 按账号的发布限流令牌桶（PUBLISH_RATE_BACKEND=database 时多个发布进程共享发布速率）
+-- 影响表: publish_rate_buckets（新建）
+
+-- ===============================================
+-- 前置检查
+-- ===============================================
+
+SELECT 'Checking publish_rate_buckets table...' as status;
+
+-- ===============================================
+-- 执行迁移 - UP
+-- ===============================================
+
+-- 每个账号一行，每次发布以版本号比较并交换扣减令牌；refilled_at 需保留微秒，否则补充令牌的计算误差可达1秒
+CREATE TABLE IF NOT EXISTS `publish_rate_buckets` (
+  `id` varchar(100) NOT NULL COMMENT '账号ID',
+  `tokens` double NOT NULL COMMENT '剩余令牌数（可为负，表示已预约的排队发布）',
+  `refilled_at` datetime(6) NOT NULL COMMENT '上次补充令牌时间',
+  `version` int(11) NOT NULL DEFAULT 0 COMMENT '乐观锁版本号',
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='发布限流令牌桶表';
+
+-- ===============================================
+-- 验证迁移结果
+-- ===============================================
+
+SELECT 'Verifying migration...' as status;
+SHOW TABLES LIKE 'publish_rate_buckets';
+
+-- ===============================================
+-- 回滚脚本 - DOWN（用于撤销迁移）
+-- ===============================================
+
+/*
+DROP TABLE IF EXISTS `publish_rate_buckets`;
+*/
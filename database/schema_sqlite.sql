@@ -0,0 +1,283 @@
+-- 脉脉自动发布系统 SQLite 表结构（单机部署 / 测试）
+-- 与 schema.sql 及 migrations/001-008 执行后的MySQL表结构保持一致
+-- 所有语句均为 IF NOT EXISTS / OR IGNORE，启动时可重复执行
+-- 时间字段以 'YYYY-MM-DD HH:MM:SS' 本地时间文本存储；updated_at 由触发器模拟 ON UPDATE CURRENT_TIMESTAMP
+
+PRAGMA foreign_keys = ON;
+
+-- 1. AI配置表
+CREATE TABLE IF NOT EXISTS `ai_configs` (
+  `id` VARCHAR(50) NOT NULL PRIMARY KEY,
+  `name` VARCHAR(100) NOT NULL,
+  `description` TEXT,
+  `api_key` VARCHAR(200) NOT NULL,
+  `base_url` VARCHAR(200) NOT NULL,
+  `main_model` VARCHAR(100) NOT NULL,
+  `assistant_model` VARCHAR(100) DEFAULT '',
+  `enabled` INTEGER DEFAULT 1,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `ai_configs_idx_enabled` ON `ai_configs` (`enabled`);
+
+-- 2. AI配置设置表
+CREATE TABLE IF NOT EXISTS `ai_config_settings` (
+  `id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `setting_key` VARCHAR(50) NOT NULL UNIQUE,
+  `setting_value` VARCHAR(200) NOT NULL,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+-- 3. 话题表
+CREATE TABLE IF NOT EXISTS `topics` (
+  `id` VARCHAR(50) NOT NULL PRIMARY KEY,
+  `name` VARCHAR(500) NOT NULL,
+  `circle_type` VARCHAR(20) DEFAULT NULL,
+  `group_name` VARCHAR(100) DEFAULT NULL,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `topics_idx_group_name` ON `topics` (`group_name`);
+CREATE INDEX IF NOT EXISTS `topics_idx_circle_type` ON `topics` (`circle_type`);
+CREATE INDEX IF NOT EXISTS `topics_idx_created_at_id` ON `topics` (`created_at`, `id`);
+
+-- 4. 话题分组表（备用，已由keyword_groups表替代）
+CREATE TABLE IF NOT EXISTS `groups` (
+  `id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `group_name` VARCHAR(100) NOT NULL UNIQUE,
+  `description` VARCHAR(500) DEFAULT NULL,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+-- 5. 关键词分组表
+CREATE TABLE IF NOT EXISTS `keyword_groups` (
+  `id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `group_name` VARCHAR(100) NOT NULL UNIQUE,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+-- 6. 关键词表
+CREATE TABLE IF NOT EXISTS `keywords` (
+  `id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `group_name` VARCHAR(100) NOT NULL REFERENCES `keyword_groups` (`group_name`) ON DELETE CASCADE ON UPDATE CASCADE,
+  `keyword` VARCHAR(200) NOT NULL,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  UNIQUE (`group_name`, `keyword`)
+);
+
+-- 7. 提示词表
+CREATE TABLE IF NOT EXISTS `prompts` (
+  `id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `name` VARCHAR(100) NOT NULL UNIQUE,
+  `content` TEXT NOT NULL,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+-- 8. 自动发布配置表
+CREATE TABLE IF NOT EXISTS `auto_publish_configs` (
+  `id` VARCHAR(50) NOT NULL PRIMARY KEY,
+  `topic_id` VARCHAR(50) DEFAULT NULL REFERENCES `topics` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+  `publish_type` VARCHAR(20) NOT NULL DEFAULT 'anonymous' CHECK (`publish_type` IN ('anonymous', 'real_name')),
+  `account_id` VARCHAR(50) DEFAULT NULL,
+  `prompt_key` VARCHAR(100) DEFAULT NULL,
+  `min_interval` INTEGER NOT NULL DEFAULT 30,
+  `max_interval` INTEGER NOT NULL DEFAULT 60,
+  `retry_count` INTEGER NOT NULL DEFAULT 0,
+  `max_retry` INTEGER NOT NULL DEFAULT 3,
+  `last_error` TEXT DEFAULT NULL,
+  `max_posts` INTEGER NOT NULL DEFAULT -1,
+  `current_posts` INTEGER NOT NULL DEFAULT 0,
+  `is_active` INTEGER NOT NULL DEFAULT 1,
+  `last_published_at` DATETIME NULL DEFAULT NULL,
+  `version` INTEGER NOT NULL DEFAULT 0,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  UNIQUE (`topic_id`, `prompt_key`)
+);
+CREATE INDEX IF NOT EXISTS `auto_publish_configs_idx_topic_id` ON `auto_publish_configs` (`topic_id`);
+CREATE INDEX IF NOT EXISTS `auto_publish_configs_idx_prompt_key` ON `auto_publish_configs` (`prompt_key`);
+CREATE INDEX IF NOT EXISTS `auto_publish_configs_idx_is_active` ON `auto_publish_configs` (`is_active`);
+CREATE INDEX IF NOT EXISTS `auto_publish_configs_idx_publish_type` ON `auto_publish_configs` (`publish_type`);
+CREATE INDEX IF NOT EXISTS `auto_publish_configs_idx_account_id` ON `auto_publish_configs` (`account_id`);
+CREATE INDEX IF NOT EXISTS `auto_publish_configs_idx_interval` ON `auto_publish_configs` (`min_interval`, `max_interval`);
+CREATE INDEX IF NOT EXISTS `auto_publish_configs_idx_created_at_id` ON `auto_publish_configs` (`created_at`, `id`);
+CREATE INDEX IF NOT EXISTS `auto_publish_configs_idx_active_last_published` ON `auto_publish_configs` (`is_active`, `last_published_at`);
+
+-- 9. AI对话历史表
+CREATE TABLE IF NOT EXISTS `ai_conversations` (
+  `id` VARCHAR(100) NOT NULL PRIMARY KEY,
+  `topic_id` VARCHAR(50) NOT NULL REFERENCES `topics` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+  `config_id` VARCHAR(50) DEFAULT NULL REFERENCES `auto_publish_configs` (`id`) ON DELETE SET NULL ON UPDATE CASCADE,
+  `messages` TEXT NOT NULL,
+  `version` INTEGER NOT NULL DEFAULT 0,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `ai_conversations_idx_topic_id` ON `ai_conversations` (`topic_id`);
+CREATE INDEX IF NOT EXISTS `ai_conversations_idx_config_id` ON `ai_conversations` (`config_id`);
+CREATE INDEX IF NOT EXISTS `ai_conversations_idx_topic_config` ON `ai_conversations` (`topic_id`, `config_id`);
+CREATE INDEX IF NOT EXISTS `ai_conversations_idx_created_at` ON `ai_conversations` (`created_at`);
+CREATE INDEX IF NOT EXISTS `ai_conversations_idx_config_created` ON `ai_conversations` (`config_id`, `created_at`);
+CREATE INDEX IF NOT EXISTS `ai_conversations_idx_topic_created` ON `ai_conversations` (`topic_id`, `created_at`);
+
+-- 10. 定时发布任务表
+CREATE TABLE IF NOT EXISTS `scheduled_posts` (
+  `id` VARCHAR(50) NOT NULL PRIMARY KEY,
+  `title` VARCHAR(500) NOT NULL,
+  `content` TEXT NOT NULL,
+  `topic_url` VARCHAR(500) DEFAULT NULL,
+  `topic_id` VARCHAR(50) DEFAULT NULL,
+  `circle_type` VARCHAR(20) DEFAULT NULL,
+  `topic_name` VARCHAR(200) DEFAULT NULL,
+  `publish_type` VARCHAR(20) NOT NULL DEFAULT 'anonymous' CHECK (`publish_type` IN ('anonymous', 'real_name')),
+  `account_id` VARCHAR(50) DEFAULT NULL,
+  `auto_publish_id` VARCHAR(50) NULL DEFAULT NULL REFERENCES `auto_publish_configs` (`id`) ON DELETE SET NULL ON UPDATE CASCADE,
+  `status` VARCHAR(20) NOT NULL DEFAULT 'pending',
+  `scheduled_at` DATETIME NOT NULL,
+  `published_at` DATETIME NULL DEFAULT NULL,
+  `error` TEXT DEFAULT NULL,
+  `failed_at` DATETIME NULL DEFAULT NULL,
+  `claimed_by` VARCHAR(100) NULL DEFAULT NULL,
+  `lease_until` DATETIME NULL DEFAULT NULL,
+  `version` INTEGER NOT NULL DEFAULT 0,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+DROP INDEX IF EXISTS `scheduled_posts_idx_status`;
+CREATE INDEX IF NOT EXISTS `scheduled_posts_idx_status_scheduled_created` ON `scheduled_posts` (`status`, `scheduled_at`, `created_at`);
+CREATE INDEX IF NOT EXISTS `scheduled_posts_idx_status_lease_until` ON `scheduled_posts` (`status`, `lease_until`);
+CREATE INDEX IF NOT EXISTS `scheduled_posts_idx_auto_publish_status` ON `scheduled_posts` (`auto_publish_id`, `status`);
+CREATE INDEX IF NOT EXISTS `scheduled_posts_idx_scheduled_at` ON `scheduled_posts` (`scheduled_at`);
+CREATE INDEX IF NOT EXISTS `scheduled_posts_idx_topic_id` ON `scheduled_posts` (`topic_id`);
+CREATE INDEX IF NOT EXISTS `scheduled_posts_idx_publish_type` ON `scheduled_posts` (`publish_type`);
+CREATE INDEX IF NOT EXISTS `scheduled_posts_idx_account_id` ON `scheduled_posts` (`account_id`);
+CREATE INDEX IF NOT EXISTS `scheduled_posts_idx_auto_publish_id` ON `scheduled_posts` (`auto_publish_id`);
+CREATE INDEX IF NOT EXISTS `scheduled_posts_idx_created_at_id` ON `scheduled_posts` (`created_at`, `id`);
+
+-- 11. 定时HTTP请求表
+CREATE TABLE IF NOT EXISTS `scheduled_requests` (
+  `id` VARCHAR(50) NOT NULL PRIMARY KEY,
+  `name` VARCHAR(200) NOT NULL,
+  `url` TEXT NOT NULL,
+  `method` VARCHAR(10) NOT NULL DEFAULT 'GET',
+  `headers` TEXT DEFAULT NULL,
+  `cookies` TEXT DEFAULT NULL,
+  `data` TEXT DEFAULT NULL,
+  `enabled` INTEGER DEFAULT 1,
+  `last_executed` DATETIME NULL DEFAULT NULL,
+  `last_result` TEXT DEFAULT NULL,
+  `execution_count` INTEGER DEFAULT 0,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `scheduled_requests_idx_enabled` ON `scheduled_requests` (`enabled`);
+CREATE INDEX IF NOT EXISTS `scheduled_requests_idx_last_executed` ON `scheduled_requests` (`last_executed`);
+
+-- 12. 草稿箱表
+CREATE TABLE IF NOT EXISTS `drafts` (
+  `id` VARCHAR(50) NOT NULL PRIMARY KEY,
+  `title` VARCHAR(500) NOT NULL DEFAULT '',
+  `content` TEXT NOT NULL,
+  `topic_url` VARCHAR(500) DEFAULT NULL,
+  `topic_id` VARCHAR(50) DEFAULT NULL,
+  `circle_type` VARCHAR(20) DEFAULT NULL,
+  `topic_name` VARCHAR(200) DEFAULT NULL,
+  `publish_type` VARCHAR(20) NOT NULL DEFAULT 'anonymous' CHECK (`publish_type` IN ('anonymous', 'real_name')),
+  `account_id` VARCHAR(50) DEFAULT NULL,
+  `source` VARCHAR(50) DEFAULT 'manual',
+  `tags` VARCHAR(500) DEFAULT NULL,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `drafts_idx_topic_id` ON `drafts` (`topic_id`);
+CREATE INDEX IF NOT EXISTS `drafts_idx_account_id` ON `drafts` (`account_id`);
+CREATE INDEX IF NOT EXISTS `drafts_idx_created_at` ON `drafts` (`created_at`);
+CREATE INDEX IF NOT EXISTS `drafts_idx_source` ON `drafts` (`source`);
+CREATE INDEX IF NOT EXISTS `drafts_idx_created_at_id` ON `drafts` (`created_at`, `id`);
+
+-- 13. 脉脉账号表
+CREATE TABLE IF NOT EXISTS `maimai_accounts` (
+  `id` VARCHAR(50) NOT NULL PRIMARY KEY,
+  `name` VARCHAR(200) NOT NULL UNIQUE,
+  `access_token` VARCHAR(500) NOT NULL,
+  `description` TEXT,
+  `is_default` INTEGER NOT NULL DEFAULT 0,
+  `is_active` INTEGER NOT NULL DEFAULT 1,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `maimai_accounts_idx_is_default` ON `maimai_accounts` (`is_default`);
+CREATE INDEX IF NOT EXISTS `maimai_accounts_idx_is_active` ON `maimai_accounts` (`is_active`);
+
+-- 14. 发布限流令牌桶表（PUBLISH_RATE_BACKEND=database）
+CREATE TABLE IF NOT EXISTS `publish_rate_buckets` (
+  `id` VARCHAR(100) NOT NULL PRIMARY KEY,
+  `tokens` REAL NOT NULL,
+  `refilled_at` DATETIME NOT NULL,
+  `version` INTEGER NOT NULL DEFAULT 0,
+  `created_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+  `updated_at` DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+-- updated_at 自动更新（语句未显式修改 updated_at 时）
+CREATE TRIGGER IF NOT EXISTS `ai_configs_updated_at` AFTER UPDATE ON `ai_configs`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `ai_configs` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `ai_config_settings_updated_at` AFTER UPDATE ON `ai_config_settings`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `ai_config_settings` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `topics_updated_at` AFTER UPDATE ON `topics`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `topics` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `groups_updated_at` AFTER UPDATE ON `groups`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `groups` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `keyword_groups_updated_at` AFTER UPDATE ON `keyword_groups`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `keyword_groups` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `prompts_updated_at` AFTER UPDATE ON `prompts`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `prompts` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `auto_publish_configs_updated_at` AFTER UPDATE ON `auto_publish_configs`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `auto_publish_configs` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `ai_conversations_updated_at` AFTER UPDATE ON `ai_conversations`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `ai_conversations` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `scheduled_posts_updated_at` AFTER UPDATE ON `scheduled_posts`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `scheduled_posts` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `scheduled_requests_updated_at` AFTER UPDATE ON `scheduled_requests`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `scheduled_requests` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `drafts_updated_at` AFTER UPDATE ON `drafts`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `drafts` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `maimai_accounts_updated_at` AFTER UPDATE ON `maimai_accounts`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `maimai_accounts` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+CREATE TRIGGER IF NOT EXISTS `publish_rate_buckets_updated_at` AFTER UPDATE ON `publish_rate_buckets`
+FOR EACH ROW WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN UPDATE `publish_rate_buckets` SET `updated_at` = datetime('now', 'localtime') WHERE rowid = NEW.rowid; END;
+
+-- 初始化默认数据（已存在时保留用户修改）
+INSERT OR IGNORE INTO `ai_config_settings` (`setting_key`, `setting_value`) VALUES ('current_config_id', '');
+
+INSERT OR IGNORE INTO `prompts` (`name`, `content`) VALUES
+('默认提示词', '你是一个专业的内容创作者，请基于提供的话题生成高质量的讨论内容。内容要有价值、有深度，适合在职场社交平台发布。');
@@ -9,7 +9,7 @@ import json
 import random
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
-from modules.database.manager import get_db_manager
+from modules.database.manager import get_db_manager, local_now
 from modules.ai.generator import AIContentGenerator
 from modules.database.dao import AutoPublishConfigDAO, AIConversationDAO, ScheduledPostDAO, TopicDAO
 
@@ -151,7 +151,7 @@ class AutoPublishCycleGenerator:
             min_interval = config.get('min_interval', 30)
             max_interval = config.get('max_interval', 60)
             minutes = random.randint(min_interval, max_interval)
-            scheduled_at = datetime.now() + timedelta(minutes=minutes)
+            scheduled_at = local_now() + timedelta(minutes=minutes)
             logger.info(f"使用配置间隔 {min_interval}-{max_interval} 分钟，随机延迟 {minutes} 分钟")
             
             # 生成唯一的任务ID
@@ -185,7 +185,8 @@ class AutoPublishCycleGenerator:
                     logger.info(f"已安排自动发布任务（无话题），{minutes}分钟后发布，任务ID: {post_id}")
 
                 # 更新对话历史
-                self._update_conversation_history(conversation['id'], content_data['messages'])
+                self._update_conversation_history(conversation['id'], content_data['messages'], conversation.get('version'),
+                                                  content_data['history_length'], content_data['system_prompt'])
 
                 return True
             
@@ -278,26 +279,11 @@ class AutoPublishCycleGenerator:
                     base_prompt = "你是一个资深新媒体编辑，擅长将话题梳理成适合脉脉的内容。"
                     logger.warning("配置未指定提示词且当前提示词不存在，使用默认提示词")
 
-            # 同步历史对话中的提示词，确保与当前提示词一致
-            messages = self._sync_system_prompt(messages, base_prompt)
-
-            # 检查是否已有system消息，避免重复添加提示词
-            has_system_message = any(msg.get('role') == 'system' for msg in messages)
-
-            # 构建用户提示词
-            if not has_system_message:
-                # 第一次或者没有system消息时，添加完整的提示词作为system消息
-                system_message = {
-                    "role": "system",
-                    "content": base_prompt
-                }
-                messages.insert(0, system_message)
-                user_prompt = "开始"
-                logger.info("添加了system消息和第一次创作请求")
-            else:
-                # 已有历史对话时，只添加简单的继续请求，避免重复提示词
-                user_prompt = "开始"
-                logger.info("使用简化的继续创作请求，避免重复提示词")
+            # 同步历史对话中的提示词（没有system消息时添加），确保与当前提示词一致
+            messages = self._apply_system_prompt(messages, base_prompt)
+            # 本轮新增的消息（请求和回复）从这里开始，写回时版本冲突则只把这部分追加到最新历史
+            history_length = len(messages)
+            user_prompt = "开始"
             
             messages.append({
                 "role": "user",
@@ -344,6 +330,8 @@ class AutoPublishCycleGenerator:
                     'title': title,
                     'content': content,
                     'messages': messages,
+                    'history_length': history_length,
+                    'system_prompt': base_prompt,
                     'topic_url': f"/topics/{topic['id']}" if topic else ""
                 }
             
@@ -353,10 +341,30 @@ class AutoPublishCycleGenerator:
             logger.error(f"基于历史生成内容失败: {e}")
             return None
     
-    def _update_conversation_history(self, conversation_id: str, messages: List[Dict[str, Any]]) -> bool:
-        """更新对话历史"""
+    def _update_conversation_history(self, conversation_id: str, messages: List[Dict[str, Any]],
+                                     expected_version: Optional[int] = None, history_length: Optional[int] = None,
+                                     system_prompt: Optional[str] = None) -> bool:
+        """
+        更新对话历史
+        
+        生成期间对话已被其他任务更新（版本号变化）时不覆盖：重新读取最新历史，同步system提示词后
+        把本轮新增的消息（messages[history_length:]）追加在其后，仍冲突时按乐观锁重试
+        """
         try:
-            return self.conversation_dao.update(conversation_id, {'messages': messages}) > 0
+            if expected_version is None:
+                return self.conversation_dao.update(conversation_id, {'messages': messages}) > 0
+            if self.conversation_dao.update_if_version(conversation_id, expected_version, {'messages': messages}):
+                return True
+            logger.warning(f"对话 {conversation_id} 已被其他任务更新，本轮消息追加到最新历史")
+            new_messages = messages[history_length:] if history_length is not None else messages
+            
+            def rebase(conversation: Dict[str, Any]) -> Dict[str, Any]:
+                history = list(conversation.get('messages') or [])
+                if system_prompt is not None:
+                    history = self._apply_system_prompt(history, system_prompt)
+                return {'messages': history + new_messages}
+            
+            return self.conversation_dao.update_with_retry(conversation_id, rebase) is not None
         except Exception as e:
             logger.error(f"更新对话历史失败: {e}")
             return False
@@ -462,6 +470,20 @@ class AutoPublishCycleGenerator:
         except Exception as e:
             logger.error(f"取消待发布任务失败: {e}")
 
+    def _apply_system_prompt(self, messages: List[Dict[str, Any]], current_prompt: str) -> List[Dict[str, Any]]:
+        """同步历史对话中的system提示词，没有system消息时在开头添加（第一次创作）"""
+        messages = self._sync_system_prompt(messages, current_prompt)
+        if not any(msg.get('role') == 'system' for msg in messages):
+            messages.insert(0, {
+                "role": "system",
+                "content": current_prompt
+            })
+            logger.info("添加了system消息和第一次创作请求")
+        else:
+            # 已有历史对话时，只添加简单的继续请求，避免重复提示词
+            logger.info("使用简化的继续创作请求，避免重复提示词")
+        return messages
+
     def _sync_system_prompt(self, messages: List[Dict[str, Any]], current_prompt: str) -> List[Dict[str, Any]]:
         """
         同步历史对话中的system提示词，确保与当前提示词一致
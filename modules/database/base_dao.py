@@ -1,15 +1,247 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, FrozenSet, Tuple, Sequence, Iterator, Callable
+import base64
+import functools
+import json
 import logging
+import random
+import time
 from datetime import datetime
 
-from modules.database.manager import get_db_manager, json_serialize, json_deserialize, format_datetime, parse_datetime
+from modules.database.cache import TTLCache
+from modules.database.manager import (
+    get_db_manager, json_serialize, json_deserialize, format_datetime, parse_datetime, local_now, to_local
+)
 
 logger = logging.getLogger(__name__)
 
+# 单个DAO类缓存的SQL语句上限，防止动态条件组合导致缓存无限增长
+MAX_CACHED_STATEMENTS = 256
+
+# 多行INSERT/IN查询每条语句的默认行数，避免单条语句超过 max_allowed_packet
+DEFAULT_CHUNK_SIZE = 500
+
+# 分页查询的默认/最大每页条数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 乐观锁更新的默认最大尝试次数，以及冲突后重试的基础退避秒数（按次数翻倍并加随机抖动）
+DEFAULT_CAS_ATTEMPTS = 5
+CAS_RETRY_BACKOFF = 0.01
+
+
+class ConcurrentUpdateError(RuntimeError):
+    """乐观锁更新多次重试后仍然版本冲突"""
+
+def split_conditions(conditions: Optional[Dict[str, Any]]) -> Tuple[tuple, List[Any]]:
+    """
+    拆分查询条件为 (条件形状, 绑定参数)
+    
+    条件形状与具体参数值无关，用作SQL缓存键：无NULL条件时为字段名元组，
+    否则为 (字段名, 是否为NULL判断) 元组
+    """
+    if not conditions:
+        return (), []
+    params = [value for value in conditions.values() if value is not None]
+    if len(params) == len(conditions):
+        return tuple(conditions), params
+    return tuple((key, value is None) for key, value in conditions.items()), params
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """将排序键的值编码为不透明的分页游标"""
+    payload = json.dumps([format_datetime(value) if isinstance(value, datetime) else value for value in values],
+                         ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, expected_length: int) -> List[Any]:
+    """解码分页游标，格式不合法时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return values
+
+
+def decode_datetime_value(value: Any) -> Optional[datetime]:
+    """
+    datetime字段解码：驱动已返回datetime时原样返回，只有字符串值才解析
+    
+    DAO内部始终使用原生datetime（业务时区本地时间），只在JSON输出时格式化一次
+    """
+    if type(value) is datetime:
+        return value
+    return parse_datetime(str(value))
+
+
+def copy_cached_result(value: Any) -> Any:
+    """复制读缓存中的结果（记录或记录列表），调用方修改返回值不会影响缓存"""
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [dict(record) for record in value]
+    return value
+
+
+def select_list(columns: Optional[Sequence[str]]) -> str:
+    """生成SELECT字段列表，None表示全部字段"""
+    if columns is None:
+        return "*"
+    return ", ".join(f"`{column}`" for column in columns)
+
+
+def build_where_clause(shape: tuple) -> str:
+    """根据条件形状生成WHERE子句"""
+    if not shape:
+        return ""
+    clauses = []
+    for item in shape:
+        if isinstance(item, tuple):
+            key, is_null = item
+            clauses.append(f"`{key}` IS NULL" if is_null else f"`{key}` = %s")
+        else:
+            clauses.append(f"`{item}` = %s")
+    return " WHERE " + " AND ".join(clauses)
+
+
+def replica_read(method):
+    """DAO方法装饰器：方法内的查询可路由到只读副本（用于可容忍数据稍旧的列表、计数等查询）"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.db.replica_reads():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class LazyRecord(dict):
+    """
+    延迟加载大字段的记录
+    
+    查询时未选取的大字段（如 content、messages）在首次通过 [] / get() 访问时按主键一次性补查；
+    直接序列化（如 jsonify）时只包含已加载的字段
+    """
+    
+    __slots__ = ('_dao', '_deferred')
+    
+    def __init__(self, data: Dict[str, Any], dao: 'BaseDAO', deferred: Tuple[str, ...]):
+        super().__init__(data)
+        self._dao = dao
+        self._deferred = deferred
+    
+    def __missing__(self, key):
+        if key in self._deferred:
+            self.load_deferred()
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+    
+    def __contains__(self, key) -> bool:
+        return dict.__contains__(self, key) or key in self._deferred
+    
+    def get(self, key, default=None):
+        if key in self._deferred:
+            self.load_deferred()
+        return dict.get(self, key, default)
+    
+    def load_deferred(self):
+        """补查全部延迟字段"""
+        if not self._deferred:
+            return
+        deferred, self._deferred = self._deferred, ()
+        self.update(self._dao._load_fields(dict.__getitem__(self, 'id'), deferred))
+
+
+def field_property(index: int) -> property:
+    """紧凑记录的字段属性：按下标读取行元组"""
+    return property(lambda record: record._values[index])
+
+
+class CompactRecord:
+    """
+    紧凑记录（find_all/iter_all 的 compact=True）
+    
+    直接保存元组游标返回的行（__slots__ 只有一个槽），不创建字典；每个DAO按查询字段生成子类。
+    支持 record.field、record['field'] 和 get() 读取；as_dict() 在调用时才生成字典，jsonify 输出时自动转换
+    """
+    
+    __slots__ = ('_values',)
+    _fields: Tuple[str, ...] = ()
+    # 字段名 -> 行元组下标
+    _index: Dict[str, int] = {}
+    # ((下标, 转换函数), ...)，只包含需要转换的字段
+    _converters: Tuple[Tuple[int, Callable], ...] = ()
+    
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> 'CompactRecord':
+        record = cls.__new__(cls)
+        # 转换函数对驱动已返回的原生类型原样返回，只有确实需要转换（如JSON字段）时才复制该行
+        for index, convert in cls._converters:
+            value = row[index]
+            if value is not None and convert(value) is not value:
+                row = cls._convert_row(row)
+                break
+        record._values = row
+        return record
+    
+    @classmethod
+    def _convert_row(cls, row: Sequence[Any]) -> tuple:
+        values = list(row)
+        for index, convert in cls._converters:
+            if values[index] is not None:
+                values[index] = convert(values[index])
+        return tuple(values)
+    
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._index[key]]
+    
+    def __contains__(self, key) -> bool:
+        return key in self._index
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        index = self._index.get(key)
+        return default if index is None else self._values[index]
+    
+    def keys(self) -> Tuple[str, ...]:
+        return self._fields
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """转换为字典（每次调用生成新字典，不缓存）"""
+        return dict(zip(self._fields, self._values))
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+
 class BaseDAO(ABC):
     """数据访问层基类"""
     
+    # 每个DAO子类独立的SQL语句缓存：固定语句以操作名为键，动态语句以 (操作, 字段/条件形状) 为键
+    # 用法: sql = self._sql_cache.get(key) or self._cache_sql(key, <SQL>)，SQL只在未命中时拼接
+    _sql_cache: Dict[Union[str, tuple], str] = {}
+    _table_field_set: Optional[FrozenSet[str]] = None
+    # 每个DAO类的字段转换表: ((字段名, 转换函数), ...)，只包含需要转换的字段
+    _row_converters: Optional[Tuple[Tuple[str, Any], ...]] = None
+    # 读缓存（可选）：子类设置 cache_ttl（秒）后，find_by_id/find_all/find_by_key 的结果按查询参数缓存，
+    # 同一DAO的写操作会清空缓存。只适合读多写少的小表
+    cache_ttl: Optional[float] = None
+    cache_max_size: int = 256
+    _read_cache: Optional[TTLCache] = None
+    # 乐观锁（可选）：子类设置 version_field 后，每次更新该字段加一，update_if_version 按版本比较并交换
+    version_field: Optional[str] = None
+    # 紧凑记录类: 查询字段元组 -> CompactRecord 子类
+    _record_classes: Dict[Tuple[str, ...], type] = {}
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._sql_cache = {}
+        cls._table_field_set = None
+        cls._row_converters = None
+        cls._record_classes = {}
+        cls._read_cache = TTLCache(cls.__name__, cls.cache_ttl, cls.cache_max_size) if cls.cache_ttl else None
+    
     def __init__(self, table_name: str):
         """
         初始化DAO
@@ -20,63 +252,396 @@ class BaseDAO(ABC):
         self.table_name = table_name
         self.db = get_db_manager()
     
-    def find_by_id(self, record_id: Union[str, int]) -> Optional[Dict[str, Any]]:
-        """根据ID查找记录"""
-        sql = f"SELECT * FROM `{self.table_name}` WHERE `id` = %s"
+    def _cache_sql(self, key: Union[str, tuple], sql: str) -> str:
+        """缓存生成的SQL语句并返回"""
+        cache = type(self)._sql_cache
+        if len(cache) < MAX_CACHED_STATEMENTS:
+            cache[key] = sql
+        return sql
+    
+    def _get_read_cache(self) -> Optional[TTLCache]:
+        """获取可用的读缓存；未启用或处于事务内（可能读到未提交数据）时返回None"""
+        cache = type(self)._read_cache
+        if cache is None or self.db.in_transaction():
+            return None
+        return cache
+    
+    def _cached_read(self, key: tuple, loader):
+        """通过读缓存执行查询，未启用缓存或参数不可哈希时直接查询"""
+        cache = self._get_read_cache()
+        if cache is None:
+            return loader()
+        try:
+            hash(key)
+        except TypeError:
+            return loader()
+        return copy_cached_result(cache.get_or_load(key, loader))
+    
+    def _invalidate_cache(self):
+        """写操作后清空读缓存；事务内的写操作在提交后再清空一次，避免提交前被其他线程读回旧数据"""
+        cache = type(self)._read_cache
+        if cache is None:
+            return
+        cache.clear()
+        uow = self.db.current_transaction()
+        if uow is not None:
+            uow.on_commit(cache.clear)
+    
+    def _write_behind(self, record_id: Union[str, int], ops: Dict[str, Tuple[str, Any]]) -> bool:
+        """
+        低优先级的计数器/状态更新：加入合并写队列，同一行的多次更新合并后批量写入
+        
+        Args:
+            record_id: 记录ID
+            ops: 列名 -> ('set', 值) 覆盖 / ('add', 增量) 累加
+        
+        事务内（需与事务中其他语句一起提交）或未启用合并写时立即执行。加入队列时返回True，
+        写入前普通查询可能读到旧值（最长一个合并窗口），加锁读取（for_update）会先写入该行。
+        """
+        ops = {column: (kind, self._serialize_field_value(value) if kind == 'set' else value)
+               for column, (kind, value) in ops.items()}
+        if self.version_field:
+            ops[self.version_field] = ('add', 1)
+        queue = self.db.write_behind
+        if queue.enabled and not self.db.in_transaction():
+            if queue.submit(self.table_name, record_id, ops, on_flush=self._invalidate_cache):
+                return True
+        rows_affected = queue.execute_now(self.table_name, record_id, ops)
+        self._invalidate_cache()
+        return rows_affected > 0
+    
+    def _flush_pending_writes(self, record_id: Union[str, int]):
+        """立即写入该行在合并写队列中的更新"""
+        if self.db.write_behind.execute_now(self.table_name, record_id):
+            self._invalidate_cache()
+    
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """获取读缓存统计信息，未启用缓存时返回None"""
+        cache = type(self)._read_cache
+        return cache.get_stats() if cache is not None else None
+    
+    def _get_table_field_set(self) -> FrozenSet[str]:
+        """获取表字段集合（每个DAO类只计算一次）"""
+        cls = type(self)
+        if cls._table_field_set is None:
+            cls._table_field_set = frozenset(self._get_table_fields())
+        return cls._table_field_set
+    
+    def _get_row_converters(self) -> Tuple[Tuple[str, Any], ...]:
+        """获取行解码用的字段转换表（每个DAO类只根据字段元数据构建一次）"""
+        cls = type(self)
+        if cls._row_converters is None:
+            json_fields = frozenset(self._get_json_fields())
+            datetime_fields = frozenset(self._get_datetime_fields())
+            converters = {field: decode_datetime_value for field in datetime_fields}
+            # JSON字段优先
+            converters.update((field, json_deserialize) for field in json_fields)
+            cls._row_converters = tuple(converters.items())
+        return cls._row_converters
+    
+    def _get_record_class(self, columns: Tuple[str, ...]) -> type:
+        """获取指定字段组合的紧凑记录类（每个DAO类按字段组合只生成一次）"""
+        cls = type(self)
+        record_class = cls._record_classes.get(columns)
+        if record_class is None:
+            converters = dict(self._get_row_converters())
+            namespace = {field: field_property(index) for index, field in enumerate(columns)}
+            namespace.update(
+                __slots__=(),
+                _fields=columns,
+                _index={field: index for index, field in enumerate(columns)},
+                _converters=tuple((index, converters[field]) for index, field in enumerate(columns)
+                                  if field in converters)
+            )
+            name = cls.__name__[:-3] if cls.__name__.endswith('DAO') else cls.__name__
+            record_class = type(f"{name}Record", (CompactRecord,), namespace)
+            if len(cls._record_classes) < MAX_CACHED_STATEMENTS:
+                cls._record_classes[columns] = record_class
+        return record_class
+    
+    def _compact_records(self, columns: Tuple[str, ...], rows: Sequence[tuple]) -> List[CompactRecord]:
+        """将元组游标的结果行构建为紧凑记录"""
+        from_row = self._get_record_class(columns).from_row
+        return [from_row(row) for row in rows]
+    
+    def _resolve_columns(self, columns: Optional[Sequence[str]], defer_heavy: bool,
+                         required: Sequence[str] = ()) -> Tuple[Optional[Tuple[str, ...]], Tuple[str, ...]]:
+        """
+        计算实际查询的字段和需要延迟加载的字段
+        
+        Returns:
+            (查询字段元组，None表示 SELECT *, 延迟加载字段元组)
+        """
+        if columns is None and not defer_heavy:
+            return None, ()
+        
+        table_fields = self._get_table_field_set()
+        if columns is None:
+            heavy = set(self._get_heavy_fields())
+            selected = [field for field in self._get_table_fields() if field not in heavy]
+        else:
+            for field in columns:
+                if field not in table_fields:
+                    raise ValueError(f"字段不存在: {field}")
+            selected = list(dict.fromkeys(columns))
+        
+        deferred = ()
+        if defer_heavy:
+            deferred = tuple(field for field in self._get_heavy_fields() if field not in selected)
+        
+        # 延迟加载依赖主键，游标分页依赖排序字段
+        for field in (('id',) if deferred else ()) + tuple(required):
+            if field not in selected:
+                selected.append(field)
+        
+        return tuple(selected), deferred
+    
+    def _wrap_records(self, records: List[Dict[str, Any]], deferred: Tuple[str, ...]) -> List[Dict[str, Any]]:
+        """处理查询结果，有延迟字段时包装为 LazyRecord"""
+        if deferred:
+            return [LazyRecord(record, self, deferred) for record in self._process_records(records)]
+        return self._process_records(records)
+    
+    def _load_fields(self, record_id: Union[str, int], fields: Sequence[str]) -> Dict[str, Any]:
+        """按主键补查指定字段"""
+        key = ('load_fields', tuple(fields))
+        sql = self._sql_cache.get(key) or self._cache_sql(
+            key, f"SELECT {select_list(fields)} FROM `{self.table_name}` WHERE `id` = %s"
+        )
+        result = self.db.execute_query(sql, (record_id,))
+        if not result:
+            return {field: None for field in fields}
+        return self._process_record(result[0])
+    
+    def _build_select_sql(self, shape: tuple, order_by: Optional[str], has_limit: bool,
+                          columns: Optional[Tuple[str, ...]] = None) -> str:
+        """生成SELECT语句"""
+        sql = f"SELECT {select_list(columns)} FROM `{self.table_name}`" + build_where_clause(shape)
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if has_limit:
+            sql += " LIMIT %s"
+        return sql
+    
+    def _insert_sql(self, fields: Tuple[str, ...]) -> str:
+        """获取指定字段组合的INSERT语句"""
+        key = ('insert', fields)
+        return self._sql_cache.get(key) or self._cache_sql(
+            key,
+            f"INSERT INTO `{self.table_name}` (`{'`, `'.join(fields)}`) VALUES ({', '.join(['%s'] * len(fields))})"
+        )
+    
+    def _update_sql(self, fields: Tuple[str, ...], key_field: str = 'id') -> str:
+        """获取指定字段组合的UPDATE语句，按key_field定位记录"""
+        key = ('update', fields, key_field)
+        return self._sql_cache.get(key) or self._cache_sql(
+            key,
+            f"UPDATE `{self.table_name}` SET {self._set_clause(fields)} WHERE `{key_field}` = %s"
+        )
+    
+    def _set_clause(self, fields: Tuple[str, ...]) -> str:
+        """生成SET子句，启用乐观锁时附加版本号加一"""
+        assignments = [f"`{field}` = %s" for field in fields]
+        if self.version_field:
+            assignments.append(f"`{self.version_field}` = `{self.version_field}` + 1")
+        return ', '.join(assignments)
+    
+    def find_by_id(self, record_id: Union[str, int], columns: Optional[Sequence[str]] = None,
+                   defer_heavy: bool = False, for_update: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        根据ID查找记录，可指定查询字段或延迟加载大字段
+        
+        for_update 为True时加行锁（SELECT ... FOR UPDATE），只在 transaction() 块内有意义
+        """
+        if columns is None and not defer_heavy and not for_update:
+            return self._cached_read(('find_by_id', record_id), lambda: self._find_by_id(record_id))
+        else:
+            if for_update:
+                # 加锁读取前先写入该行在合并写队列中的更新，避免读到旧值后再被覆盖
+                self._flush_pending_writes(record_id)
+            columns, deferred = self._resolve_columns(columns, defer_heavy)
+            key = ('find_by_id', columns, for_update)
+            sql = self._sql_cache.get(key) or self._cache_sql(
+                key, f"SELECT {select_list(columns)} FROM `{self.table_name}` WHERE `id` = %s"
+                     + (" FOR UPDATE" if for_update else "")
+            )
         result = self.db.execute_query(sql, (record_id,))
         if result:
-            return self._process_record(result[0])
+            return self._wrap_records(result[:1], deferred)[0]
         return None
     
-    def find_all(self, conditions: Dict[str, Any] = None, order_by: str = None, limit: int = None) -> List[Dict[str, Any]]:
-        """查找所有记录"""
-        sql = f"SELECT * FROM `{self.table_name}`"
-        params = []
-        
-        if conditions:
-            where_clauses = []
-            for key, value in conditions.items():
-                if value is None:
-                    where_clauses.append(f"`{key}` IS NULL")
-                else:
-                    where_clauses.append(f"`{key}` = %s")
-                    params.append(value)
-            
-            if where_clauses:
-                sql += " WHERE " + " AND ".join(where_clauses)
+    def _find_by_id(self, record_id: Union[str, int]) -> Optional[Dict[str, Any]]:
+        """根据ID查询完整记录（不经过读缓存）"""
+        sql = self._sql_cache.get('find_by_id') or self._cache_sql(
+            'find_by_id', f"SELECT * FROM `{self.table_name}` WHERE `id` = %s"
+        )
+        result = self.db.execute_query(sql, (record_id,))
+        return self._process_record(result[0]) if result else None
+    
+    def find_by_ids(self, record_ids: Sequence[Union[str, int]], columns: Optional[Sequence[str]] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[Union[str, int], Dict[str, Any]]:
+        """
+        根据ID批量查找记录（WHERE id IN (...)，超过 chunk_size 时分批查询）
         
-        if order_by:
-            sql += f" ORDER BY {order_by}"
+        Returns:
+            以ID为键的记录字典，不存在的ID不在结果中
+        """
+        unique_ids = list(dict.fromkeys(record_id for record_id in record_ids if record_id is not None))
+        if not unique_ids:
+            return {}
         
-        if limit:
-            sql += f" LIMIT {limit}"
+        columns, _ = self._resolve_columns(columns, False, required=('id',))
+        records = {}
+        for start in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[start:start + chunk_size]
+            key = ('find_by_ids', columns, len(chunk))
+            sql = self._sql_cache.get(key) or self._cache_sql(
+                key, f"SELECT {select_list(columns)} FROM `{self.table_name}` WHERE `id` IN ({', '.join(['%s'] * len(chunk))})"
+            )
+            for record in self._process_records(self.db.execute_query(sql, tuple(chunk))):
+                records[record['id']] = record
+        return records
+    
+    def find_all(self, conditions: Dict[str, Any] = None, order_by: str = None, limit: int = None,
+                 columns: Optional[Sequence[str]] = None, defer_heavy: bool = False,
+                 compact: bool = False) -> List[Dict[str, Any]]:
+        """
+        查找所有记录
         
+        Args:
+            conditions: 等值查询条件
+            order_by: 排序子句
+            limit: 最大条数
+            columns: 只查询指定字段，默认全部字段
+            defer_heavy: 不查询 _get_heavy_fields() 声明的大字段，改为首次访问时再加载；
+                         启用读缓存时忽略（缓存完整记录）
+            compact: 返回只读的 CompactRecord 而不是字典（元组游标，每行只分配一个对象），
+                     用于大结果集的列表和扫描；不经过读缓存，不能与 defer_heavy 同时使用
+        """
+        if compact and defer_heavy:
+            raise ValueError("compact 与 defer_heavy 不能同时使用")
+        shape, params = split_conditions(conditions)
+        if columns is None and not compact and type(self)._read_cache is not None:
+            key = ('find_all', shape, tuple(params), order_by, limit)
+            return self._cached_read(key, lambda: self._find_all(shape, params, order_by, limit, None, False))
+        return self._find_all(shape, params, order_by, limit, columns, defer_heavy, compact)
+    
+    def _find_all(self, shape: tuple, params: List[Any], order_by: Optional[str], limit: Optional[int],
+                  columns: Optional[Sequence[str]], defer_heavy: bool, compact: bool = False) -> List[Dict[str, Any]]:
+        """执行 find_all 查询（不经过读缓存）"""
+        params = list(params)
+        has_limit = bool(limit)
+        columns, deferred = self._resolve_columns(columns, defer_heavy)
+        
+        key = ('find_all', shape, order_by, has_limit, columns)
+        sql = self._sql_cache.get(key) or self._cache_sql(key, self._build_select_sql(shape, order_by, has_limit, columns))
+        if has_limit:
+            params.append(int(limit))
+        
+        if compact:
+            return self._compact_records(*self.db.execute_query_tuples(sql, tuple(params)))
         result = self.db.execute_query(sql, tuple(params))
-        return [self._process_record(record) for record in result]
+        return self._wrap_records(result, deferred)
     
+    def iter_all(self, conditions: Dict[str, Any] = None, order_by: str = None,
+                 columns: Optional[Sequence[str]] = None, batch_size: int = DEFAULT_CHUNK_SIZE,
+                 compact: bool = False) -> Iterator[Dict[str, Any]]:
+        """流式遍历记录（服务端游标），用于全表扫描、导出和维护任务；compact 同 find_all"""
+        shape, params = split_conditions(conditions)
+        columns, _ = self._resolve_columns(columns, False)
+        
+        key = ('find_all', shape, order_by, False, columns)
+        sql = self._sql_cache.get(key) or self._cache_sql(key, self._build_select_sql(shape, order_by, False, columns))
+        
+        if compact:
+            for fields, rows in self.db.iter_query_tuples(sql, tuple(params), batch_size):
+                from_row = self._get_record_class(fields).from_row
+                for row in rows:
+                    yield from_row(row)
+            return
+        
+        for record in self.db.iter_query(sql, tuple(params), batch_size):
+            yield self._process_record(record)
+    
+    @replica_read
+    def find_page(self, order_key: Sequence[str] = ('created_at', 'id'), after: Optional[str] = None,
+                  limit: int = DEFAULT_PAGE_SIZE, conditions: Dict[str, Any] = None,
+                  descending: bool = False, columns: Optional[Sequence[str]] = None,
+                  defer_heavy: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按排序键做游标（keyset）分页查询
+        
+        Args:
+            order_key: 排序字段，最后一个字段必须唯一（通常为 created_at, id），应有对应索引
+            after: 上一页返回的游标，为空时从第一页开始
+            limit: 每页条数，最大 MAX_PAGE_SIZE
+            conditions: 额外的等值查询条件
+            descending: 是否倒序
+            columns: 只查询指定字段（会自动补上排序字段）
+            defer_heavy: 延迟加载大字段，同 find_all
+        
+        Returns:
+            (记录列表, 下一页游标)，没有更多数据时游标为 None
+        """
+        order_key = tuple(order_key)
+        table_fields = self._get_table_field_set()
+        for field in order_key:
+            if field not in table_fields:
+                raise ValueError(f"排序字段不存在: {field}")
+        
+        limit = min(max(1, int(limit)), MAX_PAGE_SIZE)
+        shape, params = split_conditions(conditions)
+        columns, deferred = self._resolve_columns(columns, defer_heavy, required=order_key)
+        
+        key = ('find_page', shape, order_key, descending, after is not None, columns)
+        sql = self._sql_cache.get(key)
+        if not sql:
+            direction, operator = ('DESC', '<') if descending else ('ASC', '>')
+            sql = f"SELECT {select_list(columns)} FROM `{self.table_name}`" + build_where_clause(shape)
+            if after is not None:
+                # (a, b) > (x, y) 展开为 a > x OR (a = x AND b > y)，便于使用索引范围扫描
+                branches = []
+                for i, field in enumerate(order_key):
+                    equals = [f"`{prev}` = %s" for prev in order_key[:i]]
+                    branches.append("(" + " AND ".join(equals + [f"`{field}` {operator} %s"]) + ")")
+                sql += (" AND " if shape else " WHERE ") + "(" + " OR ".join(branches) + ")"
+            sql += " ORDER BY " + ", ".join(f"`{field}` {direction}" for field in order_key) + " LIMIT %s"
+            self._cache_sql(key, sql)
+        
+        if after is not None:
+            cursor_values = decode_cursor(after, len(order_key))
+            for i in range(len(order_key)):
+                params.extend(cursor_values[:i + 1])
+        params.append(limit + 1)
+        
+        result = self.db.execute_query(sql, tuple(params))
+        
+        next_cursor = None
+        if len(result) > limit:
+            result = result[:limit]
+            last = result[-1]
+            next_cursor = encode_cursor([last[field] for field in order_key])
+        
+        return self._wrap_records(result, deferred), next_cursor
+    
+    @replica_read
     def count(self, conditions: Dict[str, Any] = None) -> int:
         """统计记录数量"""
-        sql = f"SELECT COUNT(*) as count FROM `{self.table_name}`"
-        params = []
-        
-        if conditions:
-            where_clauses = []
-            for key, value in conditions.items():
-                if value is None:
-                    where_clauses.append(f"`{key}` IS NULL")
-                else:
-                    where_clauses.append(f"`{key}` = %s")
-                    params.append(value)
-            
-            if where_clauses:
-                sql += " WHERE " + " AND ".join(where_clauses)
+        shape, params = split_conditions(conditions)
+        
+        key = ('count', shape)
+        sql = self._sql_cache.get(key) or self._cache_sql(
+            key, f"SELECT COUNT(*) as count FROM `{self.table_name}`" + build_where_clause(shape)
+        )
         
         result = self.db.execute_query(sql, tuple(params))
         return result[0]['count'] if result else 0
     
     def exists(self, record_id: Union[str, int]) -> bool:
         """检查记录是否存在"""
-        sql = f"SELECT 1 FROM `{self.table_name}` WHERE `id` = %s LIMIT 1"
+        sql = self._sql_cache.get('exists') or self._cache_sql(
+            'exists', f"SELECT 1 FROM `{self.table_name}` WHERE `id` = %s LIMIT 1"
+        )
         result = self.db.execute_query(sql, (record_id,))
         return len(result) > 0
     
@@ -84,13 +649,11 @@ class BaseDAO(ABC):
         """插入记录"""
         data = self._prepare_data_for_insert(data)
         
-        fields = list(data.keys())
-        placeholders = ["%s"] * len(fields)
-        values = [self._serialize_field_value(data[field]) for field in fields]
-        
-        sql = f"INSERT INTO `{self.table_name}` (`{'`, `'.join(fields)}`) VALUES ({', '.join(placeholders)})"
+        values = [self._serialize_field_value(value) for value in data.values()]
+        sql = self._insert_sql(tuple(data))
         
         insert_id = self.db.execute_insert(sql, tuple(values))
+        self._invalidate_cache()
         
         # 如果表有自增ID，返回插入ID；否则返回主键值
         if 'id' in data:
@@ -104,23 +667,90 @@ class BaseDAO(ABC):
         
         data = self._prepare_data_for_update(data)
         
-        set_clauses = []
-        values = []
+        values = [self._serialize_field_value(value) for value in data.values()]
+        values.append(record_id)
+        sql = self._update_sql(tuple(data))
         
-        for field, value in data.items():
-            set_clauses.append(f"`{field}` = %s")
-            values.append(self._serialize_field_value(value))
+        rows_affected = self.db.execute_update(sql, tuple(values))
+        self._invalidate_cache()
+        return rows_affected
+    
+    def update_if_version(self, record_id: Union[str, int], expected_version: int, data: Dict[str, Any]) -> bool:
+        """
+        按版本号比较并更新（乐观锁）：只有记录的版本号仍为 expected_version 时才更新，同时版本号加一
         
-        values.append(record_id)
+        Returns:
+            是否更新成功，False 表示记录已被其他线程/进程修改或不存在
+        """
+        if not self.version_field:
+            raise TypeError(f"{type(self).__name__} 未启用乐观锁（version_field）")
+        if not data:
+            return False
         
-        sql = f"UPDATE `{self.table_name}` SET {', '.join(set_clauses)} WHERE `id` = %s"
+        data = self._prepare_data_for_update(data)
+        values = [self._serialize_field_value(value) for value in data.values()]
+        values.extend((record_id, expected_version))
         
-        return self.db.execute_update(sql, tuple(values))
+        fields = tuple(data)
+        key = ('update_if_version', fields)
+        sql = self._sql_cache.get(key) or self._cache_sql(
+            key,
+            f"UPDATE `{self.table_name}` SET {self._set_clause(fields)} WHERE `id` = %s AND `{self.version_field}` = %s"
+        )
+        rows_affected = self.db.execute_update(sql, tuple(values))
+        self._invalidate_cache()
+        return rows_affected > 0
+    
+    def update_with_retry(self, record_id: Union[str, int],
+                          mutate: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                          max_attempts: int = DEFAULT_CAS_ATTEMPTS) -> Optional[Dict[str, Any]]:
+        """
+        读取-修改-写回（乐观锁），版本冲突时退避后重新读取并重试
+        
+        Args:
+            record_id: 记录ID
+            mutate: 接收最新记录，返回要更新的字段；返回None或空字典表示无需更新。冲突时会被再次调用，不应有其他副作用
+            max_attempts: 最大尝试次数
+        
+        Returns:
+            更新后的记录（无需更新时为读取到的记录），记录不存在时返回None
+        
+        Raises:
+            ConcurrentUpdateError: 达到最大尝试次数仍然冲突
+        
+        不能在 transaction() 块内调用：可重复读隔离级别下重新读取仍是事务开始时的旧版本
+        """
+        if self.db.in_transaction():
+            raise RuntimeError("update_with_retry 不能在事务内调用")
+        
+        for attempt in range(max_attempts):
+            # 先写入该行在合并写队列中的更新，避免版本号比较基于旧值
+            self._flush_pending_writes(record_id)
+            record = self._find_by_id(record_id)
+            if record is None:
+                return None
+            
+            changes = mutate(record)
+            if not changes:
+                return record
+            if self.update_if_version(record_id, record[self.version_field], changes):
+                record.update(changes)
+                record[self.version_field] += 1
+                return record
+            
+            logger.debug(f"{self.table_name} 记录 {record_id} 版本冲突，第 {attempt + 1} 次重试")
+            time.sleep(random.uniform(0, CAS_RETRY_BACKOFF * (2 ** attempt)))
+        
+        raise ConcurrentUpdateError(f"{self.table_name} 记录 {record_id} 连续 {max_attempts} 次版本冲突")
     
     def delete(self, record_id: Union[str, int]) -> int:
         """删除记录"""
-        sql = f"DELETE FROM `{self.table_name}` WHERE `id` = %s"
-        return self.db.execute_update(sql, (record_id,))
+        sql = self._sql_cache.get('delete') or self._cache_sql(
+            'delete', f"DELETE FROM `{self.table_name}` WHERE `id` = %s"
+        )
+        rows_affected = self.db.execute_update(sql, (record_id,))
+        self._invalidate_cache()
+        return rows_affected
     
     def batch_insert(self, data_list: List[Dict[str, Any]]) -> int:
         """批量插入记录"""
@@ -131,10 +761,9 @@ class BaseDAO(ABC):
         processed_data_list = [self._prepare_data_for_insert(data) for data in data_list]
         
         # 使用第一条记录的字段作为模板
-        fields = list(processed_data_list[0].keys())
-        placeholders = ["%s"] * len(fields)
+        fields = tuple(processed_data_list[0])
         
-        sql = f"INSERT INTO `{self.table_name}` (`{'`, `'.join(fields)}`) VALUES ({', '.join(placeholders)})"
+        sql = self._insert_sql(fields)
         
         # 准备批量参数
         params_list = []
@@ -142,18 +771,125 @@ class BaseDAO(ABC):
             values = [self._serialize_field_value(data.get(field)) for field in fields]
             params_list.append(tuple(values))
         
-        return self.db.execute_batch(sql, params_list)
+        rows_affected = self.db.execute_batch(sql, params_list)
+        self._invalidate_cache()
+        return rows_affected
+    
+    def bulk_upsert(self, rows: List[Dict[str, Any]], conflict_columns: List[str],
+                    update_columns: Optional[List[str]] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """
+        批量插入或更新记录
+        
+        每 chunk_size 行生成一条多行 INSERT ... VALUES (...),(...) ON DUPLICATE KEY UPDATE 语句，
+        所有语句在同一事务中执行。字段组合不同的行分组后分别生成语句。
+        
+        Args:
+            rows: 记录列表
+            conflict_columns: 冲突判断字段（需对应主键或唯一索引）
+            update_columns: 冲突时更新的字段，默认为除主键、创建时间和冲突字段以外的所有字段；
+                            传入空列表表示冲突时保留原记录（等同于忽略）
+            chunk_size: 每条语句包含的最大行数
+        
+        Returns:
+            影响行数（MySQL中新插入计1，更新计2，未变化计0）
+        """
+        if not rows:
+            return 0
+        
+        rows_affected = self.db.execute_statements(
+            self._build_upsert_statements(rows, conflict_columns, update_columns, chunk_size)
+        )
+        self._invalidate_cache()
+        return rows_affected
+    
+    def upsert(self, data: Dict[str, Any], conflict_columns: List[str], update_columns: Optional[List[str]] = None) -> int:
+        """插入或更新单条记录（一次往返）"""
+        return self.bulk_upsert([data], conflict_columns, update_columns)
+    
+    def _build_upsert_statements(self, rows: List[Dict[str, Any]], conflict_columns: List[str],
+                                 update_columns: Optional[List[str]] = None,
+                                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Tuple[str, tuple]]:
+        """生成批量插入或更新的 (SQL, 参数) 列表，参数含义同 bulk_upsert"""
+        chunk_size = max(1, int(chunk_size))
+        
+        # 按字段组合分组，保持原有行顺序
+        grouped: Dict[Tuple[str, ...], List[tuple]] = {}
+        for row in rows:
+            data = self._prepare_data_for_insert(row)
+            fields = tuple(data)
+            grouped.setdefault(fields, []).append(
+                tuple(self._serialize_field_value(value) for value in data.values())
+            )
+        
+        statements = []
+        for fields, values_list in grouped.items():
+            if update_columns is None:
+                excluded = set(conflict_columns) | {'id', 'created_at'}
+                updates = tuple(field for field in fields if field not in excluded)
+            else:
+                updates = tuple(field for field in update_columns if field in fields)
+            
+            for start in range(0, len(values_list), chunk_size):
+                chunk = values_list[start:start + chunk_size]
+                sql = self._upsert_sql(fields, updates, tuple(conflict_columns), len(chunk))
+                statements.append((sql, tuple(value for values in chunk for value in values)))
+        
+        return statements
+    
+    def _upsert_sql(self, fields: Tuple[str, ...], update_columns: Tuple[str, ...],
+                    conflict_columns: Tuple[str, ...], row_count: int) -> str:
+        """获取指定字段组合和行数的 INSERT ... ON DUPLICATE KEY UPDATE 语句"""
+        key = ('upsert', fields, update_columns, conflict_columns, row_count)
+        sql = self._sql_cache.get(key)
+        if sql:
+            return sql
+        
+        row_placeholder = f"({', '.join(['%s'] * len(fields))})"
+        if update_columns:
+            assignments = ', '.join(f"`{field}` = VALUES(`{field}`)" for field in update_columns)
+            if self.version_field:
+                assignments += f", `{self.version_field}` = `{self.version_field}` + 1"
+        else:
+            # 冲突时不更新任何字段
+            assignments = f"`{conflict_columns[0]}` = `{conflict_columns[0]}`"
+        
+        return self._cache_sql(
+            key,
+            f"INSERT INTO `{self.table_name}` (`{'`, `'.join(fields)}`) "
+            f"VALUES {', '.join([row_placeholder] * row_count)} "
+            f"ON DUPLICATE KEY UPDATE {assignments}"
+        )
+    
+    def find_existing_values(self, field: str, values: List[Any], chunk_size: int = DEFAULT_CHUNK_SIZE) -> set:
+        """查询指定字段值中已存在于表中的部分（分批 IN 查询）"""
+        existing = set()
+        unique_values = list(dict.fromkeys(values))
+        for start in range(0, len(unique_values), chunk_size):
+            chunk = unique_values[start:start + chunk_size]
+            sql = f"SELECT `{field}` FROM `{self.table_name}` WHERE `{field}` IN ({', '.join(['%s'] * len(chunk))})"
+            for record in self.db.execute_query(sql, tuple(chunk)):
+                existing.add(record[field])
+        return existing
     
     def _process_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
         """处理从数据库查询出的记录"""
         if not record:
             return record
-        
-        processed = {}
-        for key, value in record.items():
-            processed[key] = self._deserialize_field_value(key, value)
-        
-        return processed
+        return self._process_records((record,))[0]
+    
+    def _process_records(self, records) -> List[Dict[str, Any]]:
+        """批量处理查询结果：复制每行后只对需要转换的字段调用转换函数"""
+        converters = self._get_row_converters()
+        processed_list = []
+        append = processed_list.append
+        for record in records:
+            processed = dict(record)
+            for field, convert in converters:
+                value = processed.get(field)
+                if value is not None:
+                    processed[field] = convert(value)
+            append(processed)
+        return processed_list
     
     def _serialize_field_value(self, value: Any) -> Any:
         """序列化字段值用于数据库存储"""
@@ -164,9 +900,9 @@ class BaseDAO(ABC):
         if isinstance(value, (dict, list)):
             return json_serialize(value)
         
-        # datetime字段处理
+        # datetime字段处理：原生datetime直接交给驱动，带时区的先转换为业务时区本地时间
         if isinstance(value, datetime):
-            return format_datetime(value)
+            return to_local(value)
         
         return value
     
@@ -175,29 +911,21 @@ class BaseDAO(ABC):
         if value is None:
             return None
         
-        # JSON字段处理
-        if field_name in self._get_json_fields():
-            return json_deserialize(value)
-        
-        # datetime字段处理  
-        if field_name in self._get_datetime_fields():
-            if isinstance(value, datetime):
-                return value.isoformat()
-            return format_datetime(parse_datetime(str(value)))
-        
-        return value
+        convert = dict(self._get_row_converters()).get(field_name)
+        return convert(value) if convert else value
     
     def _prepare_data_for_insert(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """准备插入数据"""
         prepared = data.copy()
+        table_fields = self._get_table_field_set()
         
         # 添加创建时间
-        if 'created_at' in self._get_table_fields() and 'created_at' not in prepared:
-            prepared['created_at'] = datetime.now()
+        if 'created_at' in table_fields and 'created_at' not in prepared:
+            prepared['created_at'] = local_now()
         
         # 添加更新时间
-        if 'updated_at' in self._get_table_fields() and 'updated_at' not in prepared:
-            prepared['updated_at'] = datetime.now()
+        if 'updated_at' in table_fields and 'updated_at' not in prepared:
+            prepared['updated_at'] = local_now()
         
         return prepared
     
@@ -206,17 +934,24 @@ class BaseDAO(ABC):
         prepared = data.copy()
         
         # 更新时间
-        if 'updated_at' in self._get_table_fields():
-            prepared['updated_at'] = datetime.now()
+        if 'updated_at' in self._get_table_field_set():
+            prepared['updated_at'] = local_now()
         
         # 移除不允许更新的字段
         if 'id' in prepared:
             del prepared['id']
         if 'created_at' in prepared:
             del prepared['created_at']
+        # 版本号只能由更新语句自增
+        if self.version_field:
+            prepared.pop(self.version_field, None)
         
         return prepared
     
+    def _get_heavy_fields(self) -> List[str]:
+        """获取大字段列表（列表查询可延迟加载），默认无"""
+        return []
+    
     @abstractmethod
     def _get_table_fields(self) -> List[str]:
         """获取表字段列表"""
@@ -245,14 +980,18 @@ class KeyValueDAO(BaseDAO):
     
     def set_value(self, key: str, value: Any) -> bool:
         """设置键值"""
-        if self.exists_by_key(key):
-            return self.update_by_key(key, {'value': value}) > 0
-        else:
-            return self.insert({'key': key, 'value': value}) is not None
+        self.upsert_by_key(key, {'value': value})
+        return True
     
     def find_by_key(self, key: str) -> Optional[Dict[str, Any]]:
         """根据key查找记录"""
-        sql = f"SELECT * FROM `{self.table_name}` WHERE `{self._get_key_field()}` = %s"
+        return self._cached_read(('find_by_key', key), lambda: self._find_by_key(key))
+    
+    def _find_by_key(self, key: str) -> Optional[Dict[str, Any]]:
+        """根据key查询记录（不经过读缓存）"""
+        sql = self._sql_cache.get('find_by_key') or self._cache_sql(
+            'find_by_key', f"SELECT * FROM `{self.table_name}` WHERE `{self._get_key_field()}` = %s"
+        )
         result = self.db.execute_query(sql, (key,))
         if result:
             return self._process_record(result[0])
@@ -260,7 +999,9 @@ class KeyValueDAO(BaseDAO):
     
     def exists_by_key(self, key: str) -> bool:
         """检查key是否存在"""
-        sql = f"SELECT 1 FROM `{self.table_name}` WHERE `{self._get_key_field()}` = %s LIMIT 1"
+        sql = self._sql_cache.get('exists_by_key') or self._cache_sql(
+            'exists_by_key', f"SELECT 1 FROM `{self.table_name}` WHERE `{self._get_key_field()}` = %s LIMIT 1"
+        )
         result = self.db.execute_query(sql, (key,))
         return len(result) > 0
     
@@ -271,23 +1012,42 @@ class KeyValueDAO(BaseDAO):
         
         data = self._prepare_data_for_update(data)
         
-        set_clauses = []
-        values = []
-        
-        for field, value in data.items():
-            set_clauses.append(f"`{field}` = %s")
-            values.append(self._serialize_field_value(value))
-        
+        values = [self._serialize_field_value(value) for value in data.values()]
         values.append(key)
         
-        sql = f"UPDATE `{self.table_name}` SET {', '.join(set_clauses)} WHERE `{self._get_key_field()}` = %s"
+        sql = self._update_sql(tuple(data), self._get_key_field())
         
-        return self.db.execute_update(sql, tuple(values))
+        rows_affected = self.db.execute_update(sql, tuple(values))
+        self._invalidate_cache()
+        return rows_affected
     
     def delete_by_key(self, key: str) -> int:
         """根据key删除记录"""
-        sql = f"DELETE FROM `{self.table_name}` WHERE `{self._get_key_field()}` = %s"
-        return self.db.execute_update(sql, (key,))
+        sql = self._sql_cache.get('delete_by_key') or self._cache_sql(
+            'delete_by_key', f"DELETE FROM `{self.table_name}` WHERE `{self._get_key_field()}` = %s"
+        )
+        rows_affected = self.db.execute_update(sql, (key,))
+        self._invalidate_cache()
+        return rows_affected
+    
+    def upsert_by_key(self, key: str, data: Dict[str, Any]) -> int:
+        """根据key插入或更新记录（一次往返）"""
+        key_field = self._get_key_field()
+        return self.upsert({key_field: key, **data}, [key_field])
+    
+    def delete_by_keys(self, keys: List[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """根据key批量删除记录（分批 IN 删除，同一事务）"""
+        keys = list(dict.fromkeys(keys))
+        statements = []
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            sql = f"DELETE FROM `{self.table_name}` WHERE `{self._get_key_field()}` IN ({', '.join(['%s'] * len(chunk))})"
+            statements.append((sql, tuple(chunk)))
+        if not statements:
+            return 0
+        rows_affected = self.db.execute_statements(statements)
+        self._invalidate_cache()
+        return rows_affected
     
     @abstractmethod
     def _get_key_field(self) -> str:
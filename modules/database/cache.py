@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+# 已创建的缓存实例，用于汇总统计
+_caches: List['TTLCache'] = []
+_caches_lock = threading.Lock()
+
+# 缓存未命中标记
+_MISSING = object()
+
+
+class TTLCache:
+    """带过期时间和容量上限（LRU淘汰）的线程安全缓存"""
+
+    def __init__(self, name: str, ttl: float, max_size: int = 256):
+        """
+        Args:
+            name: 缓存名称（用于统计展示）
+            ttl: 每个键的存活秒数
+            max_size: 最大键数量，超出时淘汰最久未使用的键
+        """
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._lock = threading.Lock()
+        # 键 -> (过期时间, 值)，末尾为最近使用
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        # 每次 clear() 加一；加载期间发生过失效时丢弃加载结果，避免把旧数据写回缓存
+        self._generation = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+        with _caches_lock:
+            _caches.append(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """获取缓存值，不存在或已过期时返回 default"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """写入缓存值，指定 generation 且期间缓存已被清空时不写入"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """获取缓存值，未命中时调用 loader 加载并写入缓存"""
+        with self._lock:
+            generation = self._generation
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, generation)
+        return value
+
+    def clear(self):
+        """清空缓存（写操作后调用）"""
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self._stats['invalidations'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['ttl'] = self.ttl
+        stats['max_size'] = self.max_size
+        return stats
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """汇总所有缓存的统计信息，以缓存名称为键"""
+    with _caches_lock:
+        caches = list(_caches)
+    return {cache.name: cache.get_stats() for cache in caches}
@@ -1,5 +1,7 @@
-from typing import List, Dict, Any, Optional
-from modules.database.base_dao import BaseDAO, KeyValueDAO
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Callable
+from datetime import datetime, timedelta
+from modules.database.base_dao import BaseDAO, KeyValueDAO, select_list
+from modules.database.manager import local_now, serialize_datetime, to_local
 import logging
 
 logger = logging.getLogger(__name__)
@@ -7,6 +9,9 @@ logger = logging.getLogger(__name__)
 class AIConfigDAO(BaseDAO):
     """AI配置DAO"""
     
+    # 读多写少：启用读缓存，写操作自动失效
+    cache_ttl = 60
+    
     def __init__(self):
         super().__init__('ai_configs')
     
@@ -32,6 +37,9 @@ class AIConfigDAO(BaseDAO):
 class AIConfigSettingsDAO(KeyValueDAO):
     """AI配置设置DAO"""
     
+    # 读多写少：启用读缓存，写操作自动失效
+    cache_ttl = 60
+    
     def __init__(self):
         super().__init__('ai_config_settings')
     
@@ -59,10 +67,8 @@ class AIConfigSettingsDAO(KeyValueDAO):
     
     def set_value(self, key: str, value: Any) -> bool:
         """设置键值 - 重写以使用正确的字段名"""
-        if self.exists_by_key(key):
-            return self.update_by_key(key, {'setting_value': value}) > 0
-        else:
-            return self.insert({'setting_key': key, 'setting_value': value}) is not None
+        self.upsert_by_key(key, {'setting_value': value})
+        return True
     
     def get_current_config_id(self) -> str:
         """获取当前配置ID"""
@@ -93,79 +99,271 @@ class ScheduledRequestDAO(BaseDAO):
         return self.find_all({'enabled': 1}, 'created_at ASC')
     
     def update_execution_result(self, request_id: str, success: bool, result_data: str = None, error: str = None) -> bool:
-        """更新执行结果"""
-        from datetime import datetime
+        """
+        更新执行结果（执行次数累加、保留最后一次结果，经合并写队列写入）
         
-        # 先获取当前执行次数
-        current = self.find_by_id(request_id)
-        if not current:
+        请求不存在时返回False；加入合并写队列后即返回True，实际写入在合并窗口结束时进行，
+        写入失败由合并写队列重试并记录错误日志（/api/admin/db-stats 的 write_behind 统计），不再反馈给调用方
+        """
+        if not self.exists(request_id):
             return False
-        
-        execution_count = current.get('execution_count', 0) + 1
-        
+        now = local_now()
         if success:
             last_result = {
                 "success": True,
                 "data": result_data,
-                "executed_at": datetime.now().isoformat()
+                "executed_at": serialize_datetime(now)
             }
         else:
             last_result = {
                 "success": False,
                 "error": error,
-                "executed_at": datetime.now().isoformat()
+                "executed_at": serialize_datetime(now)
             }
         
-        update_data = {
-            'last_executed': datetime.now(),
-            'last_result': last_result,
-            'execution_count': execution_count
-        }
-        
-        return self.update(request_id, update_data) > 0
+        return self._write_behind(request_id, {
+            'last_executed': ('set', now),
+            'last_result': ('set', last_result),
+            'execution_count': ('add', 1)
+        })
 
 
 class ScheduledPostDAO(BaseDAO):
     """定时发布任务DAO"""
     
+    # 多个发布器并发处理同一任务时使用乐观锁
+    version_field = 'version'
+    
+    # 到期扫描默认只读取 (status, scheduled_at, created_at) 索引已包含的字段（InnoDB二级索引含主键），无需回表
+    DUE_COLUMNS = ('id', 'scheduled_at', 'created_at')
+    
+    # 发布时间变更监听器（如定时发布器的唤醒），回调参数为 (任务ID, 发布时间)，发布时间为None表示不再待发布；
+    # 本进程经DAO的插入、改期、状态变更和删除在提交后通知，其他进程或直接执行的SQL需监听方自行定期核对
+    _schedule_listeners: List[Callable[[str, Optional[datetime]], Any]] = []
+    
     def __init__(self):
         super().__init__('scheduled_posts')
     
+    @classmethod
+    def add_schedule_listener(cls, listener: Callable[[str, Optional[datetime]], Any]):
+        """注册发布时间变更监听器"""
+        if listener not in cls._schedule_listeners:
+            cls._schedule_listeners.append(listener)
+    
+    @classmethod
+    def remove_schedule_listener(cls, listener: Callable[[str, Optional[datetime]], Any]):
+        """移除发布时间变更监听器"""
+        if listener in cls._schedule_listeners:
+            cls._schedule_listeners.remove(listener)
+    
+    def _notify_schedule(self, changes: List[Tuple[str, Optional[datetime]]]):
+        """通知发布时间变更；事务内的变更在提交后通知，回滚时丢弃"""
+        listeners = list(ScheduledPostDAO._schedule_listeners)
+        if not listeners or not changes:
+            return
+        
+        def notify():
+            for listener in listeners:
+                for post_id, scheduled_at in changes:
+                    try:
+                        listener(post_id, scheduled_at)
+                    except Exception as e:
+                        logger.error(f"发布时间变更通知失败: {e}")
+        
+        uow = self.db.current_transaction()
+        if uow is not None:
+            uow.on_commit(notify)
+        else:
+            notify()
+    
+    @staticmethod
+    def _schedule_change(post_id: str, data: Dict[str, Any]) -> Optional[Tuple[str, Optional[datetime]]]:
+        """根据写入的字段计算发布时间变更，与发布时间无关的写入返回None"""
+        status = data.get('status')
+        if status is not None and status != 'pending':
+            return post_id, None
+        scheduled_at = data.get('scheduled_at')
+        if isinstance(scheduled_at, datetime):
+            return post_id, to_local(scheduled_at)
+        return None
+    
+    def insert(self, data: Dict[str, Any]):
+        result = super().insert(data)
+        change = self._schedule_change(data.get('id', result), data)
+        if change:
+            self._notify_schedule([change])
+        return result
+    
+    def batch_insert(self, data_list: List[Dict[str, Any]]) -> int:
+        result = super().batch_insert(data_list)
+        self._notify_schedule([change for change in (self._schedule_change(data.get('id'), data) for data in data_list)
+                               if change and change[0] is not None])
+        return result
+    
+    def update(self, record_id: str, data: Dict[str, Any]) -> int:
+        rows_affected = super().update(record_id, data)
+        change = self._schedule_change(record_id, data) if rows_affected else None
+        if change:
+            self._notify_schedule([change])
+        return rows_affected
+    
+    def delete(self, record_id: str) -> int:
+        rows_affected = super().delete(record_id)
+        if rows_affected:
+            self._notify_schedule([(record_id, None)])
+        return rows_affected
+    
     def _get_table_fields(self) -> List[str]:
-        return ['id', 'title', 'content', 'topic_url', 'topic_id', 'circle_type', 'topic_name', 'publish_type', 'account_id', 'auto_publish_id', 'status', 'scheduled_at', 'published_at', 'error', 'failed_at', 'created_at', 'updated_at']
+        return ['id', 'title', 'content', 'topic_url', 'topic_id', 'circle_type', 'topic_name', 'publish_type', 'account_id', 'auto_publish_id', 'status', 'scheduled_at', 'published_at', 'error', 'failed_at', 'claimed_by', 'lease_until', 'version', 'created_at', 'updated_at']
     
     def _get_json_fields(self) -> List[str]:
         return []
     
     def _get_datetime_fields(self) -> List[str]:
-        return ['scheduled_at', 'published_at', 'failed_at', 'created_at', 'updated_at']
+        return ['scheduled_at', 'published_at', 'failed_at', 'lease_until', 'created_at', 'updated_at']
+    
+    def _get_heavy_fields(self) -> List[str]:
+        return ['content']
     
-    def find_pending_posts(self) -> List[Dict[str, Any]]:
-        """查找待发布的任务（已到发布时间）"""
-        from datetime import datetime
+    def find_all_pending_posts(self, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """查找所有待发布的任务（包括未到发布时间的），可只查询指定字段"""
+        return self.find_all({'status': 'pending'}, '`scheduled_at` ASC', columns=columns)
+
+    def peek_due(self, limit: int = 1, columns: Optional[Sequence[str]] = DUE_COLUMNS,
+                 defer_heavy: bool = False) -> List[Dict[str, Any]]:
+        """
+        按创建时间顺序查看最多 limit 个已到期的待发布任务（不认领）
         
-        sql = f"""
-        SELECT * FROM `{self.table_name}` 
-        WHERE `status` = 'pending' AND `scheduled_at` <= %s 
-        ORDER BY `created_at` ASC
+        默认只返回索引覆盖的字段；columns=None 且 defer_heavy=True 时返回除内容外的全部字段，内容在首次访问时按主键补查
         """
-        result = self.db.execute_query(sql, (datetime.now(),))
-        return [self._process_record(record) for record in result]
-
-    def find_all_pending_posts(self) -> List[Dict[str, Any]]:
-        """查找所有待发布的任务（包括未到发布时间的）"""
-        sql = f"""
-        SELECT * FROM `{self.table_name}`
+        columns, deferred = self._resolve_columns(columns, defer_heavy)
+        key = ('peek_due', columns)
+        sql = self._sql_cache.get(key) or self._cache_sql(key, f"""
+        SELECT {select_list(columns)} FROM `{self.table_name}`
+        WHERE `status` = 'pending' AND `scheduled_at` <= %s
+        ORDER BY `created_at` ASC LIMIT %s
+        """)
+        result = self.db.execute_query(sql, (local_now(), limit))
+        return self._wrap_records(result, deferred)
+    
+    def next_due_time(self) -> Optional[datetime]:
+        """最早的待发布时间，沿 (status, scheduled_at) 索引只读一行"""
+        sql = self._sql_cache.get('next_due_time') or self._cache_sql('next_due_time', f"""
+        SELECT `scheduled_at` FROM `{self.table_name}`
         WHERE `status` = 'pending'
-        ORDER BY `scheduled_at` ASC
-        """
+        ORDER BY `scheduled_at` ASC LIMIT 1
+        """)
         result = self.db.execute_query(sql)
-        return [self._process_record(record) for record in result]
-
+        if not result or result[0]['scheduled_at'] is None:
+            return None
+        return self._deserialize_field_value('scheduled_at', result[0]['scheduled_at'])
+    
     def get_next_post_to_publish(self) -> Optional[Dict[str, Any]]:
-        """获取下一个要发布的任务"""
-        pending_posts = self.find_pending_posts()
-        return pending_posts[0] if pending_posts else None
+        """获取下一个要发布的任务（内容在首次访问时加载）"""
+        posts = self.peek_due(1, columns=None, defer_heavy=True)
+        return posts[0] if posts else None
+    
+    def find_upcoming(self, limit: int) -> List[Tuple[str, datetime]]:
+        """
+        最早需要处理的 limit 个任务的 (任务ID, 时间)，按时间升序
+        
+        待发布任务取发布时间，已认领任务取租约到期时间（到期未完成时需要重新认领）
+        """
+        upcoming = []
+        for status, field in (('pending', 'scheduled_at'), ('claimed', 'lease_until')):
+            for post in self.find_all({'status': status}, f'`{field}` ASC', limit, columns=['id', field]):
+                if post[field] is not None:
+                    upcoming.append((post['id'], post[field]))
+        upcoming.sort(key=lambda item: item[1])
+        return upcoming[:limit]
+    
+    def claim_due_posts(self, claimed_by: str, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """
+        认领最多 limit 个已到期的任务（含租约已过期的已认领任务），按创建时间升序返回认领成功的任务
+        
+        先按索引查出候选任务，再以带原条件的UPDATE逐行认领：多个发布进程竞争同一行时只有一个能更新成功，
+        其余进程的UPDATE重新判断条件后跳过该行。认领的任务状态为 claimed，租约到期前其他进程不会处理；
+        进程退出或崩溃未完成的任务在租约到期后由任一发布进程重新认领。
+        """
+        now = local_now()
+        lease_until = now + timedelta(seconds=lease_seconds)
+        claimable = ("((`status` = 'pending' AND `scheduled_at` <= %s) "
+                     "OR (`status` = 'claimed' AND `lease_until` <= %s))")
+        expired_sql = self._sql_cache.get('claim_expired') or self._cache_sql('claim_expired', f"""
+        SELECT `id`, `created_at` FROM `{self.table_name}`
+        WHERE `status` = 'claimed' AND `lease_until` <= %s
+        ORDER BY `lease_until` ASC LIMIT %s
+        """)
+        
+        with self.db.transaction():
+            candidates = self.peek_due(limit)
+            candidates += self._process_records(self.db.execute_query(expired_sql, (now, limit)))
+            if not candidates:
+                return []
+            candidates.sort(key=lambda row: row['created_at'])
+            post_ids = [row['id'] for row in candidates[:limit]]
+            
+            placeholders = ', '.join(['%s'] * len(post_ids))
+            fields = ('status', 'claimed_by', 'lease_until', 'updated_at')
+            rows_affected = self.db.execute_update(
+                f"UPDATE `{self.table_name}` SET {self._set_clause(fields)} "
+                f"WHERE `id` IN ({placeholders}) AND {claimable}",
+                ('claimed', claimed_by, lease_until, now, *post_ids, now, now)
+            )
+            self._invalidate_cache()
+            if not rows_affected:
+                return []
+            
+            # 内容只在实际发布时按主键加载（LazyRecord），认领时不读取
+            columns, deferred = self._resolve_columns(None, defer_heavy=True)
+            claimed = self.db.execute_query(
+                f"SELECT {select_list(columns)} FROM `{self.table_name}` "
+                f"WHERE `id` IN ({placeholders}) AND `status` = 'claimed' AND `claimed_by` = %s "
+                f"ORDER BY `created_at` ASC",
+                (*post_ids, claimed_by)
+            )
+            claimed = self._wrap_records(claimed, deferred)
+            self._notify_schedule([(post['id'], post['lease_until']) for post in claimed])
+        return claimed
+    
+    def renew_claim(self, post_id: str, claimed_by: str, lease_seconds: float) -> bool:
+        """续期租约，任务已不属于该发布进程（被删除、改期或租约过期后被其他进程认领）时返回False"""
+        lease_until = local_now() + timedelta(seconds=lease_seconds)
+        fields = ('lease_until', 'updated_at')
+        sql = self._sql_cache.get('renew_claim') or self._cache_sql('renew_claim', f"""
+        UPDATE `{self.table_name}` SET {self._set_clause(fields)}
+        WHERE `id` = %s AND `status` = 'claimed' AND `claimed_by` = %s
+        """)
+        rows_affected = self.db.execute_update(sql, (lease_until, local_now(), post_id, claimed_by))
+        self._invalidate_cache()
+        if rows_affected:
+            self._notify_schedule([(post_id, lease_until)])
+        return rows_affected > 0
+    
+    def release_claims(self, claimed_by: str, post_ids: Sequence[str]) -> int:
+        """
+        交还该发布进程认领后尚未开始发布的任务：恢复为待发布并通知发布时间，返回释放的任务数
+        
+        只处理调用方指定的任务；已开始发布但未确认结果的任务不在此交还，由租约到期后重新认领
+        """
+        if not post_ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        fields = ('status', 'claimed_by', 'lease_until', 'updated_at')
+        rows_affected = self.db.execute_update(
+            f"UPDATE `{self.table_name}` SET {self._set_clause(fields)} "
+            f"WHERE `id` IN ({placeholders}) AND `status` = 'claimed' AND `claimed_by` = %s",
+            ('pending', None, None, local_now(), *post_ids, claimed_by)
+        )
+        self._invalidate_cache()
+        if rows_affected:
+            released = self._process_records(self.db.execute_query(
+                f"SELECT `id`, `scheduled_at` FROM `{self.table_name}` "
+                f"WHERE `id` IN ({placeholders}) AND `status` = 'pending'",
+                tuple(post_ids)
+            ))
+            self._notify_schedule([(post['id'], post['scheduled_at']) for post in released])
+        return rows_affected
     
     def mark_as_published(self, post_id: str) -> bool:
         """标记任务为已发布并删除"""
@@ -173,18 +371,36 @@ class ScheduledPostDAO(BaseDAO):
     
     def mark_as_failed(self, post_id: str, error: str) -> bool:
         """标记任务为发布失败"""
-        from datetime import datetime
-        
         update_data = {
             'status': 'failed',
             'error': error,
-            'failed_at': datetime.now()
+            'failed_at': local_now(),
+            'claimed_by': None,
+            'lease_until': None
         }
         return self.update(post_id, update_data) > 0
     
     def get_pending_count(self) -> int:
-        """获取待发布任务数量"""
-        return self.count({'status': 'pending'})
+        """获取待发布任务数量（含已认领、正在发布的任务）"""
+        sql = self._sql_cache.get('get_pending_count') or self._cache_sql('get_pending_count', f"""
+        SELECT COUNT(*) as count FROM `{self.table_name}` WHERE `status` IN ('pending', 'claimed')
+        """)
+        result = self.db.execute_query(sql)
+        return result[0]['count'] if result else 0
+    
+    def get_latest_scheduled_at(self, exclude_id: str = None) -> Optional[datetime]:
+        """获取待发布任务中最晚的发布时间（可排除指定任务），沿 (status, scheduled_at) 索引倒序只读一行"""
+        key = 'get_latest_scheduled_at_excluding' if exclude_id else 'get_latest_scheduled_at'
+        exclude = " AND `id` <> %s" if exclude_id else ""
+        sql = self._sql_cache.get(key) or self._cache_sql(key, f"""
+        SELECT `scheduled_at` FROM `{self.table_name}`
+        WHERE `status` = 'pending'{exclude}
+        ORDER BY `scheduled_at` DESC LIMIT 1
+        """)
+        result = self.db.execute_query(sql, (exclude_id,) if exclude_id else None)
+        if not result or result[0]['scheduled_at'] is None:
+            return None
+        return self._deserialize_field_value('scheduled_at', result[0]['scheduled_at'])
     
     def reschedule_post(self, post_id: str, new_scheduled_at) -> bool:
         """重新安排发布时间"""
@@ -192,7 +408,9 @@ class ScheduledPostDAO(BaseDAO):
             'scheduled_at': new_scheduled_at,
             'status': 'pending',
             'error': None,
-            'failed_at': None
+            'failed_at': None,
+            'claimed_by': None,
+            'lease_until': None
         }
         return self.update(post_id, update_data) > 0
 
@@ -224,7 +442,7 @@ class TopicDAO(BaseDAO):
         """根据名称关键词搜索话题"""
         sql = f"SELECT * FROM `{self.table_name}` WHERE `name` LIKE %s ORDER BY `updated_at` DESC"
         result = self.db.execute_query(sql, (f'%{name_keyword}%',))
-        return [self._process_record(record) for record in result]
+        return self._process_records(result)
     
     def get_all_groups(self) -> List[str]:
         """获取所有分组"""
@@ -277,6 +495,9 @@ class GroupsDAO(BaseDAO):
 class PromptDAO(KeyValueDAO):
     """提示词DAO"""
     
+    # 读多写少：启用读缓存，写操作自动失效
+    cache_ttl = 60
+    
     def __init__(self):
         super().__init__('prompts')
     
@@ -301,10 +522,15 @@ class PromptDAO(KeyValueDAO):
     
     def set_prompt(self, name: str, content: str) -> bool:
         """设置提示词"""
-        if self.exists_by_key(name):
-            return self.update_by_key(name, {'content': content}) > 0
-        else:
-            return self.insert({'name': name, 'content': content}) is not None
+        self.upsert_by_key(name, {'content': content})
+        return True
+    
+    def save_prompts(self, prompts: Dict[str, str]) -> int:
+        """批量插入或更新提示词"""
+        return self.bulk_upsert(
+            [{'name': name, 'content': content} for name, content in prompts.items()],
+            conflict_columns=['name']
+        )
     
     def delete_prompt(self, name: str) -> bool:
         """删除提示词"""
@@ -373,7 +599,7 @@ class KeywordDAO(BaseDAO):
     
     def find_by_group(self, group_name: str) -> List[Dict[str, Any]]:
         """根据分组查找关键词"""
-        return self.find_all({'group_name': group_name}, 'created_at ASC')
+        return self.find_all({'group_name': group_name}, 'created_at ASC, id ASC')
     
     def add_keyword_to_group(self, group_name: str, keyword: str) -> bool:
         """添加关键词到分组"""
@@ -411,7 +637,7 @@ class KeywordDAO(BaseDAO):
         SELECT kg.group_name, COALESCE(k.keyword, '') as keyword
         FROM keyword_groups kg 
         LEFT JOIN keywords k ON kg.group_name = k.group_name 
-        ORDER BY kg.group_name, k.created_at
+        ORDER BY kg.group_name, k.created_at, k.id
         """
         result = self.db.execute_query(sql)
         
@@ -428,6 +654,17 @@ class KeywordDAO(BaseDAO):
         
         return groups
     
+    def replace_group_keywords(self, group_name: str, keywords: List[str]) -> int:
+        """用给定列表替换分组的全部关键词（一次删除 + 多行插入，同一事务）"""
+        statements = [(f"DELETE FROM `{self.table_name}` WHERE `group_name` = %s", (group_name,))]
+        statements.extend(self._build_upsert_statements(
+            [{'group_name': group_name, 'keyword': keyword} for keyword in keywords],
+            conflict_columns=['group_name', 'keyword'],
+            update_columns=[]
+        ))
+        self.db.execute_statements(statements)
+        return len(keywords)
+    
     def delete_group(self, group_name: str) -> bool:
         """删除分组及其所有关键词"""
         try:
@@ -449,11 +686,14 @@ class KeywordDAO(BaseDAO):
 class AutoPublishConfigDAO(BaseDAO):
     """自动发布配置DAO"""
     
+    # 重试计数、发布计数等读取-修改-写回操作使用乐观锁
+    version_field = 'version'
+    
     def __init__(self):
         super().__init__('auto_publish_configs')
     
     def _get_table_fields(self) -> List[str]:
-        return ['id', 'topic_id', 'publish_type', 'account_id', 'prompt_key', 'min_interval', 'max_interval', 'retry_count', 'max_retry', 'last_error', 'max_posts', 'current_posts', 'is_active', 'last_published_at', 'created_at', 'updated_at']
+        return ['id', 'topic_id', 'publish_type', 'account_id', 'prompt_key', 'min_interval', 'max_interval', 'retry_count', 'max_retry', 'last_error', 'max_posts', 'current_posts', 'is_active', 'last_published_at', 'version', 'created_at', 'updated_at']
     
     def _get_json_fields(self) -> List[str]:
         return []
@@ -476,26 +716,23 @@ class AutoPublishConfigDAO(BaseDAO):
     
     def find_publishable(self) -> List[Dict[str, Any]]:
         """查找可发布的配置（激活且未达到最大发布数量）"""
-        sql = f"""
+        sql = self._sql_cache.get('find_publishable') or self._cache_sql('find_publishable', f"""
         SELECT * FROM `{self.table_name}` 
         WHERE `is_active` = 1 
         AND (`max_posts` = -1 OR `current_posts` < `max_posts`)
         ORDER BY `last_published_at` ASC NULLS FIRST
-        """
+        """)
         return self.db.execute_query(sql)
     
     def increment_posts(self, config_id: str) -> bool:
-        """增加已发布数量"""
+        """增加已发布数量（事务外经合并写队列写入）"""
         try:
-            sql = f"""
-            UPDATE `{self.table_name}` 
-            SET `current_posts` = `current_posts` + 1, 
-                `last_published_at` = NOW(),
-                `updated_at` = NOW()
-            WHERE `id` = %s
-            """
-            rows_affected = self.db.execute_update(sql, (config_id,))
-            return rows_affected > 0
+            now = local_now()
+            return self._write_behind(config_id, {
+                'current_posts': ('add', 1),
+                'last_published_at': ('set', now),
+                'updated_at': ('set', now)
+            })
         except Exception as e:
             logger.error(f"增加发布数量失败: {e}")
             return False
@@ -509,37 +746,63 @@ class AutoPublishConfigDAO(BaseDAO):
             return False
     
     def increment_retry(self, config_id: str, error_msg: str = None) -> bool:
-        """增加重试次数并记录错误"""
+        """增加重试次数并记录错误（事务外经合并写队列写入）"""
         try:
-            sql = f"""
-            UPDATE `{self.table_name}` 
-            SET `retry_count` = `retry_count` + 1,
-                `last_error` = %s,
-                `updated_at` = NOW()
-            WHERE `id` = %s
-            """
-            rows_affected = self.db.execute_update(sql, (error_msg, config_id))
-            return rows_affected > 0
+            return self._write_behind(config_id, {
+                'retry_count': ('add', 1),
+                'last_error': ('set', error_msg),
+                'updated_at': ('set', local_now())
+            })
         except Exception as e:
             logger.error(f"增加重试次数失败: {e}")
             return False
     
     def reset_retry(self, config_id: str) -> bool:
-        """重置重试次数（成功后调用）"""
+        """重置重试次数（成功后调用，事务外经合并写队列写入）"""
         try:
-            return self.update(config_id, {
-                'retry_count': 0, 
-                'last_error': None,
-                'updated_at': 'NOW()'
-            }) > 0
+            return self._write_behind(config_id, {
+                'retry_count': ('set', 0),
+                'last_error': ('set', None),
+                'updated_at': ('set', local_now())
+            })
         except Exception as e:
             logger.error(f"重置重试次数失败: {e}")
             return False
     
-    def can_retry(self, config_id: str) -> bool:
-        """检查是否可以重试"""
+    def try_increment_retry(self, config_id: str, error_msg: str = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        检查并增加重试次数（乐观锁，检查和增加之间配置被修改时重新读取）
+        
+        Returns:
+            (结果, 更新后的配置): 结果为 retry（已增加重试次数）、exhausted（达到最大重试次数，已停用配置）、
+            inactive（配置已停用）或 missing（配置不存在）
+        """
+        outcome = ['missing']
+        
+        def decide(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            if not config.get('is_active'):
+                outcome[0] = 'inactive'
+                return None
+            if not self.can_retry(config_id, config):
+                outcome[0] = 'exhausted'
+                return {
+                    'is_active': 0,
+                    'last_error': f"达到最大重试次数: {error_msg or '生成内容失败'}"
+                }
+            outcome[0] = 'retry'
+            return {
+                'retry_count': config.get('retry_count', 0) + 1,
+                'last_error': error_msg
+            }
+        
+        config = self.update_with_retry(config_id, decide)
+        return outcome[0], config
+    
+    def can_retry(self, config_id: str, config: Dict[str, Any] = None) -> bool:
+        """检查是否可以重试，已查询出配置时可直接传入避免重复查询"""
         try:
-            config = self.find_by_id(config_id)
+            if config is None:
+                config = self.find_by_id(config_id)
             if not config:
                 return False
             
@@ -555,11 +818,14 @@ class AutoPublishConfigDAO(BaseDAO):
 class AIConversationDAO(BaseDAO):
     """AI对话历史DAO"""
     
+    # 追加消息需要读取-修改-写回整个JSON，使用乐观锁避免并发追加互相覆盖
+    version_field = 'version'
+    
     def __init__(self):
         super().__init__('ai_conversations')
     
     def _get_table_fields(self) -> List[str]:
-        return ['id', 'topic_id', 'config_id', 'messages', 'created_at', 'updated_at']
+        return ['id', 'topic_id', 'config_id', 'messages', 'version', 'created_at', 'updated_at']
     
     def _get_json_fields(self) -> List[str]:
         return ['messages']
@@ -567,30 +833,33 @@ class AIConversationDAO(BaseDAO):
     def _get_datetime_fields(self) -> List[str]:
         return ['created_at', 'updated_at']
     
+    def _get_heavy_fields(self) -> List[str]:
+        return ['messages']
+    
     def find_by_topic_id(self, topic_id: str) -> List[Dict[str, Any]]:
         """根据话题ID查找对话历史"""
         return self.find_all({'topic_id': topic_id})
     
     def get_latest_by_topic(self, topic_id: str) -> Optional[Dict[str, Any]]:
         """获取话题的最新对话历史（兼容旧版本，不建议使用）"""
-        sql = f"""
+        sql = self._sql_cache.get('get_latest_by_topic') or self._cache_sql('get_latest_by_topic', f"""
         SELECT * FROM `{self.table_name}`
         WHERE `topic_id` = %s
         ORDER BY `created_at` DESC
         LIMIT 1
-        """
-        result = self.db.execute_query(sql, (topic_id,))
+        """)
+        result = self._process_records(self.db.execute_query(sql, (topic_id,)))
         return result[0] if result else None
 
     def get_latest_by_config(self, config_id: str) -> Optional[Dict[str, Any]]:
         """根据配置ID获取最新的对话历史"""
-        sql = f"""
+        sql = self._sql_cache.get('get_latest_by_config') or self._cache_sql('get_latest_by_config', f"""
         SELECT * FROM `{self.table_name}`
         WHERE `config_id` = %s
         ORDER BY `created_at` DESC
         LIMIT 1
-        """
-        result = self.db.execute_query(sql, (config_id,))
+        """)
+        result = self._process_records(self.db.execute_query(sql, (config_id,)))
         return result[0] if result else None
 
     def find_by_config_id(self, config_id: str) -> List[Dict[str, Any]]:
@@ -614,21 +883,18 @@ class AIConversationDAO(BaseDAO):
     
     def add_message(self, conversation_id: str, role: str, content: str) -> bool:
         """为现有对话添加消息"""
+        return self.append_messages(conversation_id, [{
+            'role': role,
+            'content': content
+        }])
+    
+    def append_messages(self, conversation_id: str, new_messages: List[Dict[str, Any]]) -> bool:
+        """在现有对话末尾追加消息（乐观锁，并发追加时基于最新历史重试）"""
         try:
-            # 获取现有对话
-            conversation = self.find_by_id(conversation_id)
-            if not conversation:
-                return False
+            def append(conversation: Dict[str, Any]) -> Dict[str, Any]:
+                return {'messages': (conversation.get('messages') or []) + list(new_messages)}
             
-            # 添加新消息
-            messages = conversation.get('messages', [])
-            messages.append({
-                'role': role,
-                'content': content
-            })
-            
-            # 更新对话
-            return self.update(conversation_id, {'messages': messages}) > 0
+            return self.update_with_retry(conversation_id, append) is not None
         except Exception as e:
             logger.error(f"添加消息失败: {e}")
             return False
@@ -649,6 +915,9 @@ class DraftDAO(BaseDAO):
     def _get_datetime_fields(self) -> List[str]:
         return ['created_at', 'updated_at']
 
+    def _get_heavy_fields(self) -> List[str]:
+        return ['content']
+
     def find_by_source(self, source: str) -> List[Dict[str, Any]]:
         """根据来源查找草稿"""
         return self.find_all({'source': source}, 'created_at DESC')
@@ -661,18 +930,21 @@ class DraftDAO(BaseDAO):
         """根据关键词搜索草稿(标题或内容)"""
         sql = f"SELECT * FROM `{self.table_name}` WHERE `title` LIKE %s OR `content` LIKE %s ORDER BY `created_at` DESC"
         result = self.db.execute_query(sql, (f'%{keyword}%', f'%{keyword}%'))
-        return [self._process_record(record) for record in result]
+        return self._process_records(result)
 
     def find_by_tag(self, tag: str) -> List[Dict[str, Any]]:
         """根据标签查找草稿"""
         sql = f"SELECT * FROM `{self.table_name}` WHERE FIND_IN_SET(%s, `tags`) > 0 ORDER BY `created_at` DESC"
         result = self.db.execute_query(sql, (tag,))
-        return [self._process_record(record) for record in result]
+        return self._process_records(result)
 
 
 class MaimaiAccountDAO(BaseDAO):
     """脉脉账号DAO"""
 
+    # 读多写少：启用读缓存，写操作自动失效
+    cache_ttl = 60
+
     def __init__(self):
         super().__init__('maimai_accounts')
 
@@ -685,9 +957,12 @@ class MaimaiAccountDAO(BaseDAO):
     def _get_datetime_fields(self) -> List[str]:
         return ['created_at', 'updated_at']
 
-    def find_active(self) -> List[Dict[str, Any]]:
-        """查找所有激活的账号"""
-        return self.find_all({'is_active': 1}, 'created_at ASC')
+    def _get_heavy_fields(self) -> List[str]:
+        return ['access_token']
+
+    def find_active(self, defer_heavy: bool = False) -> List[Dict[str, Any]]:
+        """查找所有激活的账号，defer_heavy 时 access_token 在访问时才加载"""
+        return self.find_all({'is_active': 1}, 'created_at ASC', defer_heavy=defer_heavy)
 
     def find_default(self) -> Optional[Dict[str, Any]]:
         """查找默认账号"""
@@ -705,6 +980,7 @@ class MaimaiAccountDAO(BaseDAO):
             # 先将所有账号的is_default设为0
             sql = f"UPDATE `{self.table_name}` SET `is_default` = 0"
             self.db.execute_update(sql)
+            self._invalidate_cache()
 
             # 再将指定账号设为默认
             return self.update(account_id, {'is_default': 1}) > 0
@@ -732,4 +1008,22 @@ class MaimaiAccountDAO(BaseDAO):
 
     def exists_by_name(self, name: str) -> bool:
         """检查账号名称是否已存在"""
-        return self.find_by_name(name) is not None
\ No newline at end of file
+        return self.find_by_name(name) is not None
+
+class PublishRateBucketDAO(BaseDAO):
+    """发布限流令牌桶DAO（按账号，多个发布进程共享）"""
+    
+    # 多个进程同时预约令牌时使用乐观锁
+    version_field = 'version'
+    
+    def __init__(self):
+        super().__init__('publish_rate_buckets')
+    
+    def _get_table_fields(self) -> List[str]:
+        return ['id', 'tokens', 'refilled_at', 'version', 'created_at', 'updated_at']
+    
+    def _get_json_fields(self) -> List[str]:
+        return []
+    
+    def _get_datetime_fields(self) -> List[str]:
+        return ['refilled_at', 'created_at', 'updated_at']
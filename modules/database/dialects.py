@@ -0,0 +1,488 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+# 表示连接已断开的MySQL客户端错误码（服务端断开、连接丢失、管道中断等）
+CONNECTION_LOST_ERRORS = frozenset({2006, 2013, 2014, 2045, 2055})
+
+# 表示无法建立连接的MySQL错误码（无法连接服务器、连接数已满等）
+CONNECT_FAILED_ERRORS = frozenset({1040, 2002, 2003, 2005})
+
+# 可以安全重放的只读语句前缀
+READ_ONLY_PREFIXES = ('SELECT', 'SHOW', 'EXPLAIN', 'DESCRIBE', 'DESC')
+
+# 每个方言缓存的改写结果上限（DAO生成的语句数量有限，超出后不再缓存）
+MAX_TRANSLATED_STATEMENTS = 1024
+
+# 随仓库提供的SQLite表结构
+DEFAULT_SQLITE_SCHEMA = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database', 'schema_sqlite.sql'
+)
+
+
+def is_connection_lost(error: Exception) -> bool:
+    """判断异常是否由MySQL连接断开引起"""
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    if isinstance(error, pymysql.err.OperationalError):
+        return bool(error.args) and error.args[0] in CONNECTION_LOST_ERRORS
+    return False
+
+
+def is_read_only_sql(sql: str) -> bool:
+    """判断SQL是否为可安全重试的只读语句"""
+    return sql.lstrip().upper().startswith(READ_ONLY_PREFIXES)
+
+
+class Dialect:
+    """
+    数据库方言
+
+    负责建立连接，并把DAO中使用的MySQL写法改写为目标数据库可执行的SQL。
+    DatabaseManager 的所有执行入口都会先调用 translate()/adapt_params()，改写结果按原SQL缓存。
+    """
+
+    name = ''
+    # iter_query 使用的流式游标类，None 表示普通游标即可逐批读取
+    streaming_cursor = None
+    # execute_query_tuples/iter_query_tuples 使用的元组游标类（行为元组，不创建字典），
+    # 流式元组游标为 None 时使用 tuple_cursor 逐批读取
+    tuple_cursor = None
+    streaming_tuple_cursor = None
+
+    def __init__(self):
+        self._translated: Dict[str, str] = {}
+
+    def describe(self) -> str:
+        """连接目标描述（用于日志）"""
+        return self.name
+
+    def connect(self):
+        """建立新连接，返回兼容 pymysql.Connection 接口的连接对象"""
+        raise NotImplementedError
+
+    def translate(self, sql: str) -> str:
+        """改写SQL（带缓存）"""
+        translated = self._translated.get(sql)
+        if translated is None:
+            translated = self._translate(sql)
+            if len(self._translated) < MAX_TRANSLATED_STATEMENTS:
+                self._translated[sql] = translated
+        return translated
+
+    def _translate(self, sql: str) -> str:
+        return sql
+
+    def adapt_params(self, params):
+        """转换语句参数，默认原样返回"""
+        return params
+
+    def is_connection_lost(self, error: Exception) -> bool:
+        """判断异常是否由连接断开引起"""
+        return False
+
+    def is_unavailable(self, error: Exception) -> bool:
+        """判断异常是否表示数据库暂时不可用（连接断开或无法连接），用于只读副本故障切换"""
+        return self.is_connection_lost(error)
+
+    def replica_lag(self, cursor) -> Optional[float]:
+        """查询只读副本的复制延迟（秒），不支持或不是副本时返回None，复制已中断时返回 inf"""
+        return None
+
+    def begin(self, connection):
+        """transaction() 开始时调用，默认依赖驱动隐式开启事务"""
+
+    def explain_sql(self, sql: str) -> str:
+        """生成查看执行计划的语句"""
+        return f"EXPLAIN {sql}"
+
+    def plan_issues(self, plan: List[Dict[str, Any]]) -> List[str]:
+        """从执行计划中找出全表扫描、文件排序等问题"""
+        return []
+
+    def run_script(self, cursor, script: str):
+        """执行包含多条语句的SQL脚本"""
+        for sql in (stmt.strip() for stmt in script.split(';')):
+            if sql and not sql.startswith('--'):
+                cursor.execute(sql)
+                logger.debug(f"执行SQL: {sql[:100]}...")
+
+    def create_database_if_not_exists(self):
+        """创建数据库（如果不存在）"""
+
+
+class MySQLDialect(Dialect):
+    """MySQL方言（pymysql）"""
+
+    name = 'mysql'
+    streaming_cursor = pymysql.cursors.SSDictCursor
+    tuple_cursor = pymysql.cursors.Cursor
+    streaming_tuple_cursor = pymysql.cursors.SSCursor
+
+    # MySQL 不支持 NULLS FIRST/LAST：升序时NULL本来就在前，降序时在后
+    _NULLS_ORDER = re.compile(r'(`?\w+`?(?:\.`?\w+`?)?)(\s+(?:ASC|DESC))?\s+NULLS\s+(FIRST|LAST)', re.IGNORECASE)
+
+    def __init__(self, host: str, port: int, user: str, password: str, database: str, charset: str = 'utf8mb4'):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.database = database
+        self.charset = charset
+
+    def describe(self) -> str:
+        return f"{self.user}@{self.host}:{self.port}/{self.database}"
+
+    def connect(self) -> pymysql.Connection:
+        return pymysql.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            charset=self.charset,
+            autocommit=False,
+            cursorclass=pymysql.cursors.DictCursor,
+            connect_timeout=10,
+            read_timeout=10,
+            write_timeout=10
+        )
+
+    def _translate(self, sql: str) -> str:
+        if 'NULLS' not in sql.upper():
+            return sql
+        return self._NULLS_ORDER.sub(self._rewrite_nulls_order, sql)
+
+    @staticmethod
+    def _rewrite_nulls_order(match) -> str:
+        column, direction, nulls = match.group(1), (match.group(2) or ' ASC').strip().upper(), match.group(3).upper()
+        if (direction == 'ASC') == (nulls == 'FIRST'):
+            return f"{column} {direction}"
+        # 与默认顺序相反时先按是否为NULL排序
+        return f"{column} IS NULL {'DESC' if nulls == 'FIRST' else 'ASC'}, {column} {direction}"
+
+    def is_connection_lost(self, error: Exception) -> bool:
+        return is_connection_lost(error)
+
+    def is_unavailable(self, error: Exception) -> bool:
+        if isinstance(error, pymysql.err.OperationalError) and error.args and error.args[0] in CONNECT_FAILED_ERRORS:
+            return True
+        return is_connection_lost(error)
+
+    def replica_lag(self, cursor) -> Optional[float]:
+        cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+        if not row:
+            return None
+        lag = row.get('Seconds_Behind_Master')
+        # 复制线程停止时 Seconds_Behind_Master 为NULL
+        return float('inf') if lag is None else float(lag)
+
+    def plan_issues(self, plan: List[Dict[str, Any]]) -> List[str]:
+        issues = []
+        for row in plan:
+            table = row.get('table')
+            extra = row.get('Extra') or ''
+            if row.get('type') == 'ALL':
+                issues.append(f"全表扫描 `{table}`（约 {row.get('rows')} 行）")
+            elif row.get('type') == 'index':
+                issues.append(f"全索引扫描 `{table}`（{row.get('key')}）")
+            if 'Using filesort' in extra:
+                issues.append(f"文件排序 `{table}`")
+            if 'Using temporary' in extra:
+                issues.append(f"临时表 `{table}`")
+        return issues
+
+    def create_database_if_not_exists(self):
+        # 连接到服务器但不指定数据库
+        temp_connection = pymysql.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            charset=self.charset,
+            autocommit=True
+        )
+        try:
+            with temp_connection.cursor() as cursor:
+                # 检查数据库是否存在
+                cursor.execute("SHOW DATABASES LIKE %s", (self.database,))
+                if not cursor.fetchone():
+                    # 创建数据库
+                    cursor.execute(f"CREATE DATABASE `{self.database}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+                    logger.info(f"创建数据库: {self.database}")
+                else:
+                    logger.info(f"数据库已存在: {self.database}")
+        finally:
+            temp_connection.close()
+
+
+def _adapt_datetime(value: datetime) -> str:
+    return value.isoformat(' ')
+
+
+def _convert_datetime(value: bytes) -> Any:
+    text = value.decode()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+_sqlite_types_registered = False
+_sqlite_types_lock = threading.Lock()
+
+
+def _register_sqlite_types():
+    """注册 datetime 与 DATETIME/TIMESTAMP 列之间的转换（与pymysql返回的类型保持一致）"""
+    global _sqlite_types_registered
+    with _sqlite_types_lock:
+        if _sqlite_types_registered:
+            return
+        sqlite3.register_adapter(datetime, _adapt_datetime)
+        sqlite3.register_adapter(date, date.isoformat)
+        sqlite3.register_converter('DATETIME', _convert_datetime)
+        sqlite3.register_converter('TIMESTAMP', _convert_datetime)
+        _sqlite_types_registered = True
+
+
+class SQLiteCursor:
+    """兼容 pymysql DictCursor 接口的SQLite游标，结果行为字典"""
+
+    def __init__(self, connection: 'SQLiteConnection'):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+        self._columns: Optional[List[str]] = None
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _after_execute(self) -> int:
+        description = self._cursor.description
+        self._columns = [column[0] for column in description] if description else None
+        self.lastrowid = self._cursor.lastrowid
+        self.rowcount = self._cursor.rowcount
+        return max(self.rowcount, 0)
+
+    def execute(self, sql: str, params: Sequence[Any] = None) -> int:
+        self._connection.begin_if_needed(sql)
+        self._cursor.execute(sql, params or ())
+        return self._after_execute()
+
+    def executemany(self, sql: str, params_list: Sequence[Sequence[Any]]) -> int:
+        self._connection.begin_if_needed(sql)
+        self._cursor.executemany(sql, params_list)
+        return self._after_execute()
+
+    def executescript(self, script: str):
+        self._cursor.executescript(script)
+
+    def fetchone(self) -> Optional[Dict[str, Any]]:
+        row = self._cursor.fetchone()
+        return dict(zip(self._columns, row)) if row is not None else None
+
+    def fetchmany(self, size: int = None) -> List[Dict[str, Any]]:
+        columns = self._columns
+        rows = self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        columns = self._columns
+        return [dict(zip(columns, row)) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteTupleCursor(SQLiteCursor):
+    """兼容 pymysql Cursor 接口的SQLite游标，结果行为元组"""
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self) -> Optional[tuple]:
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = None) -> List[tuple]:
+        return self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+
+    def fetchall(self) -> List[tuple]:
+        return self._cursor.fetchall()
+
+
+class SQLiteConnection:
+    """
+    兼容 pymysql.Connection 接口的SQLite连接
+
+    底层连接工作在自动提交模式，事务由本类显式开启：写语句前自动 BEGIN，
+    连接池外的只读查询不开启事务，直接读取最新提交的数据（WAL模式下读不阻塞写）。
+    """
+
+    def __init__(self, raw: sqlite3.Connection):
+        self.raw = raw
+        self.open = True
+        self._autocommit = False
+
+    def cursor(self, cursor_class: type = None) -> SQLiteCursor:
+        return (cursor_class or SQLiteCursor)(self)
+
+    def begin_if_needed(self, sql: str):
+        if not self._autocommit and not self.raw.in_transaction and not is_read_only_sql(sql):
+            self.raw.execute("BEGIN")
+
+    def begin_immediate(self):
+        """开启事务并立即获取写锁，替代 SELECT ... FOR UPDATE 的行锁语义"""
+        if not self.raw.in_transaction:
+            self.raw.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        if self.raw.in_transaction:
+            self.raw.commit()
+
+    def rollback(self):
+        if self.raw.in_transaction:
+            self.raw.rollback()
+
+    def autocommit(self, value: bool):
+        self._autocommit = bool(value)
+
+    def ping(self, reconnect: bool = True):
+        if not self.open:
+            raise sqlite3.ProgrammingError("连接已关闭")
+
+    def close(self):
+        if self.open:
+            self.open = False
+            self.raw.close()
+
+
+class SQLiteDialect(Dialect):
+    """
+    SQLite方言（WAL模式）
+
+    适合单机部署和测试/基准测试。改写规则：
+    - %s 占位符 -> ?
+    - NOW() -> datetime('now', 'localtime')
+    - FIND_IN_SET(x, col) -> instr(',' || col || ',', ',' || x || ',')
+    - INSERT ... ON DUPLICATE KEY UPDATE a = VALUES(a) -> INSERT ... ON CONFLICT DO UPDATE SET a = excluded.a
+    - SELECT ... FOR UPDATE 去掉 FOR UPDATE，transaction() 改为 BEGIN IMMEDIATE 获取写锁
+    NULLS FIRST/LAST 为SQLite原生语法，无需改写。
+    """
+
+    name = 'sqlite'
+    tuple_cursor = SQLiteTupleCursor
+
+    _PLACEHOLDER = re.compile(r'%([s%])')
+    _NOW = re.compile(r'\bNOW\(\)', re.IGNORECASE)
+    _FIND_IN_SET = re.compile(r'FIND_IN_SET\(\s*([^,()]+?)\s*,\s*([^,()]+?)\s*\)', re.IGNORECASE)
+    _ON_DUPLICATE = re.compile(r'ON\s+DUPLICATE\s+KEY\s+UPDATE', re.IGNORECASE)
+    _VALUES_REF = re.compile(r'VALUES\((`?\w+`?)\)', re.IGNORECASE)
+    _FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE\b', re.IGNORECASE)
+    # ISO格式的时间字符串（2024-01-01T10:00:00[.ffffff]），统一为空格分隔以保证与NOW()/datetime参数的字符串比较正确
+    _ISO_DATETIME = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,6})?')
+
+    def __init__(self, path: str, busy_timeout: float = 5.0, schema_path: str = DEFAULT_SQLITE_SCHEMA):
+        """
+        Args:
+            path: 数据库文件路径（以 file: 开头时按URI打开）
+            busy_timeout: 等待其他连接释放写锁的最长秒数
+            schema_path: create_database_if_not_exists 时执行的建表脚本
+        """
+        super().__init__()
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.schema_path = schema_path
+        _register_sqlite_types()
+
+    def describe(self) -> str:
+        return f"sqlite:{self.path}"
+
+    def connect(self) -> SQLiteConnection:
+        raw = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,
+            check_same_thread=False,
+            uri=self.path.startswith('file:')
+        )
+        raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute("PRAGMA synchronous=NORMAL")
+        raw.execute("PRAGMA foreign_keys=ON")
+        return SQLiteConnection(raw)
+
+    def _translate(self, sql: str) -> str:
+        sql = self._PLACEHOLDER.sub(lambda match: '?' if match.group(1) == 's' else '%', sql)
+        sql = self._NOW.sub("datetime('now', 'localtime')", sql)
+        sql = self._FIND_IN_SET.sub(r"instr(',' || \2 || ',', ',' || \1 || ',')", sql)
+        sql = self._FOR_UPDATE.sub('', sql)
+        if self._ON_DUPLICATE.search(sql):
+            head, assignments = self._ON_DUPLICATE.split(sql, 1)
+            sql = head + 'ON CONFLICT DO UPDATE SET' + self._VALUES_REF.sub(r'excluded.\1', assignments)
+        return sql
+
+    def adapt_params(self, params):
+        if not params:
+            return params
+        iso_datetime = self._ISO_DATETIME
+        adapted = None
+        for index, value in enumerate(params):
+            if (isinstance(value, str) and 19 <= len(value) <= 26 and value[10:11] == 'T'
+                    and iso_datetime.fullmatch(value)):
+                if adapted is None:
+                    adapted = list(params)
+                adapted[index] = value.replace('T', ' ', 1)
+        return params if adapted is None else tuple(adapted)
+
+    def is_connection_lost(self, error: Exception) -> bool:
+        return isinstance(error, sqlite3.ProgrammingError) and 'closed' in str(error).lower()
+
+    def begin(self, connection: SQLiteConnection):
+        connection.begin_immediate()
+
+    def explain_sql(self, sql: str) -> str:
+        return f"EXPLAIN QUERY PLAN {sql}"
+
+    def plan_issues(self, plan: List[Dict[str, Any]]) -> List[str]:
+        issues = []
+        for row in plan:
+            detail = row.get('detail') or ''
+            # SCAN t 为全表扫描；SCAN t USING [COVERING] INDEX 为按索引顺序扫描
+            if detail.startswith('SCAN ') and ' USING ' not in detail:
+                issues.append(f"全表扫描 {detail[5:]}")
+            elif detail.startswith('USE TEMP B-TREE'):
+                issues.append(f"文件排序 ({detail[len('USE TEMP B-TREE FOR '):]})")
+        return issues
+
+    def run_script(self, cursor: SQLiteCursor, script: str):
+        cursor.executescript(script)
+
+    def create_database_if_not_exists(self):
+        if not self.path.startswith('file:'):
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+
+        # 建表脚本全部使用 IF NOT EXISTS，可重复执行
+        with open(self.schema_path, 'r', encoding='utf-8') as f:
+            script = f.read()
+        connection = self.connect()
+        try:
+            connection.raw.executescript(script)
+            logger.info(f"SQLite数据库已就绪: {self.path}")
+        finally:
+            connection.close()
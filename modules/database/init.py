@@ -1,6 +1,7 @@
 import os
 import logging
 from modules.database.manager import init_database_manager
+from modules.database.dialects import SQLiteDialect
 from modules.database.stores import *
 from modules.scheduler.http_request import ScheduledRequestsStoreDB
 from modules.scheduler.scheduled_posts import ScheduledPostsStoreDB
@@ -12,23 +13,54 @@ logger = logging.getLogger(__name__)
 def init_database_from_config():
     """从配置初始化数据库连接"""
     try:
-        # 数据库配置
-        db_config = {
-            'host': '116.205.244.106',
-            'port': 3306,
-            'user': 'root',
-            'password': '202358hjq',
-            'database': 'maimaichat'
+        # 连接池配置（可通过环境变量调整）
+        pool_config = {
+            'min_connections': int(os.environ.get('DB_POOL_MIN', 2)),
+            'max_connections': int(os.environ.get('DB_POOL_MAX', 10)),
+            'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'idle_timeout': float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+            'ping_interval': float(os.environ.get('DB_PING_INTERVAL', 60)),
+            # 慢查询日志阈值（毫秒）
+            'slow_query_ms': float(os.environ.get('DB_SLOW_QUERY_MS', 500)),
+            # 计数器/状态类更新的合并写窗口（毫秒），0 表示立即写入
+            'write_behind_interval': float(os.environ.get('DB_WRITE_BEHIND_MS', 500)) / 1000
         }
         
-        # 初始化数据库管理器
-        db_manager = init_database_manager(
-            host=db_config['host'],
-            port=db_config['port'],
-            user=db_config['user'],
-            password=db_config['password'],
-            database=db_config['database']
-        )
+        # DB_BACKEND=sqlite 时使用本地SQLite文件（单机部署），否则连接MySQL
+        if os.environ.get('DB_BACKEND', 'mysql').lower() == 'sqlite':
+            sqlite_path = os.environ.get('DB_SQLITE_PATH', os.path.join('data', 'maimaichat.db'))
+            db_manager = init_database_manager(
+                dialect=SQLiteDialect(sqlite_path, busy_timeout=float(os.environ.get('DB_SQLITE_BUSY_TIMEOUT', 5))),
+                **pool_config
+            )
+        else:
+            # 数据库配置
+            db_config = {
+                'host': '116.205.244.106',
+                'port': 3306,
+                'user': 'root',
+                'password': '202358hjq',
+                'database': 'maimaichat'
+            }
+            
+            # 只读副本（可选）: DB_REPLICAS=host1:3306,host2，账号和库名与主库相同
+            replicas = []
+            for address in filter(None, (item.strip() for item in os.environ.get('DB_REPLICAS', '').split(','))):
+                host, _, port = address.partition(':')
+                replicas.append({'host': host, 'port': int(port) if port else db_config['port']})
+            
+            # 初始化数据库管理器
+            db_manager = init_database_manager(
+                host=db_config['host'],
+                port=db_config['port'],
+                user=db_config['user'],
+                password=db_config['password'],
+                database=db_config['database'],
+                replicas=replicas,
+                replica_max_lag=float(os.environ.get('DB_REPLICA_MAX_LAG', 30)),
+                read_your_writes_window=float(os.environ.get('DB_READ_YOUR_WRITES_WINDOW', 2)),
+                **pool_config
+            )
         
         # 创建数据库（如果不存在）
         db_manager.create_database_if_not_exists()
@@ -1,17 +1,54 @@
 import pymysql
 import logging
 import threading
+import time
 from contextlib import contextmanager
-from typing import Optional, Dict, Any, List, Union
+from typing import Optional, Dict, Any, List, Tuple, Union, Iterator, Callable, Sequence
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+from modules.database.dialects import Dialect, MySQLDialect, is_read_only_sql
+from modules.database.query_stats import QueryStats
+from modules.database.replicas import ReplicaRouter
+from modules.database.write_behind import WriteBehindQueue
 
 logger = logging.getLogger(__name__)
 
+
+class PoolTimeoutError(RuntimeError):
+    """连接池借出连接超时"""
+
+
+class UnitOfWork:
+    """
+    事务工作单元
+    
+    同一线程内 transaction() 块中的所有数据库操作共享一个连接，最外层块退出时统一提交；
+    嵌套的 transaction() 使用保存点，内层异常只回滚到保存点
+    """
+    
+    def __init__(self, connection: pymysql.Connection):
+        self.connection = connection
+        self.depth = 0
+        self._on_commit: List[Callable[[], Any]] = []
+    
+    def on_commit(self, callback: Callable[[], Any]):
+        """注册事务提交成功后执行的回调，事务（或所在保存点）回滚时丢弃"""
+        self._on_commit.append(callback)
+
+
 class DatabaseManager:
     """数据库连接管理器"""
     
-    def __init__(self, host: str, port: int, user: str, password: str, database: str, charset: str = 'utf8mb4'):
+    def __init__(self, host: str = None, port: int = 3306, user: str = None, password: str = None,
+                 database: str = None, charset: str = 'utf8mb4',
+                 min_connections: int = 1, max_connections: int = 10,
+                 pool_timeout: float = 30, idle_timeout: float = 300, ping_interval: float = 60,
+                 dialect: Optional[Dialect] = None, slow_query_ms: Optional[float] = 500,
+                 instrument_queries: bool = True,
+                 replicas: Optional[Sequence[Union[Dialect, Dict[str, Any]]]] = None,
+                 replica_health_interval: float = 10, replica_max_lag: Optional[float] = 30,
+                 read_your_writes_window: float = 2.0, write_behind_interval: Optional[float] = 0.5):
         """
         初始化数据库连接管理器
         
@@ -22,6 +59,20 @@ class DatabaseManager:
             password: 密码
             database: 数据库名
             charset: 字符集
+            min_connections: 连接池保留的最少连接数（空闲回收不会低于该值）
+            max_connections: 连接池允许的最大连接数
+            pool_timeout: 连接池耗尽时借出连接的最长等待秒数
+            idle_timeout: 空闲连接超过该秒数后被回收
+            ping_interval: 连接空闲超过该秒数后，借出前才执行ping检测
+            dialect: 数据库方言，默认使用以上参数连接MySQL（如 SQLiteDialect 用于单机部署）
+            slow_query_ms: 慢查询日志阈值（毫秒），None 表示不记录
+            instrument_queries: 是否按SQL指纹统计每条语句的耗时和行数
+            replicas: 只读副本列表，每项为方言或MySQL连接参数字典（未给出的参数沿用主库配置）；
+                      只有在 replica_reads() 块内（DAO中以 @replica_read 标记的方法）执行的查询才会路由到副本
+            replica_health_interval: 副本健康检查间隔秒数
+            replica_max_lag: 副本允许的最大复制延迟秒数，超过时暂停使用该副本
+            read_your_writes_window: 当前线程执行写操作后，该秒数内的查询仍使用主库，保证读到自己的写入
+            write_behind_interval: 计数器/状态类更新的合并写窗口秒数，None 或 0 表示立即写入
         """
         self.host = host
         self.port = port
@@ -29,98 +80,340 @@ class DatabaseManager:
         self.password = password
         self.database = database
         self.charset = charset
-        self._local = threading.local()
-        self._pool_lock = threading.Lock()
+        self.dialect = dialect or MySQLDialect(host, port, user, password, database, charset)
         
         # 连接池配置
-        self.max_connections = 10
-        self.connection_pool = []
+        self.min_connections = max(0, min_connections)
+        self.max_connections = max(1, max_connections, self.min_connections)
+        self.pool_timeout = pool_timeout
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        
+        # 连接池状态：空闲连接按归还顺序排列，末尾为最近使用的连接
+        # 每项为 (连接, 归还时间, 是否需要检测)，语句执行失败的连接下次借出前必须ping
+        self._pool_cond = threading.Condition(threading.Lock())
+        self._idle_connections: List[Tuple[pymysql.Connection, float, bool]] = []
+        self._total_connections = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._pool_stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'created': 0,
+            'evicted': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'pings': 0,
+            'pings_avoided': 0,
+            'reconnect_retries': 0
+        }
+        
+        # 语句执行统计（按SQL指纹汇总）
+        self.query_stats = QueryStats(slow_query_ms=slow_query_ms, enabled=instrument_queries)
+        
+        # 当前线程正在进行的事务（transaction() 块内有效）
+        self._tx_local = threading.local()
         
-        logger.info(f"初始化数据库连接管理器: {user}@{host}:{port}/{database}")
+        # 低优先级计数器/状态更新的合并写队列（DAO的 _write_behind）
+        self.write_behind = WriteBehindQueue(self, flush_interval=write_behind_interval)
+        
+        logger.info(f"初始化数据库连接管理器: {self.dialect.describe()}, 连接池: {self.min_connections}-{self.max_connections}")
+        
+        # 只读副本（读写分离）：副本各自使用独立连接池，不单独统计语句
+        self.read_your_writes_window = read_your_writes_window
+        self._route_local = threading.local()
+        self.replicas: Optional[ReplicaRouter] = None
+        if replicas:
+            managers = [DatabaseManager(dialect=self._replica_dialect(replica), min_connections=0,
+                                        max_connections=self.max_connections, pool_timeout=self.pool_timeout,
+                                        idle_timeout=self.idle_timeout, ping_interval=self.ping_interval,
+                                        instrument_queries=False)
+                        for replica in replicas]
+            self.replicas = ReplicaRouter(managers, replica_health_interval, replica_max_lag)
+    
+    def _replica_dialect(self, replica: Union[Dialect, Dict[str, Any]]) -> Dialect:
+        """副本配置转换为方言，字典中未给出的连接参数沿用主库配置"""
+        if isinstance(replica, Dialect):
+            return replica
+        return MySQLDialect(replica['host'], replica.get('port', self.port), replica.get('user', self.user),
+                            replica.get('password', self.password), replica.get('database', self.database),
+                            replica.get('charset', self.charset))
     
     def _create_connection(self) -> pymysql.Connection:
         """创建新的数据库连接"""
         try:
-            connection = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                charset=self.charset,
-                autocommit=False,
-                cursorclass=pymysql.cursors.DictCursor,
-                connect_timeout=10,
-                read_timeout=10,
-                write_timeout=10
-            )
+            connection = self.dialect.connect()
             logger.debug("创建新的数据库连接")
             return connection
         except Exception as e:
             logger.error(f"创建数据库连接失败: {e}")
             raise
     
-    def get_connection(self) -> pymysql.Connection:
-        """获取数据库连接"""
-        # 首先检查当前线程是否已有连接
-        if hasattr(self._local, 'connection') and self._local.connection:
-            try:
-                # 测试连接是否有效
-                self._local.connection.ping(reconnect=True)
-                return self._local.connection
-            except:
-                # 连接无效，清除并创建新连接
-                self._local.connection = None
+    @staticmethod
+    def _close_quietly(connection: pymysql.Connection):
+        """关闭连接并忽略异常"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+    
+    def _evict_idle_locked(self) -> List[pymysql.Connection]:
+        """移出空闲超时的连接（调用方需持有连接池锁），返回待关闭的连接"""
+        if not self._idle_connections or self.idle_timeout is None:
+            return []
+        
+        expired = []
+        deadline = time.monotonic() - self.idle_timeout
+        # 最早归还的连接位于列表头部
+        while (self._idle_connections
+               and self._idle_connections[0][1] < deadline
+               and self._total_connections > self.min_connections):
+            connection, _, _ = self._idle_connections.pop(0)
+            self._total_connections -= 1
+            self._pool_stats['evicted'] += 1
+            expired.append(connection)
+        return expired
+    
+    def get_connection(self, timeout: float = None) -> pymysql.Connection:
+        """
+        从连接池借出连接，使用完毕后必须调用 return_connection 归还
+        
+        Args:
+            timeout: 连接池耗尽时的最长等待秒数，默认使用 pool_timeout
         
-        # 从连接池获取连接
-        with self._pool_lock:
-            if self.connection_pool:
-                connection = self.connection_pool.pop()
+        Raises:
+            PoolTimeoutError: 等待超时仍未借到连接
+        """
+        timeout = self.pool_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        connection = None
+        needs_ping = False
+        expired = []
+        
+        with self._pool_cond:
+            while True:
+                expired.extend(self._evict_idle_locked())
+                if self._idle_connections:
+                    connection, returned_at, suspect = self._idle_connections.pop()
+                    needs_ping = suspect or time.monotonic() - returned_at >= self.ping_interval
+                    self._pool_stats['pings' if needs_ping else 'pings_avoided'] += 1
+                    break
+                if self._total_connections < self.max_connections:
+                    # 先占位，锁外再建立连接
+                    self._total_connections += 1
+                    self._pool_stats['created'] += 1
+                    break
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._pool_stats['timeouts'] += 1
+                    raise PoolTimeoutError(f"获取数据库连接超时({timeout}秒)，连接池已满: {self.max_connections}")
+                self._waiting += 1
                 try:
-                    connection.ping(reconnect=True)
-                    self._local.connection = connection
-                    return connection
-                except:
-                    # 连接无效，创建新连接
-                    pass
+                    self._pool_cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            
+            waited = time.monotonic() - started
+            self._in_use += 1
+            self._pool_stats['checkouts'] += 1
+            self._pool_stats['wait_time_total'] += waited
+            self._pool_stats['wait_time_max'] = max(self._pool_stats['wait_time_max'], waited)
+        
+        for stale in expired:
+            self._close_quietly(stale)
         
-        # 创建新连接
-        connection = self._create_connection()
-        self._local.connection = connection
-        return connection
+        try:
+            if connection is None:
+                connection = self._create_connection()
+            elif needs_ping:
+                # 仅对空闲较久或上次执行失败的连接做存活检测
+                connection.ping(reconnect=True)
+            return connection
+        except Exception:
+            if connection is not None:
+                self._close_quietly(connection)
+            self._release_slot()
+            raise
     
-    def return_connection(self, connection: pymysql.Connection):
-        """归还连接到连接池"""
+    def _release_slot(self):
+        """释放一个借出占位（连接已失效或创建失败）"""
+        with self._pool_cond:
+            self._in_use -= 1
+            self._total_connections -= 1
+            self._pool_cond.notify()
+    
+    def return_connection(self, connection: pymysql.Connection, discard: bool = False, suspect: bool = False):
+        """
+        归还连接到连接池
+        
+        Args:
+            connection: get_connection 借出的连接
+            discard: 为True时关闭连接而不放回连接池（连接状态不可信时使用）
+            suspect: 为True时下次借出前强制ping检测（语句执行失败后使用）
+        """
         if not connection:
             return
         
+        if discard or not connection.open:
+            self._close_quietly(connection)
+            self._release_slot()
+            logger.debug("丢弃失效的数据库连接")
+            return
+        
+        with self._pool_cond:
+            self._in_use -= 1
+            self._idle_connections.append((connection, time.monotonic(), suspect))
+            self._pool_cond.notify()
+    
+    def _mark_idle_suspect(self):
+        """连接断开时，将所有空闲连接标记为待检测（数据库可能已重启）"""
+        with self._pool_cond:
+            self._idle_connections = [(connection, returned_at, True)
+                                      for connection, returned_at, _ in self._idle_connections]
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池统计信息"""
+        with self._pool_cond:
+            stats = dict(self._pool_stats)
+            stats.update({
+                'min_connections': self.min_connections,
+                'max_connections': self.max_connections,
+                'total': self._total_connections,
+                'in_use': self._in_use,
+                'idle': len(self._idle_connections),
+                'waiting': self._waiting
+            })
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts if checkouts else 0.0
+        return stats
+    
+    def in_transaction(self) -> bool:
+        """当前线程是否处于 transaction() 块内"""
+        return getattr(self._tx_local, 'uow', None) is not None
+    
+    def current_transaction(self) -> Optional['UnitOfWork']:
+        """获取当前线程的事务对象，不在事务内时返回None"""
+        return getattr(self._tx_local, 'uow', None)
+    
+    @contextmanager
+    def transaction(self):
+        """
+        事务上下文管理器: with db.transaction() as uow: ...
+        
+        块内所有DAO调用共享同一连接，正常退出时提交一次，异常时回滚并重新抛出；
+        嵌套调用创建保存点。提交成功后依次执行 uow.on_commit 注册的回调。
+        """
+        uow = getattr(self._tx_local, 'uow', None)
+        if uow is not None:
+            yield from self._savepoint(uow)
+            return
+        
+        connection = self.get_connection()
+        uow = UnitOfWork(connection)
+        self._tx_local.uow = uow
+        broken = False
+        suspect = False
         try:
-            # 回滚未提交的事务
-            if connection.open:
-                connection.rollback()
-            
-            with self._pool_lock:
-                if len(self.connection_pool) < self.max_connections:
-                    self.connection_pool.append(connection)
-                    logger.debug("连接归还到连接池")
-                else:
-                    connection.close()
-                    logger.debug("连接池已满，关闭连接")
-        except Exception as e:
-            logger.warning(f"归还连接时出错: {e}")
+            self.dialect.begin(connection)
+            yield uow
+            connection.commit()
+            self._note_write()
+        except BaseException as e:
+            suspect = True
+            if isinstance(e, Exception) and self.dialect.is_connection_lost(e):
+                broken = True
+                self._mark_idle_suspect()
+            else:
+                try:
+                    connection.rollback()
+                except Exception:
+                    broken = True
+            logger.error(f"事务执行失败，已回滚: {e!r}")
+            raise
+        finally:
+            self._tx_local.uow = None
+            self.return_connection(connection, discard=broken, suspect=suspect)
+        
+        for callback in uow._on_commit:
             try:
-                connection.close()
-            except:
-                pass
+                callback()
+            except Exception as e:
+                logger.error(f"事务提交回调执行失败: {e}")
+    
+    def _savepoint(self, uow: UnitOfWork):
+        """嵌套事务：在外层事务的连接上创建保存点"""
+        uow.depth += 1
+        savepoint = f"sp_{uow.depth}"
+        callbacks_before = len(uow._on_commit)
+        try:
+            with uow.connection.cursor() as cursor:
+                cursor.execute(f"SAVEPOINT {savepoint}")
+            try:
+                yield uow
+            except BaseException:
+                del uow._on_commit[callbacks_before:]
+                with uow.connection.cursor() as cursor:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                raise
+            with uow.connection.cursor() as cursor:
+                cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+        finally:
+            uow.depth -= 1
     
     @contextmanager
-    def get_cursor(self, autocommit: bool = False):
-        """获取数据库游标的上下文管理器"""
-        connection = None
+    def replica_reads(self):
+        """
+        允许块内的只读查询使用只读副本（可能读到稍旧的数据）: with db.replica_reads(): ...
+        
+        事务内、当前线程刚执行过写操作（read_your_writes_window 内）或没有健康副本时仍使用主库
+        """
+        depth = getattr(self._route_local, 'replica_reads', 0)
+        self._route_local.replica_reads = depth + 1
+        try:
+            yield
+        finally:
+            self._route_local.replica_reads = depth
+    
+    def _note_write(self):
+        """记录当前线程的写操作时间（读自己的写入）"""
+        if self.replicas is not None:
+            self._route_local.last_write = time.monotonic()
+    
+    def _choose_replica(self, sql: str):
+        """为只读查询选择副本，不满足条件时返回None（使用主库）"""
+        if (self.replicas is None or not getattr(self._route_local, 'replica_reads', 0)
+                or self.in_transaction() or not is_read_only_sql(sql)):
+            return None
+        last_write = getattr(self._route_local, 'last_write', None)
+        if last_write is not None and time.monotonic() - last_write < self.read_your_writes_window:
+            self.replicas.record('read_your_writes')
+            return None
+        return self.replicas.choose()
+    
+    def get_replica_stats(self) -> Optional[Dict[str, Any]]:
+        """获取只读副本路由统计，未配置副本时返回None"""
+        return self.replicas.get_stats() if self.replicas is not None else None
+    
+    @contextmanager
+    def get_cursor(self, autocommit: bool = False, cursor_class: type = None):
+        """获取数据库游标的上下文管理器，退出时将连接归还连接池；事务块内使用事务连接且不单独提交"""
+        uow = getattr(self._tx_local, 'uow', None)
+        if uow is not None:
+            cursor = uow.connection.cursor(cursor_class)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+            return
+        
+        connection = self.get_connection()
         cursor = None
+        broken = False
+        suspect = False
         try:
-            connection = self.get_connection()
-            cursor = connection.cursor()
+            cursor = connection.cursor(cursor_class)
             
             if autocommit:
                 connection.autocommit(True)
@@ -131,49 +424,173 @@ class DatabaseManager:
                 connection.commit()
                 
         except Exception as e:
-            if connection and not autocommit:
+            suspect = True
+            if self.dialect.is_connection_lost(e):
+                broken = True
+                self._mark_idle_suspect()
+            elif not autocommit:
                 try:
                     connection.rollback()
-                except:
-                    pass
+                except Exception:
+                    broken = True
             logger.error(f"数据库操作异常: {e}")
             raise
         finally:
             if cursor:
-                cursor.close()
-            if connection and autocommit:
-                connection.autocommit(False)
+                try:
+                    cursor.close()
+                except Exception:
+                    broken = True
+            if autocommit:
+                try:
+                    connection.autocommit(False)
+                except Exception:
+                    broken = True
+            self.return_connection(connection, discard=broken, suspect=suspect)
     
     def execute_query(self, sql: str, params: tuple = None) -> List[Dict[str, Any]]:
-        """执行查询SQL"""
-        with self.get_cursor() as cursor:
+        """执行查询SQL，只读语句遇到连接断开时自动重连重试一次；replica_reads() 块内优先使用只读副本"""
+        return self._query(sql, params, False)
+    
+    def execute_query_tuples(self, sql: str, params: tuple = None) -> Tuple[Tuple[str, ...], Sequence[tuple]]:
+        """执行查询SQL，返回 (列名元组, 行元组列表)：使用元组游标，不为每行创建字典，其余同 execute_query"""
+        return self._query(sql, params, True)
+    
+    def _query(self, sql: str, params: tuple, tuples: bool):
+        sql = self.dialect.translate(sql)
+        params = self.dialect.adapt_params(params)
+        replica = self._choose_replica(sql)
+        if replica is not None:
+            try:
+                return self._execute_query_once(sql, params, replica.manager, tuples)
+            except Exception as e:
+                if not isinstance(e, PoolTimeoutError) and not replica.manager.dialect.is_unavailable(e):
+                    raise
+                self.replicas.mark_failed(replica, e)
+        try:
+            return self._execute_query_once(sql, params, tuples=tuples)
+        except Exception as e:
+            # 事务内连接断开意味着事务已丢失，不能重试
+            if not (self.dialect.is_connection_lost(e) and is_read_only_sql(sql)) or self.in_transaction():
+                raise
+            logger.warning(f"数据库连接已断开，重连后重试查询: {e}")
+            with self._pool_cond:
+                self._pool_stats['reconnect_retries'] += 1
+            return self._execute_query_once(sql, params, tuples=tuples)
+    
+    def _execute_query_once(self, sql: str, params: tuple = None,
+                            source: Optional['DatabaseManager'] = None, tuples: bool = False):
+        """执行一次查询SQL（source 为只读副本的连接池，默认使用主库；tuples 为True时返回 (列名元组, 行元组列表)）"""
+        source = source or self
+        cursor_class = source.dialect.tuple_cursor if tuples else None
+        with self.query_stats.measure(sql, params) as timer, source.get_cursor(cursor_class=cursor_class) as cursor:
             cursor.execute(sql, params)
             result = cursor.fetchall()
+            timer.rows = len(result)
             logger.debug(f"执行查询: {sql}, 参数: {params}, 结果行数: {len(result)}")
+            if tuples:
+                return tuple(column[0] for column in cursor.description or ()), result
             return result
     
+    def iter_query(self, sql: str, params: tuple = None, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        流式执行查询，逐行返回结果
+        
+        使用服务端游标（MySQL为SSDictCursor）每次读取 batch_size 行，内存占用与结果集大小无关。
+        迭代期间独占一个连接，循环体内的其他数据库操作会使用连接池中的其他连接。
+        事务块内共享事务连接，为了不阻塞块内的其他语句改用普通游标。
+        """
+        batches = self._iter_batches(sql, params, batch_size, False)
+        try:
+            for _, rows in batches:
+                yield from rows
+        finally:
+            batches.close()
+    
+    def iter_query_tuples(self, sql: str, params: tuple = None,
+                          batch_size: int = 500) -> Iterator[Tuple[Tuple[str, ...], Sequence[tuple]]]:
+        """流式执行查询，按批返回 (列名元组, 行元组列表)：使用元组游标（MySQL为SSCursor），其余同 iter_query"""
+        return self._iter_batches(sql, params, batch_size, True)
+    
+    def _iter_batches(self, sql: str, params: tuple, batch_size: int, tuples: bool):
+        sql = self.dialect.translate(sql)
+        params = self.dialect.adapt_params(params)
+        if tuples:
+            streaming = self.dialect.streaming_tuple_cursor or self.dialect.tuple_cursor
+            cursor_class = self.dialect.tuple_cursor if self.in_transaction() else streaming
+        else:
+            cursor_class = None if self.in_transaction() else self.dialect.streaming_cursor
+        with self.get_cursor(cursor_class=cursor_class) as cursor:
+            # 统计只计入执行和读取结果的耗时，不含调用方处理每行的时间
+            started = time.perf_counter()
+            failed = True
+            cursor.execute(sql, params)
+            elapsed = time.perf_counter() - started
+            columns = tuple(column[0] for column in cursor.description or ()) if tuples else None
+            row_count = 0
+            logger.debug(f"流式查询: {sql}, 参数: {params}")
+            try:
+                while True:
+                    started = time.perf_counter()
+                    rows = cursor.fetchmany(batch_size)
+                    elapsed += time.perf_counter() - started
+                    if not rows:
+                        break
+                    row_count += len(rows)
+                    yield columns, rows
+                failed = False
+            except GeneratorExit:
+                # 调用方提前结束迭代：读完剩余结果再归还连接，避免连接处于未完成查询状态
+                failed = False
+                cursor.close()
+                return
+            finally:
+                self.query_stats.record(sql, elapsed, row_count, params, failed=failed)
+    
     def execute_update(self, sql: str, params: tuple = None) -> int:
         """执行更新SQL"""
-        with self.get_cursor() as cursor:
-            affected_rows = cursor.execute(sql, params)
+        sql = self.dialect.translate(sql)
+        params = self.dialect.adapt_params(params)
+        with self.query_stats.measure(sql, params) as timer, self.get_cursor() as cursor:
+            affected_rows = timer.rows = cursor.execute(sql, params)
             logger.debug(f"执行更新: {sql}, 参数: {params}, 影响行数: {affected_rows}")
-            return affected_rows
+        self._note_write()
+        return affected_rows
     
     def execute_insert(self, sql: str, params: tuple = None) -> int:
         """执行插入SQL"""
-        with self.get_cursor() as cursor:
-            cursor.execute(sql, params)
+        sql = self.dialect.translate(sql)
+        params = self.dialect.adapt_params(params)
+        with self.query_stats.measure(sql, params) as timer, self.get_cursor() as cursor:
+            timer.rows = cursor.execute(sql, params)
             insert_id = cursor.lastrowid
             logger.debug(f"执行插入: {sql}, 参数: {params}, 插入ID: {insert_id}")
-            return insert_id
+        self._note_write()
+        return insert_id
     
     def execute_batch(self, sql: str, params_list: List[tuple]) -> int:
         """批量执行SQL"""
-        with self.get_cursor() as cursor:
-            affected_rows = cursor.executemany(sql, params_list)
+        sql = self.dialect.translate(sql)
+        params_list = [self.dialect.adapt_params(params) for params in params_list]
+        with self.query_stats.measure(sql, params_list[0] if params_list else None) as timer, self.get_cursor() as cursor:
+            affected_rows = timer.rows = cursor.executemany(sql, params_list)
             logger.debug(f"批量执行: {sql}, 批次数: {len(params_list)}, 总影响行数: {affected_rows}")
-            return affected_rows
-    
+        self._note_write()
+        return affected_rows
+
+    def execute_statements(self, statements: List[Tuple[str, tuple]]) -> int:
+        """在同一个事务中依次执行多条SQL，任一失败则整体回滚"""
+        total_affected = 0
+        with self.get_cursor() as cursor:
+            for sql, params in statements:
+                sql = self.dialect.translate(sql)
+                with self.query_stats.measure(sql, params) as timer:
+                    timer.rows = cursor.execute(sql, self.dialect.adapt_params(params))
+                total_affected += timer.rows
+            logger.debug(f"事务执行 {len(statements)} 条语句, 总影响行数: {total_affected}")
+        self._note_write()
+        return total_affected
+
     def test_connection(self) -> bool:
         """测试数据库连接"""
         try:
@@ -187,30 +604,9 @@ class DatabaseManager:
             return False
     
     def create_database_if_not_exists(self):
-        """创建数据库（如果不存在）"""
+        """创建数据库（如果不存在），SQLite方言同时执行建表脚本"""
         try:
-            # 连接到服务器但不指定数据库
-            temp_connection = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                charset=self.charset,
-                autocommit=True
-            )
-            
-            with temp_connection.cursor() as cursor:
-                # 检查数据库是否存在
-                cursor.execute("SHOW DATABASES LIKE %s", (self.database,))
-                if not cursor.fetchone():
-                    # 创建数据库
-                    cursor.execute(f"CREATE DATABASE `{self.database}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-                    logger.info(f"创建数据库: {self.database}")
-                else:
-                    logger.info(f"数据库已存在: {self.database}")
-            
-            temp_connection.close()
-            
+            self.dialect.create_database_if_not_exists()
         except Exception as e:
             logger.error(f"创建数据库失败: {e}")
             raise
@@ -221,14 +617,8 @@ class DatabaseManager:
             with open(sql_file_path, 'r', encoding='utf-8') as f:
                 sql_content = f.read()
             
-            # 分割SQL语句
-            sql_statements = [stmt.strip() for stmt in sql_content.split(';') if stmt.strip()]
-            
             with self.get_cursor(autocommit=True) as cursor:
-                for sql in sql_statements:
-                    if sql and not sql.startswith('--'):
-                        cursor.execute(sql)
-                        logger.debug(f"执行SQL: {sql[:100]}...")
+                self.dialect.run_script(cursor, sql_content)
             
             logger.info(f"成功执行SQL文件: {sql_file_path}")
             
@@ -237,22 +627,19 @@ class DatabaseManager:
             raise
     
     def close_all_connections(self):
-        """关闭所有连接"""
-        with self._pool_lock:
-            for connection in self.connection_pool:
-                try:
-                    connection.close()
-                except:
-                    pass
-            self.connection_pool.clear()
+        """关闭连接池中的所有空闲连接（借出中的连接归还后仍可复用）"""
+        with self._pool_cond:
+            idle = [connection for connection, _, _ in self._idle_connections]
+            self._idle_connections.clear()
+            self._total_connections -= len(idle)
+            self._pool_cond.notify_all()
         
-        # 清理当前线程连接
-        if hasattr(self._local, 'connection') and self._local.connection:
-            try:
-                self._local.connection.close()
-            except:
-                pass
-            self._local.connection = None
+        for connection in idle:
+            self._close_quietly(connection)
+        
+        if self.replicas is not None:
+            for replica in self.replicas.replicas:
+                replica.manager.close_all_connections()
         
         logger.info("所有数据库连接已关闭")
 
@@ -260,10 +647,11 @@ class DatabaseManager:
 # 全局数据库管理器实例
 db_manager: Optional[DatabaseManager] = None
 
-def init_database_manager(host: str, port: int, user: str, password: str, database: str) -> DatabaseManager:
-    """初始化全局数据库管理器"""
+def init_database_manager(host: str = None, port: int = 3306, user: str = None, password: str = None,
+                          database: str = None, **pool_options) -> DatabaseManager:
+    """初始化全局数据库管理器（pool_options 透传连接池配置及 dialect）"""
     global db_manager
-    db_manager = DatabaseManager(host, port, user, password, database)
+    db_manager = DatabaseManager(host, port, user, password, database, **pool_options)
     return db_manager
 
 def get_db_manager() -> DatabaseManager:
@@ -293,6 +681,23 @@ def json_deserialize(json_str) -> Any:
         return json_str
 
 # 时间辅助函数
+# 业务时区：数据库中的时间均为该时区的本地时间（不带时区），中国不实行夏令时，使用固定偏移即可
+APP_TIMEZONE = timezone(timedelta(hours=8), 'Asia/Shanghai')
+
+def local_now() -> datetime:
+    """当前的业务时区本地时间（不带时区，与数据库中的时间直接比较），不依赖服务器时区设置"""
+    return datetime.now(APP_TIMEZONE).replace(tzinfo=None)
+
+def to_local(dt: datetime) -> datetime:
+    """将带时区的时间转换为业务时区本地时间（不带时区），不带时区的时间视为已是本地时间"""
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(APP_TIMEZONE).replace(tzinfo=None)
+
+def serialize_datetime(dt: datetime) -> str:
+    """输出到JSON的唯一格式化入口：带业务时区偏移的ISO格式（如 2024-01-01T10:00:00+08:00）"""
+    return to_local(dt).replace(tzinfo=APP_TIMEZONE).isoformat()
+
 def format_datetime(dt) -> Optional[str]:
     """格式化datetime为字符串"""
     if dt is None:
@@ -304,12 +709,12 @@ def format_datetime(dt) -> Optional[str]:
     return str(dt)
 
 def parse_datetime(dt_str) -> Optional[datetime]:
-    """解析datetime字符串"""
+    """解析datetime字符串为业务时区本地时间，带时区（如结尾为Z）的时间会先转换到业务时区"""
     if dt_str is None or dt_str == '':
         return None
     if isinstance(dt_str, datetime):
-        return dt_str
+        return to_local(dt_str)
     try:
-        return datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
+        return to_local(datetime.fromisoformat(dt_str.replace('Z', '+00:00')))
     except:
-        return None
\ No newline at end of file
+        return None
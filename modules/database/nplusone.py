@@ -0,0 +1,140 @@
+import functools
+import logging
+import os
+import threading
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 检测模式: off=关闭, warn=输出警告日志, raise=抛出 NPlusOneError（用于测试）
+DETECTOR_MODES = ('off', 'warn', 'raise')
+
+# 警告中保留的调用栈帧数
+STACK_DEPTH = 12
+
+# 连接管理和统计模块内部的帧不计入调用位置
+_DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_IGNORED_PATH_PARTS = tuple(
+    os.path.join(_DATABASE_DIR, name) for name in ('manager.py', 'dialects.py', 'query_stats.py', 'nplusone.py')
+) + (os.sep + 'contextlib.py', os.sep + 'threading.py')
+
+_config = {
+    'mode': os.environ.get('DB_NPLUSONE', 'off').lower(),
+    'threshold': int(os.environ.get('DB_NPLUSONE_THRESHOLD', 10))
+}
+
+_local = threading.local()
+
+
+class NPlusOneError(RuntimeError):
+    """同一作用域内相同语句执行次数超过阈值（raise 模式）"""
+
+
+class QueryScope:
+    """一次请求或后台任务执行期间的语句计数"""
+
+    def __init__(self, name: str, threshold: int, mode: str):
+        self.name = name
+        self.threshold = threshold
+        self.mode = mode
+        self.counts: Counter = Counter()
+        # 超过阈值的语句指纹 -> 首次超过阈值时的调用栈
+        self.violations: Dict[str, str] = {}
+
+    def record(self, fingerprint: str):
+        """记录一次语句执行，达到阈值时告警"""
+        self.counts[fingerprint] += 1
+        if self.counts[fingerprint] != self.threshold:
+            return
+
+        stack = format_call_site()
+        self.violations[fingerprint] = stack
+        message = (f"疑似N+1查询: [{self.name}] 中相同语句已执行 {self.threshold} 次\n"
+                   f"SQL: {fingerprint}\n调用位置:\n{stack}")
+        if self.mode == 'raise':
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+def configure(mode: Optional[str] = None, threshold: Optional[int] = None):
+    """
+    修改检测配置（默认读取环境变量 DB_NPLUSONE / DB_NPLUSONE_THRESHOLD）
+
+    Args:
+        mode: off / warn / raise
+        threshold: 同一作用域内相同语句指纹的告警次数
+    """
+    if mode is not None:
+        mode = mode.lower()
+        if mode not in DETECTOR_MODES:
+            raise ValueError(f"不支持的N+1检测模式: {mode}")
+        _config['mode'] = mode
+    if threshold is not None:
+        _config['threshold'] = max(2, int(threshold))
+
+
+def get_mode() -> str:
+    """获取当前检测模式"""
+    return _config['mode']
+
+
+def current_scope() -> Optional[QueryScope]:
+    """获取当前线程的检测作用域"""
+    return getattr(_local, 'scope', None)
+
+
+def start_scope(name: str) -> Optional[QueryScope]:
+    """
+    开始检测作用域（如一次Flask请求），需与 finish_scope 成对调用
+
+    检测关闭或当前线程已在作用域内时返回None（嵌套作用域合并到外层）
+    """
+    if _config['mode'] == 'off' or current_scope() is not None:
+        return None
+    scope = QueryScope(name, _config['threshold'], _config['mode'])
+    _local.scope = scope
+    return scope
+
+
+def finish_scope(scope: Optional[QueryScope]):
+    """结束 start_scope 返回的作用域"""
+    if scope is not None and current_scope() is scope:
+        _local.scope = None
+
+
+@contextmanager
+def query_scope(name: str):
+    """检测作用域上下文: with query_scope('任务名'): ..."""
+    scope = start_scope(name)
+    try:
+        yield scope
+    finally:
+        finish_scope(scope)
+
+
+def query_scoped(name: str):
+    """装饰器：函数每次执行作为一个检测作用域（用于后台任务）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with query_scope(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_query(fingerprint: str):
+    """记录一次语句执行（由 QueryStats 调用），不在作用域内时忽略"""
+    scope = getattr(_local, 'scope', None)
+    if scope is not None:
+        scope.record(fingerprint)
+
+
+def format_call_site() -> str:
+    """格式化调用栈，去掉连接管理和统计模块内部的帧"""
+    frames = [frame for frame in traceback.extract_stack()
+              if not frame.filename.endswith(_IGNORED_PATH_PARTS)]
+    return ''.join(traceback.format_list(frames[-STACK_DEPTH:])).rstrip()
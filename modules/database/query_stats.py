@@ -0,0 +1,237 @@
+import logging
+import math
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from modules.database.nplusone import record_query
+
+# 慢查询单独使用一个logger，便于通过日志配置输出到独立文件
+slow_query_logger = logging.getLogger('modules.database.slow_query')
+
+# 每个语句指纹保留的最近耗时样本数（用于计算p50/p95/p99）
+SAMPLE_WINDOW = 1024
+
+# 指纹缓存与统计的语句数量上限，防止拼接了字面量的SQL导致无限增长
+MAX_FINGERPRINTS = 2048
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w`.])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_REPEATED_GROUPS = re.compile(r'\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+')
+
+
+def fingerprint_sql(sql: str) -> str:
+    """
+    生成SQL指纹：合并空白，字面量和占位符替换为 ?，IN列表和多行VALUES折叠，
+    参数个数不同的同类语句归为同一指纹
+    """
+    normalized = _WHITESPACE.sub(' ', sql).strip()
+    normalized = _STRING_LITERAL.sub('?', normalized)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _PLACEHOLDER_LIST.sub('(?...)', normalized)
+    return _REPEATED_GROUPS.sub('(?...)...', normalized)
+
+
+def redact_params(params: Any) -> Any:
+    """脱敏语句参数：只保留类型和长度，不输出参数值"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: redact_params(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [redact_value(value) for value in params]
+    return redact_value(params)
+
+
+def redact_value(value: Any) -> Optional[str]:
+    """脱敏单个参数值"""
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def percentile(sorted_samples: Sequence[float], fraction: float) -> float:
+    """计算已排序样本的分位数（最近秩法）"""
+    if not sorted_samples:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+
+class StatementStats:
+    """单个SQL指纹的累计统计"""
+
+    __slots__ = ('fingerprint', 'calls', 'errors', 'rows', 'total_time', 'max_time', 'samples')
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def to_dict(self) -> Dict[str, Any]:
+        samples = sorted(self.samples)
+        return {
+            'fingerprint': self.fingerprint,
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': round(self.total_time * 1000, 3),
+            'avg_ms': round(self.total_time * 1000 / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_time * 1000, 3),
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 3)
+        }
+
+
+class QueryTimer:
+    """计时上下文: with stats.measure(sql, params) as timer: ...; timer.rows = n"""
+
+    __slots__ = ('_stats', 'sql', 'params', 'rows', '_started')
+
+    def __init__(self, stats: 'QueryStats', sql: str, params: Any):
+        self._stats = stats
+        self.sql = sql
+        self.params = params
+        self.rows = 0
+
+    def __enter__(self) -> 'QueryTimer':
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stats.record(self.sql, time.perf_counter() - self._started, self.rows, self.params,
+                           failed=exc_type is not None)
+        return False
+
+
+class _NullTimer:
+    """统计关闭时使用的空计时器"""
+
+    __slots__ = ('rows',)
+
+    def __enter__(self) -> '_NullTimer':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class QueryStats:
+    """
+    按SQL指纹汇总的语句执行统计
+
+    记录每条语句的耗时、返回/影响行数和失败次数，超过 slow_query_ms 的语句写入慢查询日志（参数脱敏）
+    """
+
+    def __init__(self, slow_query_ms: Optional[float] = 500, enabled: bool = True):
+        """
+        Args:
+            slow_query_ms: 慢查询阈值（毫秒），None 表示不记录慢查询日志
+            enabled: 是否启用统计
+        """
+        self.slow_query_ms = slow_query_ms
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[str, str] = {}
+        self._statements: Dict[str, StatementStats] = {}
+        self._slow_queries = 0
+        self._started_at = datetime.now()
+
+    def measure(self, sql: str, params: Any = None):
+        """返回计时上下文，退出时记录耗时；统计关闭时返回空计时器"""
+        if not self.enabled:
+            return _NullTimer()
+        return QueryTimer(self, sql, params)
+
+    def _fingerprint(self, sql: str) -> str:
+        fingerprint = self._fingerprints.get(sql)
+        if fingerprint is None:
+            fingerprint = fingerprint_sql(sql)
+            if len(self._fingerprints) < MAX_FINGERPRINTS:
+                self._fingerprints[sql] = fingerprint
+        return fingerprint
+
+    def record(self, sql: str, elapsed: float, rows: int = 0, params: Any = None, failed: bool = False):
+        """记录一次语句执行"""
+        if not self.enabled:
+            return
+        fingerprint = self._fingerprint(sql)
+        with self._lock:
+            stats = self._statements.get(fingerprint)
+            if stats is None:
+                if len(self._statements) >= MAX_FINGERPRINTS:
+                    fingerprint = '<other>'
+                    stats = self._statements.get(fingerprint)
+                if stats is None:
+                    stats = self._statements[fingerprint] = StatementStats(fingerprint)
+            stats.calls += 1
+            stats.rows += rows or 0
+            stats.total_time += elapsed
+            stats.samples.append(elapsed)
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
+            if failed:
+                stats.errors += 1
+
+        elapsed_ms = elapsed * 1000
+        if self.slow_query_ms is not None and elapsed_ms >= self.slow_query_ms:
+            with self._lock:
+                self._slow_queries += 1
+            slow_query_logger.warning(
+                f"慢查询 {elapsed_ms:.1f}ms, 行数: {rows}{', 执行失败' if failed else ''}, "
+                f"SQL: {fingerprint}, 参数: {redact_params(params)}"
+            )
+
+        # 请求/后台任务作用域内的N+1检测
+        record_query(fingerprint)
+
+    def top(self, limit: int = 20, order_by: str = 'total_time') -> List[Dict[str, Any]]:
+        """
+        获取排名靠前的语句统计
+
+        Args:
+            limit: 返回条数
+            order_by: 排序字段，total_time（总耗时）或 calls（调用次数）
+        """
+        if order_by not in ('total_time', 'calls'):
+            raise ValueError(f"不支持的排序字段: {order_by}")
+        with self._lock:
+            ranked = sorted(self._statements.values(), key=lambda stats: getattr(stats, order_by), reverse=True)
+            return [stats.to_dict() for stats in ranked[:max(0, limit)]]
+
+    def summary(self) -> Dict[str, Any]:
+        """获取全部语句的汇总信息"""
+        with self._lock:
+            calls = sum(stats.calls for stats in self._statements.values())
+            total_time = sum(stats.total_time for stats in self._statements.values())
+            return {
+                'enabled': self.enabled,
+                'statements': len(self._statements),
+                'calls': calls,
+                'errors': sum(stats.errors for stats in self._statements.values()),
+                'total_ms': round(total_time * 1000, 3),
+                'slow_queries': self._slow_queries,
+                'slow_query_ms': self.slow_query_ms,
+                'since': self._started_at.isoformat()
+            }
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._statements.clear()
+            self._slow_queries = 0
+            self._started_at = datetime.now()
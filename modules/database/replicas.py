@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    """只读副本：独立的连接池及健康状态"""
+
+    def __init__(self, manager):
+        """
+        Args:
+            manager: 连接该副本的 DatabaseManager（只使用其连接池）
+        """
+        self.manager = manager
+        self.name = manager.dialect.describe()
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.reads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_check: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'healthy': self.healthy,
+            'lag': self.lag,
+            'reads': self.reads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'seconds_since_check': round(time.monotonic() - self.last_check, 1) if self.last_check else None,
+            'pool': self.manager.get_pool_stats()
+        }
+
+
+class ReplicaRouter:
+    """
+    只读副本路由
+
+    在健康的副本间轮询分配只读查询；后台线程定期检测副本连通性和复制延迟，
+    查询时发现副本不可用会立即摘除，直到下一次健康检查通过后恢复
+    """
+
+    def __init__(self, managers: List[Any], health_check_interval: float = 10,
+                 max_lag: Optional[float] = 30):
+        """
+        Args:
+            managers: 各副本的 DatabaseManager
+            health_check_interval: 健康检查间隔秒数
+            max_lag: 允许的最大复制延迟秒数，超过时摘除副本；None 表示不检查延迟
+        """
+        self.replicas = [Replica(manager) for manager in managers]
+        self.health_check_interval = health_check_interval
+        self.max_lag = max_lag
+        self._lock = threading.Lock()
+        self._next = 0
+        self._stats = {
+            'replica_reads': 0,
+            'no_healthy_replica': 0,
+            'read_your_writes': 0,
+            'fallbacks': 0
+        }
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._health_loop, name='db-replica-health', daemon=True)
+        self._thread.start()
+
+    def choose(self) -> Optional[Replica]:
+        """轮询选择一个健康的副本，全部不可用时返回None（使用主库）"""
+        with self._lock:
+            count = len(self.replicas)
+            for offset in range(count):
+                replica = self.replicas[(self._next + offset) % count]
+                if replica.healthy:
+                    self._next = (self._next + offset + 1) % count
+                    replica.reads += 1
+                    self._stats['replica_reads'] += 1
+                    return replica
+            self._stats['no_healthy_replica'] += 1
+            return None
+
+    def record(self, key: str):
+        """累加路由计数（read_your_writes: 写后窗口内读主库, fallbacks: 副本失败后改读主库）"""
+        with self._lock:
+            self._stats[key] += 1
+
+    def mark_failed(self, replica: Replica, error: Exception):
+        """查询时副本不可用：立即摘除，等待健康检查恢复"""
+        with self._lock:
+            replica.failures += 1
+            replica.last_error = str(error)
+            was_healthy, replica.healthy = replica.healthy, False
+            self._stats['fallbacks'] += 1
+        if was_healthy:
+            logger.warning(f"只读副本 {replica.name} 不可用，已摘除: {error}")
+
+    def check_health(self):
+        """检测所有副本的连通性和复制延迟"""
+        for replica in self.replicas:
+            healthy, lag, error = self._probe(replica)
+            with self._lock:
+                was_healthy = replica.healthy
+                replica.healthy = healthy
+                replica.lag = lag
+                replica.last_check = time.monotonic()
+                if error:
+                    replica.last_error = error
+            if was_healthy and not healthy:
+                logger.warning(f"只读副本 {replica.name} 健康检查失败，已摘除: {error}")
+            elif healthy and not was_healthy:
+                logger.info(f"只读副本 {replica.name} 已恢复")
+
+    def _probe(self, replica: Replica):
+        try:
+            with replica.manager.get_cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                lag = replica.manager.dialect.replica_lag(cursor)
+        except Exception as e:
+            return False, None, str(e)
+        if self.max_lag is not None and lag is not None and lag > self.max_lag:
+            return False, lag, f"复制延迟 {lag} 秒超过上限 {self.max_lag} 秒"
+        return True, lag, None
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_check_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"只读副本健康检查异常: {e}")
+
+    def stop(self):
+        """停止健康检查线程并关闭副本的空闲连接"""
+        self._stop.set()
+        for replica in self.replicas:
+            replica.manager.close_all_connections()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取路由统计及各副本状态"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['replicas'] = [replica.to_dict() for replica in self.replicas]
+        return stats
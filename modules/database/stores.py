@@ -1,8 +1,9 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import logging
 import uuid
-from datetime import datetime
 
+from modules.database.base_dao import DEFAULT_PAGE_SIZE
+from modules.database.manager import local_now
 from modules.database.dao import TopicDAO, PromptDAO, KeywordDAO, KeywordGroupDAO, GroupsDAO, AutoPublishConfigDAO, AIConversationDAO
 
 logger = logging.getLogger(__name__)
@@ -20,8 +21,7 @@ class TopicStoreDB:
     def load(self):
         """从数据库加载话题数据（兼容原接口）"""
         try:
-            topics = self.dao.find_all()
-            self.topics = {topic['id']: topic for topic in topics}
+            self.topics = {topic['id']: topic for topic in self.dao.iter_all()}
             logger.info(f"已加载 {len(self.topics)} 个话题")
         except Exception as e:
             logger.error(f"加载话题数据失败: {e}")
@@ -46,8 +46,9 @@ class TopicStoreDB:
             if result:
                 # 更新内存缓存
                 self.topics[topic_id] = topic_data
-                self.topics[topic_id]['created_at'] = datetime.now().isoformat()
-                self.topics[topic_id]['updated_at'] = datetime.now().isoformat()
+                now = local_now()
+                self.topics[topic_id]['created_at'] = now
+                self.topics[topic_id]['updated_at'] = now
                 logger.info(f"已添加话题: {name}")
             return result is not None
         except Exception as e:
@@ -62,7 +63,7 @@ class TopicStoreDB:
                 # 更新内存缓存
                 if topic_id in self.topics:
                     self.topics[topic_id].update(kwargs)
-                    self.topics[topic_id]['updated_at'] = datetime.now().isoformat()
+                    self.topics[topic_id]['updated_at'] = local_now()
                 logger.info(f"已更新话题: {topic_id}")
             return result
         except Exception as e:
@@ -94,18 +95,39 @@ class TopicStoreDB:
             logger.error(f"获取话题失败: {e}")
             return None
     
-    def get_all_topics(self) -> List[Dict]:
-        """获取所有话题 - 返回数组格式"""
+    def get_topics_by_ids(self, topic_ids: List[str], columns: List[str] = None) -> Dict[str, Dict]:
+        """批量获取话题，返回以话题ID为键的字典"""
         try:
-            topics = self.dao.find_all()
+            return self.dao.find_by_ids(topic_ids, columns)
+        except Exception as e:
+            logger.error(f"批量获取话题失败: {e}")
+            return {}
+    
+    def get_all_topics(self, columns: List[str] = None, compact: bool = False) -> List[Dict]:
+        """获取所有话题 - 返回数组格式，可只查询指定字段，compact=True 时返回紧凑记录（只读，供接口直接输出）"""
+        try:
+            topics = self.dao.find_all(columns=columns, compact=compact)
             logger.info(f"TopicStoreDB.get_all_topics() - 从DAO获取的数据类型: {type(topics)}, 数量: {len(topics)}")
             result = topics  # 直接返回数组，不转换为字典
             logger.info(f"TopicStoreDB.get_all_topics() - 最终返回的数据类型: {type(result)}, 数量: {len(result)}")
             return result
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"获取所有话题失败: {e}")
             return []
     
+    def get_topics_page(self, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                        columns: List[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """分页获取话题，返回 (话题列表, 下一页游标)"""
+        try:
+            return self.dao.find_page(('created_at', 'id'), cursor, limit, columns=columns)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"分页获取话题失败: {e}")
+            return [], None
+    
     def get_topics_by_group(self, group_name: str) -> List[Dict]:
         """根据分组获取话题"""
         try:
@@ -169,29 +191,34 @@ class TopicStoreDB:
         }
         
         try:
+            # 生成ID如果没有
+            for topic_data in topics_data:
+                if 'id' not in topic_data or not topic_data['id']:
+                    topic_data['id'] = str(uuid.uuid4())
+            
+            # 一次查询出已存在的ID
+            existing_ids = self.dao.find_existing_values('id', [topic_data['id'] for topic_data in topics_data])
+            
+            new_topics = []
             for topic_data in topics_data:
+                if topic_data['id'] in existing_ids:
+                    results['skipped'].append(topic_data['id'])
+                    continue
+                # 同一批次内重复的ID也跳过
+                existing_ids.add(topic_data['id'])
+                new_topics.append(topic_data)
+            
+            if new_topics:
                 try:
-                    # 生成ID如果没有
-                    if 'id' not in topic_data or not topic_data['id']:
-                        topic_data['id'] = str(uuid.uuid4())
-                    
-                    # 检查是否已存在
-                    if self.dao.find_by_id(topic_data['id']):
-                        results['skipped'].append(topic_data['id'])
-                        continue
-                    
-                    # 尝试插入
-                    result = self.dao.insert(topic_data)
-                    if result:
+                    # 多行插入，冲突时保留已有话题
+                    self.dao.bulk_upsert(new_topics, conflict_columns=['id'], update_columns=[])
+                    for topic_data in new_topics:
                         # 更新内存缓存
                         self.topics[topic_data['id']] = topic_data
                         results['success'].append(topic_data['id'])
-                    else:
-                        results['failed'].append(topic_data['id'])
-                        
                 except Exception as e:
-                    logger.error(f"添加话题 {topic_data.get('id', 'unknown')} 失败: {e}")
-                    results['failed'].append(topic_data.get('id', 'unknown'))
+                    logger.error(f"批量插入 {len(new_topics)} 个话题失败: {e}")
+                    results['failed'].extend(topic_data['id'] for topic_data in new_topics)
             
             logger.info(f"批量添加话题完成: 成功 {len(results['success'])}, 失败 {len(results['failed'])}, 跳过 {len(results['skipped'])}")
             return results
@@ -199,6 +226,7 @@ class TopicStoreDB:
         except Exception as e:
             logger.error(f"批量添加话题失败: {e}")
             # 所有话题都标记为失败
+            results = {'success': [], 'failed': [], 'skipped': []}
             for topic_data in topics_data:
                 results['failed'].append(topic_data.get('id', 'unknown'))
             return results
@@ -363,21 +391,26 @@ class PromptStoreDB:
     def save_prompts(self, prompts: Dict[str, str]) -> bool:
         """保存所有提示词 - 兼容性方法"""
         try:
-            # 先清空现有提示词，再重新插入
             success = True
             
             # 获取当前所有提示词名称
             current_prompts = self.get_all_prompts()
             
-            # 删除不在新数据中的提示词
-            for name in current_prompts.keys():
-                if name not in prompts:
-                    if not self.delete_prompt(name):
-                        success = False
+            # 一次删除不在新数据中的提示词
+            removed = [name for name in current_prompts if name not in prompts]
+            if removed:
+                try:
+                    self.dao.delete_by_keys(removed)
+                except Exception as e:
+                    logger.error(f"删除提示词失败: {e}")
+                    success = False
             
-            # 更新或插入新的提示词
-            for name, content in prompts.items():
-                if not self.set_prompt(name, content):
+            # 多行插入或更新新的提示词
+            if prompts:
+                try:
+                    self.dao.save_prompts(prompts)
+                except Exception as e:
+                    logger.error(f"批量保存提示词失败: {e}")
                     success = False
             
             if success:
@@ -557,24 +590,17 @@ class GroupKeywordsStoreDB:
     def update_group_keywords(self, group_name: str, keywords: List[str]) -> bool:
         """更新分组的所有关键词 - 兼容性方法"""
         try:
-            # 先清空分组的现有关键词
-            current_keywords = self.get_group_keywords(group_name)
-            for keyword in current_keywords:
-                if not self.remove_keyword_from_group(group_name, keyword):
-                    logger.warning(f"删除关键词 '{keyword}' 失败")
-            
-            # 添加新的关键词
-            success = True
             # 去重和过滤空值
             keywords = [kw.strip() for kw in keywords if kw.strip()]
             keywords = list(dict.fromkeys(keywords))  # 去重但保持顺序
             
-            for keyword in keywords:
-                if not self.add_keyword_to_group(group_name, keyword):
-                    success = False
-                    logger.error(f"添加关键词 '{keyword}' 到分组 '{group_name}' 失败")
+            # 确保分组存在
+            self.group_dao.create_group_if_not_exists(group_name)
             
-            return success
+            # 同一事务内清空现有关键词并多行插入新的关键词
+            self.keyword_dao.replace_group_keywords(group_name, keywords)
+            logger.info(f"已更新分组 '{group_name}' 的关键词: {len(keywords)} 个")
+            return True
         except Exception as e:
             logger.error(f"更新分组关键词失败: {e}")
             return False
@@ -640,14 +666,27 @@ class AutoPublishStoreDB:
             logger.error(f"根据话题和提示词获取自动发布配置失败: {e}")
             return None
     
-    def get_all_configs(self) -> List[Dict]:
-        """获取所有自动发布配置"""
+    def get_all_configs(self, columns: List[str] = None) -> List[Dict]:
+        """获取所有自动发布配置，可只查询指定字段"""
         try:
-            return self.config_dao.find_all()
+            return self.config_dao.find_all(columns=columns)
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"获取所有自动发布配置失败: {e}")
             return []
     
+    def get_configs_page(self, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                         columns: List[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """分页获取自动发布配置，返回 (配置列表, 下一页游标)"""
+        try:
+            return self.config_dao.find_page(('created_at', 'id'), cursor, limit, columns=columns)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"分页获取自动发布配置失败: {e}")
+            return [], None
+    
     def get_active_configs(self) -> List[Dict]:
         """获取所有激活的自动发布配置"""
         try:
@@ -716,10 +755,12 @@ class AutoPublishStoreDB:
             logger.error(f"保存对话历史失败: {e}")
             return None
     
-    def get_conversation_history(self, topic_id: str) -> List[Dict]:
-        """获取话题的对话历史"""
+    def get_conversation_history(self, topic_id: str, columns: List[str] = None) -> List[Dict]:
+        """获取话题的对话历史，可只查询指定字段（如不含 messages）"""
         try:
-            return self.conversation_dao.find_by_topic_id(topic_id)
+            return self.conversation_dao.find_all({'topic_id': topic_id}, columns=columns)
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"获取对话历史失败: {e}")
             return []
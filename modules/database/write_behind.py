@@ -0,0 +1,265 @@
+import atexit
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 单条合并UPDATE语句包含的最大行数
+FLUSH_CHUNK_SIZE = 500
+
+# 写入失败后重新排队的最大次数，超过后丢弃并记录错误日志
+MAX_FLUSH_ATTEMPTS = 3
+
+# 列操作: ('set', 值) 覆盖为新值，('add', 增量) 在原值上累加
+ColumnOp = Tuple[str, Any]
+
+
+def merge_op(previous: Optional[ColumnOp], op: ColumnOp) -> ColumnOp:
+    """按提交顺序合并同一行同一列的两次操作"""
+    if previous is None or op[0] == 'set':
+        return op
+    if previous[0] == 'set':
+        return ('set', (previous[1] or 0) + op[1])
+    return ('add', previous[1] + op[1])
+
+
+def build_update_statement(table: str, key_field: str,
+                           rows: List[Tuple[Any, Dict[str, ColumnOp]]]) -> Tuple[str, tuple]:
+    """
+    生成一条合并多行更新的UPDATE语句
+
+    每列为 CASE key WHEN 行1 THEN 值 WHEN 行2 THEN 列 + 增量 ... ELSE 列 END，未涉及该列的行保持原值
+    """
+    columns = sorted({column for _, ops in rows for column in ops})
+    assignments = []
+    params: List[Any] = []
+    for column in columns:
+        branches = []
+        for key, ops in rows:
+            op = ops.get(column)
+            if op is None:
+                continue
+            if op[0] == 'set':
+                branches.append("WHEN %s THEN %s")
+            else:
+                branches.append(f"WHEN %s THEN `{column}` + %s")
+            params.extend((key, op[1]))
+        assignments.append(f"`{column}` = CASE `{key_field}` {' '.join(branches)} ELSE `{column}` END")
+
+    params.extend(key for key, _ in rows)
+    sql = (f"UPDATE `{table}` SET {', '.join(assignments)} "
+           f"WHERE `{key_field}` IN ({', '.join(['%s'] * len(rows))})")
+    return sql, tuple(params)
+
+
+class WriteBehindQueue:
+    """
+    合并写队列（group commit）
+
+    低优先级的计数器和状态更新先按行合并（增量累加、状态保留最后一次），后台线程每隔 flush_interval 秒
+    把每张表的待写行合并为一条UPDATE语句，所有表在同一事务中提交。进程退出时（atexit）或调用 close() 时写入剩余数据。
+    """
+
+    def __init__(self, db, flush_interval: Optional[float] = 0.5, max_pending: int = 1000):
+        """
+        Args:
+            db: DatabaseManager
+            flush_interval: 合并窗口秒数，None 或 0 表示不合并（提交时立即写入）
+            max_pending: 待写行数达到该值时立即写入，不等待窗口结束
+        """
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self.enabled = bool(flush_interval)
+        self._cond = threading.Condition(threading.Lock())
+        # 表名 -> 主键字段名
+        self._key_fields: Dict[str, str] = {}
+        # 表名 -> {主键 -> {列 -> 操作}}，按首次提交顺序排列
+        self._pending: Dict[str, Dict[Any, Dict[str, ColumnOp]]] = {}
+        # 表名 -> 写入后执行的回调（如清空DAO读缓存）
+        self._on_flush: Dict[str, Callable[[], Any]] = {}
+        self._pending_rows = 0
+        self._attempts = 0
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        # 保证后台写入与 close()/flush() 不会同时写同一批数据
+        self._flush_lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'merged': 0,
+            'flushes': 0,
+            'statements': 0,
+            'rows_written': 0,
+            'failures': 0,
+            'dropped': 0
+        }
+
+    def submit(self, table: str, key: Any, ops: Dict[str, ColumnOp], key_field: str = 'id',
+               on_flush: Optional[Callable[[], Any]] = None) -> bool:
+        """
+        提交一行的列操作，与该行尚未写入的操作合并，队列已关闭时返回False（调用方应立即写入）
+
+        Args:
+            table: 表名
+            key: 行主键
+            ops: 列名 -> ('set', 值) / ('add', 增量)
+            key_field: 主键字段名
+            on_flush: 该表写入成功后执行的回调
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            self._key_fields[table] = key_field
+            if on_flush is not None:
+                self._on_flush[table] = on_flush
+            rows = self._pending.setdefault(table, {})
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {}
+                self._pending_rows += 1
+            else:
+                self._stats['merged'] += 1
+            for column, op in ops.items():
+                row[column] = merge_op(row.get(column), op)
+            self._stats['submitted'] += 1
+
+            if self._thread is None:
+                self._start_locked()
+            self._cond.notify()
+        return True
+
+    def execute_now(self, table: str, key: Any, ops: Optional[Dict[str, ColumnOp]] = None,
+                    key_field: str = 'id') -> int:
+        """
+        立即写入一行：先取出该行尚未写入的操作，再合并本次操作后执行
+
+        用于事务内的更新（需与其他语句一起提交）和加行锁读取之前，返回影响行数。
+        与 flush() 互斥，写入失败时取出的操作重新排队并抛出异常
+        """
+        with self._flush_lock:
+            with self._cond:
+                pending = self._pending.get(table, {}).pop(key, None)
+                if pending is not None:
+                    self._pending_rows -= 1
+            row = dict(pending or {})
+            for column, op in (ops or {}).items():
+                row[column] = merge_op(row.get(column), op)
+            if not row:
+                return 0
+            sql, params = build_update_statement(table, key_field, [(key, row)])
+            try:
+                return self.db.execute_update(sql, params)
+            except Exception as e:
+                if pending is not None:
+                    self._requeue({table: {key: pending}}, e)
+                raise
+
+    def flush(self) -> int:
+        """写入全部待写行，返回写入的行数"""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._pending_rows = 0
+                key_fields = dict(self._key_fields)
+                callbacks = [self._on_flush[table] for table in batch if table in self._on_flush]
+            if not batch:
+                return 0
+
+            statements = []
+            row_count = 0
+            for table, rows in batch.items():
+                items = list(rows.items())
+                row_count += len(items)
+                for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+                    statements.append(build_update_statement(table, key_fields[table], items[start:start + FLUSH_CHUNK_SIZE]))
+
+            try:
+                self.db.execute_statements(statements)
+            except Exception as e:
+                self._requeue(batch, e)
+                return 0
+
+            with self._cond:
+                self._attempts = 0
+                self._stats['flushes'] += 1
+                self._stats['statements'] += len(statements)
+                self._stats['rows_written'] += row_count
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"合并写入回调执行失败: {e}")
+            logger.debug(f"合并写入 {row_count} 行, {len(statements)} 条语句")
+            return row_count
+
+    def _requeue(self, batch: Dict[str, Dict[Any, Dict[str, ColumnOp]]], error: Exception):
+        """写入失败：把这一批放回队列头部，之后提交的操作合并在其后"""
+        with self._cond:
+            self._stats['failures'] += 1
+            self._attempts += 1
+            rows = sum(len(table_rows) for table_rows in batch.values())
+            if self._attempts >= MAX_FLUSH_ATTEMPTS:
+                self._attempts = 0
+                self._stats['dropped'] += rows
+                logger.error(f"合并写入连续失败 {MAX_FLUSH_ATTEMPTS} 次，丢弃 {rows} 行更新: {error}")
+                return
+            for table, table_rows in batch.items():
+                newer = self._pending.get(table, {})
+                merged = dict(table_rows)
+                for key, ops in newer.items():
+                    row = merged.setdefault(key, {})
+                    for column, op in ops.items():
+                        row[column] = merge_op(row.get(column), op)
+                self._pending[table] = merged
+            self._pending_rows = sum(len(table_rows) for table_rows in self._pending.values())
+        logger.error(f"合并写入失败，{rows} 行更新将在下次重试: {error}")
+
+    def _start_locked(self):
+        self._thread = threading.Thread(target=self._run, name='db-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # 合并窗口：等待更多更新，待写行数达到上限时提前写入
+                self._cond.wait_for(lambda: self._closed or self._pending_rows >= self.max_pending,
+                                    self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"合并写入异常: {e}")
+
+    def close(self, timeout: float = 10):
+        """停止后台线程并写入剩余数据（可重复调用）"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self.enabled = False
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        for _ in range(MAX_FLUSH_ATTEMPTS):
+            self.flush()
+            with self._cond:
+                if not self._pending:
+                    break
+        logger.info("合并写队列已关闭")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并写队列统计信息"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending_rows'] = self._pending_rows
+        stats['enabled'] = self.enabled
+        stats['flush_interval'] = self.flush_interval
+        return stats
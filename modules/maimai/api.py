@@ -6,19 +6,24 @@ from urllib.parse import urlparse, urlencode
 import urllib.parse
 import uuid
 import hashlib
+import math
+import threading
 import time
 
+from modules.maimai.rate_limiter import PublishRateLimiter, get_publish_rate_limiter
+
 logger = logging.getLogger(__name__)
 
 class MaimaiAPI:
     """脉脉API接口类"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], rate_limiter: Optional[PublishRateLimiter] = None):
         """
         初始化脉脉API
         
         Args:
             config: 脉脉API配置字典
+            rate_limiter: 按账号的发布限流器，默认使用进程内共享的全局限流器
         """
         self.base_url = config.get('base_url', 'https://api.taou.com')
         self.access_token = config.get('access_token', '')
@@ -26,6 +31,7 @@ class MaimaiAPI:
         # 从配置中获取设备参数和请求头
         self.device_params = config.get('device_params', {})
         self.base_headers = config.get('headers', {})
+        self.rate_limiter = rate_limiter or get_publish_rate_limiter()
     
     def _generate_request_id(self) -> str:
         """生成随机的请求ID"""
@@ -68,7 +74,8 @@ class MaimaiAPI:
                     return default_account.get('access_token')
                 else:
                     # 没有默认账号,使用第一个激活的账号
-                    active_accounts = account_dao.find_active()
+                    # 只需要第一个账号的token，其余账号不加载access_token
+                    active_accounts = account_dao.find_active(defer_heavy=True)
                     if active_accounts:
                         logger.info(f"使用第一个激活账号: {active_accounts[0].get('name')}")
                         return active_accounts[0].get('access_token')
@@ -196,6 +203,19 @@ class MaimaiAPI:
             logger.error(f"提取话题信息失败：{str(e)}")
             return None
     
+    def _rate_limit_key(self, account_id: str = None) -> str:
+        """限流键：未指定账号时使用默认账号ID，与显式指定默认账号的发布共用同一个令牌桶"""
+        if account_id:
+            return account_id
+        try:
+            from modules.database.dao import MaimaiAccountDAO
+            default_account = MaimaiAccountDAO().find_default()
+            if default_account:
+                return default_account['id']
+        except Exception as e:
+            logger.error(f"获取默认账号失败: {e}")
+        return 'default'
+
     def publish_content(self,
                        title: str,
                        content: str,
@@ -204,7 +224,9 @@ class MaimaiAPI:
                        circle_type: str = None,
                        topic_name: str = None,
                        publish_type: str = 'anonymous',
-                       account_id: str = None) -> Dict[str, Any]:
+                       account_id: str = None,
+                       wait_for_rate_limit: bool = False,
+                       cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         发布内容到脉脉（完全基于真实的移动端API请求）
 
@@ -217,6 +239,8 @@ class MaimaiAPI:
             topic_name: 话题名称（当使用topic_id时传入，避免重新查询）
             publish_type: 发布方式 (anonymous=匿名, real_name=实名)
             account_id: 脉脉账号ID（可选，不提供则使用默认账号）
+            wait_for_rate_limit: 账号发布限流时一直等待到获得令牌（后台发布）；默认等待超过上限时直接返回失败
+            cancel_event: 限流等待期间该事件被设置时放弃发布，返回结果含 cancelled=True（未调用发布接口）
 
         Returns:
             发布结果字典
@@ -251,6 +275,26 @@ class MaimaiAPI:
             final_topic_id = None
             final_circle_type = None
         
+        # 按账号限流：同一账号的所有发布入口共用令牌桶，令牌不足时排队等待；未启用限流时不解析账号
+        if self.rate_limiter.enabled:
+            allowed, wait = self.rate_limiter.acquire(
+                self._rate_limit_key(account_id),
+                None if wait_for_rate_limit else self.rate_limiter.max_wait,
+                cancel=cancel_event
+            )
+            if not allowed and cancel_event is not None and cancel_event.is_set():
+                return {
+                    'success': False,
+                    'error': '发布已取消',
+                    'cancelled': True
+                }
+            if not allowed:
+                return {
+                    'success': False,
+                    'error': f'账号发布过于频繁，请 {math.ceil(wait)} 秒后重试',
+                    'retry_after': round(wait, 1)
+                }
+        
         try:
             # 构建URL参数（使用配置中的设备参数）
             url_params = self.device_params.copy()
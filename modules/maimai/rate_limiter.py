@@ -0,0 +1,226 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from modules.database.manager import local_now
+
+logger = logging.getLogger(__name__)
+
+# 全局发布限流器（按需从环境变量创建）
+_limiter: Optional['PublishRateLimiter'] = None
+_limiter_lock = threading.Lock()
+
+# acquire() 未指定最长等待时间时使用限流器配置
+_DEFAULT_WAIT = object()
+
+
+class MemoryBucketStore:
+    """进程内令牌桶状态：账号 -> (令牌数, 上次补充时间)"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def reserve(self, key: str, rate: float, burst: int, max_wait: Optional[float]) -> Tuple[bool, float]:
+        """预约一个令牌，返回 (是否预约成功, 需要等待的秒数)；等待超过 max_wait 时不预约"""
+        with self._lock:
+            now = time.monotonic()
+            tokens, refilled_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - refilled_at) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if max_wait is not None and wait > max_wait:
+                self._buckets[key] = (tokens, now)
+                return False, wait
+            # 令牌数可以为负：之后的预约依次排在后面，等待时间按预约顺序递增
+            self._buckets[key] = (tokens - 1, now)
+            return True, wait
+
+
+class DatabaseBucketStore:
+    """
+    数据库令牌桶状态（publish_rate_buckets 表），多个进程共享同一账号的发布速率
+
+    每次预约以乐观锁（版本号比较并交换）更新该账号的令牌数，冲突时重新读取
+    """
+
+    name = 'database'
+
+    def __init__(self):
+        from modules.database.dao import PublishRateBucketDAO
+        self.dao = PublishRateBucketDAO()
+
+    def reserve(self, key: str, rate: float, burst: int, max_wait: Optional[float]) -> Tuple[bool, float]:
+        outcome = {}
+
+        def take_token(bucket: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            now = local_now()
+            elapsed = max(0.0, (now - bucket['refilled_at']).total_seconds())
+            tokens = min(burst, bucket['tokens'] + elapsed * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            outcome['result'] = (max_wait is None or wait <= max_wait, wait)
+            if not outcome['result'][0]:
+                return None
+            return {'tokens': tokens - 1, 'refilled_at': now}
+
+        for _ in range(2):
+            if self.dao.update_with_retry(key, take_token) is not None:
+                return outcome['result']
+            # 账号首次发布：创建满令牌的桶，并发创建时其他进程已插入则直接重新读取
+            try:
+                self.dao.insert({'id': key, 'tokens': burst, 'refilled_at': local_now()})
+            except Exception as e:
+                logger.debug(f"创建发布限流记录失败（可能已被其他进程创建）: {e}")
+        raise RuntimeError(f"无法创建账号 {key} 的发布限流记录")
+
+
+class PublishRateLimiter:
+    """
+    按账号的发布令牌桶限流
+
+    每个账号每分钟补充 rate_per_minute 个令牌，最多积攒 burst 个；每次发布消耗一个令牌，
+    令牌不足时按预约顺序等待。交互式请求等待超过 max_wait 时直接拒绝，后台发布可不设上限
+    """
+
+    def __init__(self, rate_per_minute: float = 2, burst: int = 3, max_wait: Optional[float] = 30,
+                 store: Any = None, sleep: Callable[[float], Any] = time.sleep):
+        """
+        Args:
+            rate_per_minute: 每个账号每分钟允许的发布数，0 表示不限流
+            burst: 令牌桶容量（空闲后允许连续发布的篇数）
+            max_wait: 默认最长等待秒数，None 表示不设上限
+            store: 令牌桶状态存储，默认进程内（MemoryBucketStore）
+        """
+        self.rate_per_minute = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self.enabled = rate_per_minute > 0
+        self.store = store or MemoryBucketStore()
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._waiting = 0
+        # 账号 -> 统计
+        self._accounts: Dict[str, Dict[str, Any]] = {}
+
+    def acquire(self, key: str, max_wait: Any = _DEFAULT_WAIT,
+                cancel: Optional[threading.Event] = None) -> Tuple[bool, float]:
+        """
+        获取账号的一个发布令牌，令牌不足时阻塞等待
+
+        Args:
+            key: 账号标识
+            max_wait: 最长等待秒数，不传时使用限流器配置，None 表示不设上限
+            cancel: 等待期间该事件被设置时放弃等待（如发布器停止），返回获取失败
+
+        Returns:
+            (是否获取成功, 获取成功时为实际等待秒数，被拒绝或取消时为需要等待的秒数)
+        """
+        if not self.enabled:
+            return True, 0.0
+        if max_wait is _DEFAULT_WAIT:
+            max_wait = self.max_wait
+
+        try:
+            allowed, wait = self.store.reserve(key, self.rate, self.burst, max_wait)
+        except Exception as e:
+            # 限流状态不可用时不阻塞发布
+            logger.error(f"发布限流预约失败，本次不限流: {e}")
+            return True, 0.0
+
+        if not allowed:
+            self._record(key, 'rejected', wait)
+            logger.warning(f"账号 {key} 发布过于频繁，需等待 {wait:.1f} 秒，超过上限 {max_wait} 秒")
+            return False, wait
+
+        if wait > 0:
+            logger.info(f"账号 {key} 发布限流，等待 {wait:.1f} 秒")
+            with self._lock:
+                self._waiting += 1
+            try:
+                cancelled = cancel.wait(wait) if cancel is not None else self._sleep(wait)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if cancelled:
+                # 已预约的令牌不退还：取消只发生在停止时，之后的发布最多多等一个令牌
+                self._record(key, 'cancelled', wait)
+                logger.info(f"账号 {key} 发布限流等待已取消")
+                return False, wait
+        self._record(key, 'acquired', wait)
+        return True, wait
+
+    def _record(self, key: str, outcome: str, wait: float):
+        with self._lock:
+            stats = self._accounts.setdefault(key, {
+                'acquired': 0,
+                'rejected': 0,
+                'cancelled': 0,
+                'waited': 0,
+                'total_wait': 0.0,
+                'max_wait': 0.0
+            })
+            stats[outcome] += 1
+            if outcome == 'acquired' and wait > 0:
+                stats['waited'] += 1
+                stats['total_wait'] += wait
+                stats['max_wait'] = max(stats['max_wait'], wait)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流统计：获取/拒绝/取消次数、排队等待时间（秒）及正在等待的发布数"""
+        with self._lock:
+            accounts = {key: dict(stats) for key, stats in self._accounts.items()}
+            waiting = self._waiting
+        acquired = sum(stats['acquired'] for stats in accounts.values())
+        total_wait = sum(stats['total_wait'] for stats in accounts.values())
+        for stats in accounts.values():
+            stats['avg_wait'] = round(stats['total_wait'] / stats['acquired'], 3) if stats['acquired'] else 0.0
+            stats['total_wait'] = round(stats['total_wait'], 3)
+            stats['max_wait'] = round(stats['max_wait'], 3)
+        return {
+            'enabled': self.enabled,
+            'backend': self.store.name,
+            'rate_per_minute': self.rate_per_minute,
+            'burst': self.burst,
+            'max_wait': self.max_wait,
+            'acquired': acquired,
+            'rejected': sum(stats['rejected'] for stats in accounts.values()),
+            'cancelled': sum(stats['cancelled'] for stats in accounts.values()),
+            'waiting': waiting,
+            'total_wait': round(total_wait, 3),
+            'avg_wait': round(total_wait / acquired, 3) if acquired else 0.0,
+            'max_wait_observed': max((stats['max_wait'] for stats in accounts.values()), default=0.0),
+            'accounts': accounts
+        }
+
+
+def init_publish_rate_limiter(**options) -> PublishRateLimiter:
+    """初始化全局发布限流器（参数同 PublishRateLimiter）"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = PublishRateLimiter(**options)
+    return _limiter
+
+
+def get_publish_rate_limiter() -> PublishRateLimiter:
+    """
+    获取全局发布限流器，首次调用时按环境变量创建:
+    PUBLISH_RATE_PER_MINUTE（默认0即不限流，设置后启用）、PUBLISH_RATE_BURST（默认3）、
+    PUBLISH_RATE_MAX_WAIT（交互式发布最长等待秒数，默认30）、PUBLISH_RATE_BACKEND（memory/database，默认memory）
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            backend = os.environ.get('PUBLISH_RATE_BACKEND', 'memory').lower()
+            _limiter = PublishRateLimiter(
+                rate_per_minute=float(os.environ.get('PUBLISH_RATE_PER_MINUTE', 0)),
+                burst=int(os.environ.get('PUBLISH_RATE_BURST', 3)),
+                max_wait=float(os.environ.get('PUBLISH_RATE_MAX_WAIT', 30)),
+                store=DatabaseBucketStore() if backend == 'database' else MemoryBucketStore()
+            )
+            if _limiter.enabled:
+                logger.info(f"发布限流: 每账号每分钟 {_limiter.rate_per_minute} 篇，突发 {_limiter.burst} 篇，后端 {backend}")
+        return _limiter
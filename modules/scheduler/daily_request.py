@@ -10,6 +10,7 @@ import atexit
 from modules.scheduler.http_request import ScheduledRequestsStoreDB
 from modules.scheduler.http_executor import HttpRequestExecutor
 from modules.scheduler.lottery_executor import LotteryExecutor
+from modules.database.nplusone import query_scoped
 
 logger = logging.getLogger(__name__)
 
@@ -107,6 +108,7 @@ class DailyRequestScheduler:
             except Exception as e:
                 logger.error(f"停止每日请求调度器时出错: {e}")
     
+    @query_scoped('DailyRequestScheduler.execute_daily_requests')
     def _execute_daily_requests(self):
         """执行每日的HTTP请求任务"""
         logger.info("开始执行每日定时HTTP请求")
@@ -170,6 +172,7 @@ class DailyRequestScheduler:
         except Exception as e:
             logger.error(f"执行每日定时请求时发生异常: {e}")
     
+    @query_scoped('DailyRequestScheduler.execute_lottery_task')
     def _execute_lottery_task(self):
         """执行每日抽奖任务"""
         logger.info("开始执行每日抽奖任务")
@@ -1,22 +1,91 @@
+import heapq
+import os
+import socket
 import threading
 import time
 import logging
-from datetime import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
 from modules.scheduler.scheduled_posts import ScheduledPostsStoreDB
 from modules.maimai.api import MaimaiAPI
+from modules.database.dao import MaimaiAccountDAO, ScheduledPostDAO
+from modules.database.nplusone import query_scope
+from modules.database.manager import local_now
 
 logger = logging.getLogger(__name__)
 
+# 夜间不发布时段的结束时刻（整点）
+NIGHT_END_HOUR = 8
+
 class ScheduledPublisher:
-    """定时发布任务处理器"""
+    """
+    定时发布任务处理器
+    
+    在内存中维护待发布任务发布时间的最小堆，线程睡眠到最早的发布时间才查询数据库；
+    本进程内的新增、改期、删除经 ScheduledPostDAO 的监听器立即更新堆并唤醒线程，
+    另以低频核对（reconcile_interval）从数据库重新加载，覆盖其他进程和直接执行SQL的变更
+    
+    每轮认领已到期任务，追加到所属账号的发布队列后立即返回，不等待发布完成：同一账号依次发布，不同账号由有界线程池并行。
+    每个队列最多持有 lane_limit 个尚未开始发布的任务，超出的任务交还数据库，下一轮再认领。
+    认领带租约（claimed_by / lease_until），多个发布进程可同时连接同一数据库而不会重复发布，
+    进程崩溃后未完成的任务在租约到期后由其他进程重新认领
+    """
     
-    def __init__(self, scheduled_posts_store: ScheduledPostsStoreDB, maimai_api: MaimaiAPI):
+    def __init__(self, scheduled_posts_store: ScheduledPostsStoreDB, maimai_api: MaimaiAPI,
+                 reconcile_interval: float = 300, min_publish_interval: float = 30, schedule_limit: int = 200,
+                 max_workers: int = 4, lease_seconds: float = 600, claim_limit: int = 100, lane_limit: int = 10):
+        """
+        Args:
+            reconcile_interval: 从数据库核对发布时间表的间隔秒数
+            min_publish_interval: 两轮发布之间的最小间隔秒数
+            schedule_limit: 每次从数据库加载的最早待发布任务数
+            max_workers: 发布线程数，即同时发布的账号数上限
+            lease_seconds: 认领租约秒数，每篇发布前续期；应远大于单篇发布耗时
+            claim_limit: 每轮最多认领的任务数
+            lane_limit: 每个发布队列最多持有的已认领、尚未开始发布的任务数
+        """
         self.scheduled_posts_store = scheduled_posts_store
         self.maimai_api = maimai_api
         self.running = False
         self.thread = None
-        self.check_interval = 30  # 每30秒检查一次
+        self.reconcile_interval = reconcile_interval
+        self.min_publish_interval = min_publish_interval
+        self.schedule_limit = schedule_limit
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.lease_seconds = lease_seconds
+        self.claim_limit = claim_limit
+        self.lane_limit = max(1, lane_limit)
+        # 发布队列 -> 已认领、尚未开始发布的任务；队列存在即有发布线程在处理
+        self._lanes: Dict[str, List[Dict]] = {}
+        # 已交给发布队列（等待或正在发布）的任务ID，租约过期后被本进程重新认领时不重复入队
+        self._queued_ids: Set[str] = set()
+        self._lanes_lock = threading.Lock()
+        # 认领标识：区分同一数据库上的多个发布进程
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
         self._shutdown_event = threading.Event()  # 优雅关闭事件
+        self._wakeup = threading.Condition(threading.Lock())
+        # 发布时间最小堆 [(发布时间, 任务ID)]，改期/删除后旧条目留在堆中，取堆顶时按 _due 跳过
+        self._heap: List[Tuple[datetime, str]] = []
+        # 任务ID -> 当前发布时间
+        self._due: Dict[str, datetime] = {}
+        # 上次加载是否因 schedule_limit 被截断（堆取空后需要重新加载）
+        self._truncated = False
+        # 重新加载期间收到的变更，加载完成后覆盖到数据库快照上
+        self._changes_during_reload: Optional[Dict[str, Optional[datetime]]] = None
+        self._next_reconcile = 0.0
+        self._resume_at = 0.0
+        self._stats = {
+            'wakeups': 0,
+            'reconciliations': 0,
+            'notifications': 0,
+            'publish_rounds': 0,
+            'posts_published': 0,
+            'posts_failed': 0,
+            'claims_lost': 0
+        }
     
     def start(self):
         """启动定时任务处理器"""
@@ -26,6 +95,8 @@ class ScheduledPublisher:
         
         self._shutdown_event.clear()
         self.running = True
+        ScheduledPostDAO.add_schedule_listener(self.schedule_changed)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scheduled-publish')
         # 改为非daemon线程，确保能够优雅关闭
         self.thread = threading.Thread(target=self._run_scheduler, daemon=False)
         self.thread.start()
@@ -39,6 +110,9 @@ class ScheduledPublisher:
         logger.info("正在停止定时发布处理器...")
         self.running = False
         self._shutdown_event.set()
+        ScheduledPostDAO.remove_schedule_listener(self.schedule_changed)
+        with self._wakeup:
+            self._wakeup.notify_all()
         
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=timeout)
@@ -48,58 +122,243 @@ class ScheduledPublisher:
                 logger.info("定时发布处理器已正常停止")
         else:
             logger.info("定时发布处理器已停止")
+        # 正在发布的任务继续完成（限流等待立即取消），各队列尚未开始的任务由发布线程交还数据库
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+    
+    def schedule_changed(self, post_id: str, scheduled_at: Optional[datetime]):
+        """发布时间变更（ScheduledPostDAO 监听器）：scheduled_at 为None表示任务不再待发布"""
+        with self._wakeup:
+            self._stats['notifications'] += 1
+            if self._changes_during_reload is not None:
+                self._changes_during_reload[post_id] = scheduled_at
+            self._apply_change_locked(post_id, scheduled_at)
+            self._wakeup.notify()
+    
+    def _apply_change_locked(self, post_id: str, scheduled_at: Optional[datetime]):
+        if scheduled_at is None:
+            self._due.pop(post_id, None)
+        else:
+            self._due[post_id] = scheduled_at
+            heapq.heappush(self._heap, (scheduled_at, post_id))
+    
+    def _peek_locked(self) -> Optional[datetime]:
+        """堆顶的有效发布时间（丢弃已改期或删除的旧条目）"""
+        heap, due = self._heap, self._due
+        while heap:
+            scheduled_at, post_id = heap[0]
+            if due.get(post_id) == scheduled_at:
+                return scheduled_at
+            heapq.heappop(heap)
+        return None
+    
+    def _reconcile(self):
+        """从数据库重新加载最早的待发布时间；查询失败时保留当前时间表，稍后重试"""
+        with self._wakeup:
+            self._changes_during_reload = {}
+        upcoming = self.scheduled_posts_store.get_upcoming_schedule(self.schedule_limit)
+        with self._wakeup:
+            changes, self._changes_during_reload = self._changes_during_reload, None
+            if upcoming is None:
+                self._truncated = False
+                self._next_reconcile = time.monotonic() + min(self.reconcile_interval, self.min_publish_interval)
+                return
+            self._due = dict(upcoming)
+            self._heap = [(scheduled_at, post_id) for post_id, scheduled_at in upcoming]
+            heapq.heapify(self._heap)
+            self._truncated = len(upcoming) >= self.schedule_limit
+            for post_id, scheduled_at in changes.items():
+                self._apply_change_locked(post_id, scheduled_at)
+            self._next_reconcile = time.monotonic() + self.reconcile_interval
+            self._stats['reconciliations'] += 1
+    
+    def _seconds_until_night_end(self, now: datetime) -> float:
+        end = now.replace(hour=NIGHT_END_HOUR, minute=0, second=0, microsecond=0)
+        if now.hour >= NIGHT_END_HOUR:
+            end += timedelta(days=1)
+        return (end - now).total_seconds()
+    
+    def _seconds_until_wakeup_locked(self) -> float:
+        """距下一次需要处理的时间：最早发布时间（受最小发布间隔和夜间时段限制）与下一次核对中的较早者"""
+        monotonic_now = time.monotonic()
+        wait = self._next_reconcile - monotonic_now
+        next_due = self._peek_locked()
+        if next_due is None:
+            if self._truncated:
+                return 0
+            return wait
+        now = local_now()
+        due_in = max((next_due - now).total_seconds(), self._resume_at - monotonic_now)
+        if self._is_night_time():
+            due_in = max(due_in, self._seconds_until_night_end(now))
+        return min(wait, due_in)
+    
+    def _has_due_post(self) -> bool:
+        with self._wakeup:
+            next_due = self._peek_locked()
+        return (next_due is not None and next_due <= local_now()
+                and time.monotonic() >= self._resume_at and not self._is_night_time())
     
     def _run_scheduler(self):
-        """定时任务主循环 - 使用事件驱动优雅退出"""
+        """定时任务主循环：睡眠到最早的发布时间、本进程的发布时间变更或下一次核对"""
         logger.info("定时发布处理器开始运行")
+        self._reconcile()
         
         while self.running:
-            try:
-                self._process_pending_posts()
-            except Exception as e:
-                logger.error(f"定时发布处理异常: {e}")
-            
-            # 使用事件等待替代简单的sleep，支持快速响应关闭信号
-            if self._shutdown_event.wait(timeout=self.check_interval):
+            with self._wakeup:
+                timeout = self._seconds_until_wakeup_locked()
+                if timeout > 0 and self.running:
+                    self._wakeup.wait(timeout)
+            if self._shutdown_event.is_set():
                 logger.info("收到关闭信号，准备退出...")
                 break
+            self._stats['wakeups'] += 1
+            
+            if self._has_due_post():
+                self._resume_at = time.monotonic() + self.min_publish_interval
+                self._stats['publish_rounds'] += 1
+                try:
+                    with query_scope('ScheduledPublisher.process_pending_posts'):
+                        self._process_pending_posts()
+                except Exception as e:
+                    logger.error(f"定时发布处理异常: {e}")
+                # 本轮认领的任务交给发布队列后按租约到期时间跟踪，重新加载以确认剩余的到期任务
+                self._reconcile()
+            elif time.monotonic() >= self._next_reconcile or (self._truncated and not self._due):
+                self._reconcile()
         
         logger.info("定时发布处理器已退出")
     
     def _is_night_time(self):
-        """检查当前时间是否在夜间时段（22:00-08:00）"""
-        current_hour = datetime.now().hour
+        """检查当前时间是否在夜间时段（22:00-08:00，业务时区）"""
+        current_hour = local_now().hour
         # 夜间时段：22:00-23:59 和 00:00-07:59
         return current_hour >= 22 or current_hour < 8
     
     def _process_pending_posts(self):
-        """处理待发布的任务"""
+        """认领已到期的任务并追加到所属账号的发布队列，不等待发布完成；队列已满的任务立即交还"""
         # 检查是否在夜间时间段（22:00-08:00），如果是则跳过发布
         if self._is_night_time():
             logger.info("当前时间在夜间时段（22:00-08:00），跳过发布任务")
             return
-            
-        # 获取下一个要发布的任务（只获取一个）
-        post_to_publish = self.scheduled_posts_store.get_next_post_to_publish()
         
-        if not post_to_publish:
+        due_posts = self.scheduled_posts_store.claim_due_posts(self.worker_id, self.claim_limit, self.lease_seconds)
+        if not due_posts:
             return
         
-        post_id = post_to_publish['id']
-        title = post_to_publish['title']
-        content = post_to_publish['content']
-        topic_url = post_to_publish.get('topic_url', '')
-        topic_id = post_to_publish.get('topic_id', '')
-        circle_type = post_to_publish.get('circle_type', '')
-        topic_name = post_to_publish.get('topic_name', '')  # 新增：获取话题名称
-        publish_type = post_to_publish.get('publish_type', 'anonymous')  # 新增：获取发布方式
-        account_id = post_to_publish.get('account_id')  # 新增：获取账号ID
+        default_account_id = self._get_default_account_id()
+        overflow: List[str] = []
+        new_lanes: List[str] = []
+        with self._lanes_lock:
+            for post in due_posts:
+                if post['id'] in self._queued_ids:
+                    # 租约过期后被本进程重新认领，仍在队列中等待或正在发布
+                    continue
+                lane_key = self._lane_key(post, default_account_id)
+                queue = self._lanes.get(lane_key)
+                if queue is None:
+                    queue = self._lanes[lane_key] = []
+                    new_lanes.append(lane_key)
+                if len(queue) >= self.lane_limit:
+                    overflow.append(post['id'])
+                    continue
+                queue.append(post)
+                self._queued_ids.add(post['id'])
+            
+            executor = self._executor
+            for lane_key in new_lanes:
+                try:
+                    if executor is None:
+                        raise RuntimeError("发布线程池已关闭")
+                    executor.submit(self._publish_lane, lane_key)
+                except RuntimeError as e:
+                    logger.error(f"启动发布队列失败: {lane_key}, 错误: {e}")
+                    queue = self._lanes.pop(lane_key)
+                    self._queued_ids.difference_update(post['id'] for post in queue)
+                    overflow += [post['id'] for post in queue]
+            active_lanes = len(self._lanes)
+        
+        logger.info(f"本轮认领到期任务 {len(due_posts)} 个，新开 {len(new_lanes)} 个发布队列，"
+                    f"当前 {active_lanes} 个队列在发布")
+        if overflow:
+            # 同一账号积压过多：交还数据库，不占用租约，下一轮再认领
+            logger.info(f"发布队列已满，交还 {len(overflow)} 个任务")
+            self.scheduled_posts_store.release_claims(self.worker_id, overflow)
+    
+    def _get_default_account_id(self) -> Optional[str]:
+        """默认账号ID：未指定账号的任务与显式指定默认账号的任务归入同一发布队列"""
+        try:
+            account = MaimaiAccountDAO().find_default()
+            return account['id'] if account else None
+        except Exception as e:
+            logger.error(f"获取默认账号失败: {e}")
+            return None
+    
+    def _lane_key(self, post: Dict, default_account_id: Optional[str]) -> str:
+        """任务所属的发布队列：重试任务不调用发布接口，各自独立；其余按发布账号分组"""
+        if self.scheduled_posts_store._is_retry_task(post):
+            return f"retry:{post['id']}"
+        return f"account:{post.get('account_id') or default_account_id or ''}"
+    
+    def _publish_lane(self, lane_key: str):
+        """依次发布队列中的任务直到队列为空；处理器停止后不再开始新的发布，交还尚未开始的任务"""
+        while True:
+            with self._lanes_lock:
+                queue = self._lanes[lane_key]
+                if not queue or not self.running:
+                    del self._lanes[lane_key]
+                    unstarted = [post['id'] for post in queue]
+                    self._queued_ids.difference_update(unstarted)
+                    break
+                post = queue.pop(0)
+            try:
+                self._publish_claimed(post)
+            except Exception as e:
+                logger.error(f"定时发布线程异常: {e}")
+            finally:
+                with self._lanes_lock:
+                    self._queued_ids.discard(post['id'])
+        if unstarted:
+            # 处理器停止时未开始发布的任务立即交还，其他进程无需等待租约到期；
+            # 已开始发布的任务即使结果未能写回也不交还，避免重复发布
+            self.scheduled_posts_store.release_claims(self.worker_id, unstarted)
+    
+    def _publish_claimed(self, post: Dict):
+        """续期租约后发布一个已认领的任务"""
+        # 排在同一账号之后的任务可能已等待较久：发布前续期，租约已丢失（任务被删除、改期或被其他进程认领）则跳过
+        if not self.scheduled_posts_store.renew_claim(post['id'], self.worker_id, self.lease_seconds):
+            logger.warning(f"任务认领已失效，跳过发布: {post.get('title')}")
+            with self._wakeup:
+                self._stats['claims_lost'] += 1
+            return
+        try:
+            with query_scope('ScheduledPublisher.publish_post'):
+                success = self._publish_post(post)
+        except Exception as e:
+            success = False
+            logger.error(f"定时任务处理异常: {post.get('title')}, 错误: {e}")
+        if success is None:
+            return
+        with self._wakeup:
+            self._stats['posts_published' if success else 'posts_failed'] += 1
+    
+    def _publish_post(self, post: Dict) -> Optional[bool]:
+        """发布单个任务，返回是否成功；处理器停止导致限流等待取消时交还任务并返回None"""
+        post_id = post['id']
+        title = post['title']
+        topic_url = post.get('topic_url', '')
+        topic_id = post.get('topic_id', '')
+        circle_type = post.get('circle_type', '')
+        topic_name = post.get('topic_name', '')  # 新增：获取话题名称
+        publish_type = post.get('publish_type', 'anonymous')  # 新增：获取发布方式
+        account_id = post.get('account_id')  # 新增：获取账号ID
 
         # 检查是否为重试任务
-        if self.scheduled_posts_store._is_retry_task(post_to_publish):
+        if self.scheduled_posts_store._is_retry_task(post):
             logger.info(f"开始处理重试任务: {title}")
             # 处理重试任务
-            success = self.scheduled_posts_store._handle_retry_task(post_to_publish)
+            success = self.scheduled_posts_store._handle_retry_task(post)
             if success:
                 # 重试成功，删除重试任务
                 self.scheduled_posts_store.mark_as_published(post_id)
@@ -108,8 +367,10 @@ class ScheduledPublisher:
                 # 重试失败，直接删除当前重试任务（新的重试任务已在_handle_retry_task���创建）
                 self.scheduled_posts_store.delete_post(post_id)
                 logger.error(f"重试任务处理失败，已删除: {title}")
-            return
+            return success
 
+        # 认领时未读取内容，只为实际发布的任务按主键加载
+        content = post['content']
         logger.info(f"开始发布定时任务: {title} (发布方式: {'匿名' if publish_type == 'anonymous' else '实名'})")
         if account_id:
             logger.info(f"使用指定账号ID: {account_id}")
@@ -125,7 +386,9 @@ class ScheduledPublisher:
                     circle_type=circle_type,
                     topic_name=topic_name,  # 新增：传递话题名称
                     publish_type=publish_type,  # 新增：传递发布方式
-                    account_id=account_id  # 新增：传递账号ID
+                    account_id=account_id,  # 新增：传递账号ID
+                    wait_for_rate_limit=True,  # 后台发布：账号限流时排队等待，不标记失败
+                    cancel_event=self._shutdown_event  # 处理器停止时放弃等待
                 )
                 logger.info(f"使用选择的话题发布: ID={topic_id}, Name={topic_name}, CircleType={circle_type}")
             elif topic_url:
@@ -135,7 +398,9 @@ class ScheduledPublisher:
                     content=content,
                     topic_url=topic_url,
                     publish_type=publish_type,  # 新增：传递发布方式
-                    account_id=account_id  # 新增：传递账号ID
+                    account_id=account_id,  # 新增：传递账号ID
+                    wait_for_rate_limit=True,  # 后台发布：账号限流时排队等待，不标记失败
+                    cancel_event=self._shutdown_event  # 处理器停止时放弃等待
                 )
                 logger.info(f"使用话题链接发布: {topic_url}")
             else:
@@ -144,14 +409,22 @@ class ScheduledPublisher:
                     title=title,
                     content=content,
                     publish_type=publish_type,  # 新增：传递发布方式
-                    account_id=account_id  # 新增：传递账号ID
+                    account_id=account_id,  # 新增：传递账号ID
+                    wait_for_rate_limit=True,  # 后台发布：账号限流时排队等待，不标记失败
+                    cancel_event=self._shutdown_event  # 处理器停止时放弃等待
                 )
                 logger.info("无话题发布")
             
+            if result.get('cancelled'):
+                # 限流等待期间处理器停止，未调用发布接口：交还任务
+                self.scheduled_posts_store.release_claims(self.worker_id, [post_id])
+                logger.info(f"处理器停止，定时任务未发布: {title}")
+                return None
             if result['success']:
                 # 发布成功，删除任务
                 self.scheduled_posts_store.mark_as_published(post_id)
                 logger.info(f"定时任务发布成功并已删除: {title}")
+                return True
             else:
                 # 发布失败，标记为失败状态
                 error_msg = result.get('error', 'Unknown error')
@@ -163,11 +436,30 @@ class ScheduledPublisher:
             error_msg = str(e)
             self.scheduled_posts_store.mark_as_failed(post_id, error_msg)
             logger.error(f"定时任务发布异常: {title}, 错误: {error_msg}")
+        return False
     
     def get_status(self):
         """获取处理器状态"""
+        with self._wakeup:
+            next_wakeup = self._peek_locked()
+            tracked = len(self._due)
+        with self._lanes_lock:
+            active_lanes = len(self._lanes)
+            queued = len(self._queued_ids)
         return {
             'running': self.running,
             'pending_count': self.scheduled_posts_store.get_pending_count(),
-            'check_interval': self.check_interval
-        }
\ No newline at end of file
+            # 数据库中最早的待发布时间（含其他进程添加的任务）；next_wakeup_at 为本进程时间表的堆顶
+            'next_due_at': self.scheduled_posts_store.get_next_due_time(),
+            'next_wakeup_at': next_wakeup,
+            'tracked_posts': tracked,
+            'reconcile_interval': self.reconcile_interval,
+            'min_publish_interval': self.min_publish_interval,
+            'max_workers': self.max_workers,
+            'lane_limit': self.lane_limit,
+            'active_lanes': active_lanes,
+            'queued_posts': queued,
+            'worker_id': self.worker_id,
+            'lease_seconds': self.lease_seconds,
+            **self._stats
+        }
@@ -1,10 +1,12 @@
 import uuid
 import random
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import logging
 
+from modules.database.base_dao import DEFAULT_PAGE_SIZE
 from modules.database.dao import ScheduledPostDAO
+from modules.database.manager import local_now
 
 logger = logging.getLogger(__name__)
 
@@ -82,8 +84,9 @@ class ScheduledPostsStoreDB:
                 logger.info(f"基于最后待发布时间计算：{latest_scheduled_time.strftime('%H:%M:%S')} + {delay_minutes}分钟")
             else:
                 # 如果没有待发布任务，从当前时间开始计算
-                scheduled_at = datetime.now() + timedelta(minutes=delay_minutes)
-                logger.info(f"基于当前时间计算：{datetime.now().strftime('%H:%M:%S')} + {delay_minutes}分钟")
+                now = local_now()
+                scheduled_at = now + timedelta(minutes=delay_minutes)
+                logger.info(f"基于当前时间计算：{now.strftime('%H:%M:%S')} + {delay_minutes}分钟")
         
         post_data = {
             "id": post_id,
@@ -111,34 +114,62 @@ class ScheduledPostsStoreDB:
     def _get_latest_scheduled_time(self) -> Optional[datetime]:
         """获取所有待发布任务中最晚的发布时间"""
         try:
-            pending_posts = self.dao.find_all({'status': 'pending'}, 'scheduled_at DESC', 1)
-            if pending_posts:
-                scheduled_at_str = pending_posts[0]['scheduled_at']
-                if isinstance(scheduled_at_str, datetime):
-                    return scheduled_at_str
-                elif isinstance(scheduled_at_str, str):
-                    return datetime.fromisoformat(scheduled_at_str.replace('Z', '+00:00'))
-            return None
+            return self.dao.get_latest_scheduled_at()
         except Exception as e:
             logger.error(f"获取最晚发布时间失败: {e}")
             return None
     
-    def get_pending_posts(self) -> List[Dict]:
-        """获取待发布的任务（已到发布时间）"""
+    def get_all_pending_posts(self, columns: List[str] = None) -> List[Dict]:
+        """获取所有待发布的任务（包括未到发布时间的），可只查询指定字段"""
         try:
-            return self.dao.find_pending_posts()
+            return self.dao.find_all_pending_posts(columns)
         except Exception as e:
-            logger.error(f"获取待发布任务失败: {e}")
+            logger.error(f"获取所有待发布任务失败: {e}")
             return []
 
-    def get_all_pending_posts(self) -> List[Dict]:
-        """获取所有待发布的任务（包括未到发布时间的）"""
+    def get_upcoming_schedule(self, limit: int) -> Optional[List[Tuple[str, datetime]]]:
+        """获取最早的 limit 个待处理任务的 (任务ID, 发布时间或租约到期时间)，按时间升序；查询失败时返回None"""
         try:
-            return self.dao.find_all_pending_posts()
+            return self.dao.find_upcoming(limit)
         except Exception as e:
-            logger.error(f"获取所有待发布任务失败: {e}")
+            logger.error(f"获取待发布时间表失败: {e}")
+            return None
+    
+    def claim_due_posts(self, claimed_by: str, limit: int, lease_seconds: float) -> List[Dict]:
+        """认领已到期的任务（含租约过期的任务），返回认领成功的任务"""
+        try:
+            return self.dao.claim_due_posts(claimed_by, limit, lease_seconds)
+        except Exception as e:
+            logger.error(f"认领到期任务失败: {e}")
             return []
-
+    
+    def renew_claim(self, post_id: str, claimed_by: str, lease_seconds: float) -> bool:
+        """发布前续期租约，任务已不属于当前发布进程时返回False"""
+        try:
+            return self.dao.renew_claim(post_id, claimed_by, lease_seconds)
+        except Exception as e:
+            logger.error(f"续期任务租约失败: {e}")
+            return False
+    
+    def release_claims(self, claimed_by: str, post_ids: List[str]) -> int:
+        """交还当前发布进程认领后尚未开始发布的任务"""
+        try:
+            released = self.dao.release_claims(claimed_by, post_ids)
+            if released:
+                logger.info(f"已释放 {released} 个未完成的认领任务")
+            return released
+        except Exception as e:
+            logger.error(f"释放认领任务失败: {e}")
+            return 0
+    
+    def get_next_due_time(self) -> Optional[datetime]:
+        """获取最早的待发布时间"""
+        try:
+            return self.dao.next_due_time()
+        except Exception as e:
+            logger.error(f"获取最早发布时间失败: {e}")
+            return None
+    
     def get_next_post_to_publish(self) -> Optional[Dict]:
         """获取下一个要发布的任务（只返回一个）"""
         try:
@@ -150,38 +181,46 @@ class ScheduledPostsStoreDB:
     def mark_as_published(self, post_id: str) -> bool:
         """标记任务为已发布并删除，如果是自动发布任务则触发下一轮循环"""
         try:
-            post = self.dao.find_by_id(post_id)
-            if post:
+            from modules.database.dao import AutoPublishConfigDAO
+
+            # 删除任务和增加发布数量在同一事务中提交；行锁保证并发发布器不会重复处理同一任务
+            with self.dao.db.transaction():
+                post = self.dao.find_by_id(post_id, for_update=True)
+                if not post:
+                    return False
+
                 # 检查是否是自动发布任务
                 auto_publish_id = post.get('auto_publish_id')
                 # 检查是否是重试任务
                 is_retry = self._is_retry_task(post)
 
                 result = self.dao.mark_as_published(post_id)
-                if result:
-                    logger.info(f"任务 {post['title']} 发布成功，已删除")
 
-                    # 如果是自动发布任务，但不是重试任务，才触发下一轮生成
-                    # 重试任务成功后不需要额外触发，因为重试本身已经恢复了循环
-                    if auto_publish_id and not is_retry:
-                        self._trigger_next_auto_publish_cycle(auto_publish_id)
+                # 如果是自动发布任务，但不是重试任务，才触发下一轮生成
+                # 重试任务成功后不需要额外触发，因为重试本身已经恢复了循环
+                trigger_next_cycle = bool(result and auto_publish_id and not is_retry)
+                if trigger_next_cycle:
+                    AutoPublishConfigDAO().increment_posts(auto_publish_id)
 
-                return result
-            return False
+            if result:
+                logger.info(f"任务 {post['title']} 发布成功，已删除")
+
+            # 生成下一篇内容需要调用AI，耗时较长，放在事务之外
+            if trigger_next_cycle:
+                self._trigger_next_auto_publish_cycle(auto_publish_id)
+
+            return result
         except Exception as e:
             logger.error(f"标记任务为已发布失败: {e}")
             return False
     
     def _trigger_next_auto_publish_cycle(self, auto_publish_id: str):
-        """触发下一轮自动发布循环"""
+        """触发下一轮自动发布循环（已发布数量由 mark_as_published 在事务中增加）"""
         try:
             from modules.auto_publish.generator import AutoPublishCycleGenerator
-            cycle_generator = AutoPublishCycleGenerator()
-            
-            # 先增加已发布数量
             from modules.database.dao import AutoPublishConfigDAO
+            cycle_generator = AutoPublishCycleGenerator()
             auto_config_dao = AutoPublishConfigDAO()
-            auto_config_dao.increment_posts(auto_publish_id)
             
             # 继续自动发布循环
             success = cycle_generator.continue_auto_publish_cycle(auto_publish_id)
@@ -205,31 +244,21 @@ class ScheduledPostsStoreDB:
             from modules.database.dao import AutoPublishConfigDAO
             auto_config_dao = AutoPublishConfigDAO()
 
-            # 首先检查配置是否仍然活跃
-            config = auto_config_dao.find_by_id(auto_publish_id)
-            if not config:
+            # 检查配置状态并增加重试次数（乐观锁：并发安排重试时只有一个能基于同一版本增加，其余重新读取后判断）
+            outcome, config = auto_config_dao.try_increment_retry(auto_publish_id, error_msg)
+            if outcome == 'missing':
                 logger.error(f"找不到自动发布配置: {auto_publish_id}，取消重试")
                 return
-
-            if not config.get('is_active'):
+            if outcome == 'inactive':
                 logger.info(f"自动发布配置 {auto_publish_id} 已停用，取消重试")
                 return
-
-            # 检查是否可以重试
-            if not auto_config_dao.can_retry(auto_publish_id):
+            if outcome == 'exhausted':
+                # 达到最大重试次数，配置已停用
                 logger.error(f"自动发布配置 {auto_publish_id} 已达到最大重试次数，停用配置")
-                # 达到最大重试次数，停用配置
-                auto_config_dao.update(auto_publish_id, {
-                    'is_active': 0,
-                    'last_error': f"达到最大重试次数: {error_msg or '生成内容失败'}"
-                })
                 return
 
-            # 增加重试次数
-            auto_config_dao.increment_retry(auto_publish_id, error_msg)
-
-            # 计算重试延迟（基于重试次数：第1次重试5分钟，第2次10分钟，第3次15分钟）
-            retry_count = config.get('retry_count', 1)
+            # 计算重试延迟（基于本次重试次数：第1次重试5分钟，第2次10分钟，第3次15分钟）
+            retry_count = config['retry_count']
             retry_delay_minutes = retry_count * 5  # 5, 10, 15分钟
             
             # 创建重试任务
@@ -243,10 +272,11 @@ class ScheduledPostsStoreDB:
                 'content': f"自动发布配置 {auto_publish_id} 重试任务",
                 'auto_publish_id': auto_publish_id,
                 'status': 'pending',
-                'scheduled_at': datetime.now() + timedelta(minutes=retry_delay_minutes)
+                'scheduled_at': local_now() + timedelta(minutes=retry_delay_minutes)
             }
             
             result = self.dao.insert(retry_data)
+
             if result:
                 logger.info(f"已安排自动发布配置 {auto_publish_id} 的重试任务，{retry_delay_minutes}分钟后执行（第{retry_count}次重试）")
             else:
@@ -335,14 +365,27 @@ class ScheduledPostsStoreDB:
             logger.error(f"标记任务为失败失败: {e}")
             return False
     
-    def get_all_posts(self) -> List[Dict]:
-        """获取所有定时发布任务"""
+    def get_all_posts(self, columns: List[str] = None, compact: bool = False) -> List[Dict]:
+        """获取所有定时发布任务，可只查询指定字段，compact=True 时返回紧凑记录（只读，供接口直接输出）"""
         try:
-            return self.dao.find_all(order_by='created_at DESC')
+            return self.dao.find_all(order_by='created_at DESC', columns=columns, compact=compact)
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"获取所有发布任务失败: {e}")
             return []
     
+    def get_posts_page(self, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                       columns: List[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """按创建时间倒序分页获取定时发布任务，返回 (任务列表, 下一页游标)"""
+        try:
+            return self.dao.find_page(('created_at', 'id'), cursor, limit, descending=True, columns=columns)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"分页获取发布任务失败: {e}")
+            return [], None
+    
     def get_pending_count(self) -> int:
         """获取待发布任务数量"""
         try:
@@ -401,19 +444,7 @@ class ScheduledPostsStoreDB:
                 delay_minutes = random.randint(5, 20)
 
             # 获取当前所有待发布任务的最晚发布时间（排除当前要重新安排的任务）
-            latest_scheduled_time = None
-            pending_posts = self.dao.find_all({'status': 'pending'})
-
-            for post_data in pending_posts:
-                if post_data['id'] != post_id:
-                    scheduled_time_str = post_data['scheduled_at']
-                    if isinstance(scheduled_time_str, datetime):
-                        scheduled_time = scheduled_time_str
-                    else:
-                        scheduled_time = datetime.fromisoformat(scheduled_time_str.replace('Z', '+00:00'))
-
-                    if latest_scheduled_time is None or scheduled_time > latest_scheduled_time:
-                        latest_scheduled_time = scheduled_time
+            latest_scheduled_time = self.dao.get_latest_scheduled_at(exclude_id=post_id)
 
             if latest_scheduled_time:
                 # 如果还有其他待发布任务，排在最后
@@ -421,12 +452,12 @@ class ScheduledPostsStoreDB:
                 logger.info(f"重新安排任务排队：基于最后任务时间 {latest_scheduled_time.strftime('%H:%M:%S')} + {delay_minutes}分钟")
             else:
                 # 如果没有其他待发布任务，从当前时间开始
-                new_scheduled_at = datetime.now() + timedelta(minutes=delay_minutes)
+                new_scheduled_at = local_now() + timedelta(minutes=delay_minutes)
                 logger.info(f"重新安排任务：基于当前时间 + {delay_minutes}分钟")
 
             result = self.dao.reschedule_post(post_id, new_scheduled_at)
             if result:
-                post = self.dao.find_by_id(post_id)
+                post = self.dao.find_by_id(post_id, columns=['id', 'title'])
                 if post:
                     logger.info(f"已重新安排任务发布时间: {post['title']} ({new_scheduled_at.strftime('%Y-%m-%d %H:%M:%S')})")
             return result
@@ -438,15 +469,17 @@ class ScheduledPostsStoreDB:
     def cleanup_failed_retry_tasks(self) -> int:
         """清理所有失败的重试任务"""
         try:
-            # 查找所有失败状态的重试任务
-            failed_posts = self.dao.find_all({'status': 'failed'})
+            # 流式遍历失败状态的任务，先收集重试任务再删除，避免边读边写占用两个连接
+            retry_posts = [
+                post for post in self.dao.iter_all({'status': 'failed'}, columns=['id', 'title'])
+                if self._is_retry_task(post)
+            ]
             deleted_count = 0
 
-            for post in failed_posts:
-                if self._is_retry_task(post):
-                    if self.dao.delete(post['id']):
-                        deleted_count += 1
-                        logger.info(f"清理失败的重试任务: {post['title']}")
+            for post in retry_posts:
+                if self.dao.delete(post['id']):
+                    deleted_count += 1
+                    logger.info(f"清理失败的重试任务: {post['title']}")
 
             if deleted_count > 0:
                 logger.info(f"共清理了 {deleted_count} 个失败的重试任务")
@@ -2759,7 +2759,8 @@ class MaimaiPublisher {
 
     async loadScheduledPostsCount() {
         try {
-            const response = await fetch('/api/scheduled-posts');
+            // 只需要待发布数量，不拉取任务列表和正文
+            const response = await fetch('/api/scheduled-posts?limit=1&fields=id');
             const result = await response.json();
             if (result.success) {
                 this.updatePendingCount(result.pending_count);
@@ -2796,7 +2797,7 @@ class MaimaiPublisher {
         }
         
         // 按发布时间排序，显示发布队列顺序
-        const sortedPosts = posts.filter(post => post.status === 'pending')
+        const sortedPosts = posts.filter(post => post.status === 'pending' || post.status === 'claimed')
             .sort((a, b) => new Date(a.scheduled_at) - new Date(b.scheduled_at));
         
         const failedPosts = posts.filter(post => post.status === 'failed');
@@ -2830,6 +2831,9 @@ class MaimaiPublisher {
                 statusText = queueNumber ? `队列第${queueNumber}位` : '等待中';
                 statusClass = 'status-pending';
             }
+        } else if (post.status === 'claimed') {
+            statusText = '发布中';
+            statusClass = 'status-ready';
         } else if (post.status === 'failed') {
             statusText = '发布失败';
             statusClass = 'status-failed';
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.database import cache as cache_module
+from modules.database import manager as manager_module
+from modules.database.dialects import SQLiteDialect
+from modules.database.manager import init_database_manager
+
+
+@pytest.fixture
+def db(tmp_path):
+    """每个测试使用独立的SQLite数据库（按 schema_sqlite.sql 建表），不启用合并写窗口"""
+    database = init_database_manager(dialect=SQLiteDialect(str(tmp_path / 'test.db')),
+                                     write_behind_interval=0, max_connections=8)
+    database.create_database_if_not_exists()
+    yield database
+    database.write_behind.close()
+    database.close_all_connections()
+    manager_module.db_manager = None
+    # DAO读缓存按类共享，避免上一个测试的数据泄漏到下一个测试
+    with cache_module._caches_lock:
+        caches = list(cache_module._caches)
+    for read_cache in caches:
+        read_cache.clear()
@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+from modules.database.base_dao import ConcurrentUpdateError
+from modules.database.dao import AIConversationDAO, AutoPublishConfigDAO, TopicDAO
+
+
+@pytest.fixture
+def config_dao(db):
+    dao = AutoPublishConfigDAO()
+    dao.insert({'id': 'c1', 'publish_type': 'anonymous', 'prompt_key': 'k', 'current_posts': 0})
+    return dao
+
+
+def test_update_if_version_rejects_stale_version(config_dao):
+    record = config_dao.find_by_id('c1')
+    assert record['version'] == 0
+
+    assert config_dao.update_if_version('c1', 0, {'max_posts': 5}) is True
+    # 第二个写入者仍持有旧版本号
+    assert config_dao.update_if_version('c1', 0, {'max_posts': 9}) is False
+
+    record = config_dao.find_by_id('c1')
+    assert record['max_posts'] == 5
+    assert record['version'] == 1
+
+
+def test_update_if_version_missing_record(config_dao):
+    assert config_dao.update_if_version('missing', 0, {'max_posts': 5}) is False
+
+
+def test_update_if_version_requires_version_field(db):
+    with pytest.raises(TypeError):
+        TopicDAO().update_if_version('t1', 0, {'name': 'x'})
+
+
+def test_plain_update_bumps_version(config_dao):
+    config_dao.update('c1', {'max_posts': 3})
+    assert config_dao.find_by_id('c1')['version'] == 1
+    assert config_dao.update_if_version('c1', 0, {'max_posts': 4}) is False
+
+
+def test_update_with_retry_rereads_after_conflict(config_dao):
+    calls = []
+
+    def add_one(record):
+        calls.append(record['version'])
+        if len(calls) == 1:
+            # 读取之后、写回之前被其他写入者修改
+            config_dao.update('c1', {'current_posts': record['current_posts'] + 10})
+        return {'current_posts': record['current_posts'] + 1}
+
+    record = config_dao.update_with_retry('c1', add_one)
+    assert calls == [0, 1]
+    assert record['current_posts'] == 11
+    assert record['version'] == 2
+    assert config_dao.find_by_id('c1')['current_posts'] == 11
+
+
+def test_update_with_retry_concurrent_increments(config_dao):
+    def worker():
+        for _ in range(5):
+            config_dao.update_with_retry('c1', lambda record: {'current_posts': record['current_posts'] + 1},
+                                         max_attempts=50)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    record = config_dao.find_by_id('c1')
+    assert record['current_posts'] == 20
+    assert record['version'] == 20
+
+
+def test_update_with_retry_gives_up(config_dao):
+    def always_conflict(record):
+        config_dao.update('c1', {'max_posts': record['version']})
+        return {'current_posts': 1}
+
+    with pytest.raises(ConcurrentUpdateError):
+        config_dao.update_with_retry('c1', always_conflict, max_attempts=2)
+
+
+def test_update_with_retry_refused_inside_transaction(config_dao, db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            config_dao.update_with_retry('c1', lambda record: {'current_posts': 1})
+
+
+def test_update_with_retry_missing_record_and_no_changes(config_dao):
+    assert config_dao.update_with_retry('missing', lambda record: {'current_posts': 1}) is None
+    record = config_dao.update_with_retry('c1', lambda record: None)
+    assert record['version'] == 0
+
+
+def test_append_messages_uses_decoded_latest_conversation(db):
+    TopicDAO().insert({'id': 't1', 'name': 'topic'})
+    dao = AIConversationDAO()
+    dao.create_with_messages('conv1', 't1', [{'role': 'user', 'content': 'hi'}], config_id=None)
+
+    latest = dao.get_latest_by_topic('t1')
+    assert latest['messages'] == [{'role': 'user', 'content': 'hi'}]
+    assert dao.append_messages('conv1', [{'role': 'assistant', 'content': 'hello'}]) is True
+    # 以读取时的版本号写回已过期
+    assert dao.update_if_version('conv1', latest['version'], {'messages': []}) is False
+    assert len(dao.get_latest_by_topic('t1')['messages']) == 2
+
+
+def test_conversation_conflict_appends_new_turn_and_resyncs_prompt(db):
+    from modules.auto_publish.generator import AutoPublishCycleGenerator
+
+    TopicDAO().insert({'id': 't1', 'name': 'topic'})
+    dao = AIConversationDAO()
+    dao.create_with_messages('conv1', 't1', [{'role': 'system', 'content': 'old prompt'},
+                                             {'role': 'user', 'content': '开始'},
+                                             {'role': 'assistant', 'content': 'first'}])
+    generator = AutoPublishCycleGenerator.__new__(AutoPublishCycleGenerator)
+    generator.conversation_dao = dao
+
+    # 本轮生成读取的是版本 0，并同步了新的提示词
+    conversation = dao.get_latest_by_topic('t1')
+    messages = generator._apply_system_prompt(conversation['messages'], 'new prompt')
+    history_length = len(messages)
+    messages += [{'role': 'user', 'content': '开始'}, {'role': 'assistant', 'content': 'draft'},
+                 {'role': 'assistant', 'content': 'ours'}]
+
+    # 生成期间另一个任务追加了一轮（数据库中仍是旧提示词）
+    dao.append_messages('conv1', [{'role': 'user', 'content': '开始'}, {'role': 'assistant', 'content': 'theirs'}])
+
+    assert generator._update_conversation_history('conv1', messages, conversation['version'],
+                                                  history_length, 'new prompt') is True
+    saved = dao.find_by_id('conv1')['messages']
+    assert saved[0] == {'role': 'system', 'content': 'new prompt'}
+    assert [msg['content'] for msg in saved[1:]] == ['开始', 'first', '开始', 'theirs', '开始', 'draft', 'ours']
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from modules.database.base_dao import decode_cursor, encode_cursor
+from modules.database.dao import TopicDAO
+
+
+@pytest.fixture
+def topic_dao(db):
+    dao = TopicDAO()
+    base = datetime(2024, 1, 1, 10, 0, 0)
+    # 每3条共用同一个 created_at，翻页必须依靠 id 区分
+    for n in range(10):
+        dao.insert({'id': f't{n:02d}', 'name': f'topic {n}', 'created_at': base + timedelta(minutes=n // 3)})
+    return dao
+
+
+def collect_pages(dao, limit, **options):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = dao.find_page(after=cursor, limit=limit, **options)
+        pages.append([row['id'] for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    values = [datetime(2024, 1, 1, 10, 0, 0), 't01']
+    decoded = decode_cursor(encode_cursor(values), 2)
+    assert decoded[1] == 't01'
+    assert datetime.fromisoformat(decoded[0]).replace(tzinfo=None) == values[0]
+
+
+@pytest.mark.parametrize('limit', [1, 3, 4, 10])
+def test_find_page_visits_every_row_once(topic_dao, limit):
+    pages = collect_pages(topic_dao, limit)
+    ids = [record_id for page in pages for record_id in page]
+    assert ids == [f't{n:02d}' for n in range(10)]
+    assert all(len(page) <= limit for page in pages)
+
+
+def test_find_page_descending(topic_dao):
+    pages = collect_pages(topic_dao, 4, descending=True)
+    ids = [record_id for page in pages for record_id in page]
+    assert ids == [f't{n:02d}' for n in reversed(range(10))]
+
+
+def test_find_page_with_columns_keeps_order_key(topic_dao):
+    rows, cursor = topic_dao.find_page(limit=2, columns=['name'])
+    assert [row['name'] for row in rows] == ['topic 0', 'topic 1']
+    rows, _ = topic_dao.find_page(after=cursor, limit=2, columns=['name'])
+    assert [row['id'] for row in rows] == ['t02', 't03']
+
+
+def test_find_page_with_conditions(topic_dao):
+    topic_dao.update('t04', {'name': 'odd'})
+    rows, cursor = topic_dao.find_page(limit=5, conditions={'name': 'odd'})
+    assert [row['id'] for row in rows] == ['t04']
+    assert cursor is None
+
+
+def test_find_page_rejects_bad_cursor(topic_dao):
+    with pytest.raises(ValueError):
+        topic_dao.find_page(after='not-a-cursor')
+    with pytest.raises(ValueError):
+        topic_dao.find_page(after=encode_cursor(['only-one-value']))
+
+
+def test_find_page_rejects_unknown_order_field(topic_dao):
+    with pytest.raises(ValueError):
+        topic_dao.find_page(order_key=('missing', 'id'))
@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+import requests
+
+from modules.database.dao import MaimaiAccountDAO, ScheduledPostDAO
+from modules.database.manager import local_now
+from modules.maimai.api import MaimaiAPI
+from modules.maimai.rate_limiter import PublishRateLimiter
+from modules.scheduler.publisher import ScheduledPublisher
+from modules.scheduler.scheduled_posts import ScheduledPostsStoreDB
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class GatedAPI:
+    """acc0 的发布阻塞到 gate 打开，其他账号立即成功"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+        self.published = []
+
+    def publish_content(self, title, content, account_id=None, **options):
+        if account_id == 'acc0':
+            self.entered.set()
+            self.gate.wait(5)
+        self.published.append(title)
+        return {'success': True}
+
+
+@pytest.fixture
+def store(db):
+    for n in range(2):
+        MaimaiAccountDAO().insert({'id': f'acc{n}', 'name': f'a{n}', 'access_token': 't',
+                                   'is_default': 1 if n == 0 else 0, 'is_active': 1})
+    return ScheduledPostsStoreDB()
+
+
+def add_due_posts(store, account_id, count, prefix):
+    past = local_now() - timedelta(minutes=1)
+    return [store.add_post(f'{prefix}{n}', 'content', account_id=account_id, scheduled_at=past)
+            for n in range(count)]
+
+
+def statuses(post_ids):
+    rows = ScheduledPostDAO().find_by_ids(post_ids, columns=['status'])
+    return [rows[post_id]['status'] if post_id in rows else 'published' for post_id in post_ids]
+
+
+def test_round_does_not_wait_for_busy_lane_and_caps_its_queue(store):
+    acc0 = add_due_posts(store, 'acc0', 4, 'a')
+    acc1 = add_due_posts(store, 'acc1', 1, 'b')
+    api = GatedAPI()
+    publisher = ScheduledPublisher(store, api, max_workers=2, lane_limit=2)
+    publisher._is_night_time = lambda: False
+    publisher.running = True
+    publisher._executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        # acc0 的发布仍被阻塞时本轮已返回
+        publisher._process_pending_posts()
+        assert wait_until(lambda: statuses(acc1) == ['published'])
+        assert api.entered.wait(5)
+        assert statuses(acc0) == ['claimed', 'claimed', 'pending', 'pending']
+        assert publisher.get_status()['queued_posts'] == 2
+        assert publisher.get_status()['active_lanes'] == 1
+
+        # 停止时正在发布的任务完成，未开始的任务交还
+        publisher.running = False
+        publisher._shutdown_event.set()
+        api.gate.set()
+        assert wait_until(lambda: publisher.get_status()['active_lanes'] == 0)
+        assert wait_until(lambda: statuses(acc0) == ['published', 'pending', 'pending', 'pending'])
+        assert api.published == ['b0', 'a0']
+        assert publisher.get_status()['queued_posts'] == 0
+    finally:
+        api.gate.set()
+        publisher._executor.shutdown(wait=True)
+
+
+def test_stop_interrupts_rate_limit_wait(store, monkeypatch):
+    class Response:
+        status_code = 200
+        text = '{}'
+
+        def json(self):
+            return {}
+
+    calls = []
+    monkeypatch.setattr(requests, 'post', lambda *args, **kwargs: calls.append(args) or Response())
+    post_ids = add_due_posts(store, 'acc0', 3, 'p')
+    api = MaimaiAPI({}, rate_limiter=PublishRateLimiter(rate_per_minute=1, burst=1))
+    publisher = ScheduledPublisher(store, api, min_publish_interval=0)
+    publisher._is_night_time = lambda: False
+
+    publisher.start()
+    try:
+        assert wait_until(lambda: api.rate_limiter.get_stats()['waiting'] == 1)
+    finally:
+        started = time.monotonic()
+        publisher.stop()
+    assert wait_until(lambda: publisher.get_status()['active_lanes'] == 0)
+    assert time.monotonic() - started < 2
+
+    assert len(calls) == 1
+    assert wait_until(lambda: statuses(post_ids) == ['published', 'pending', 'pending'])
+    assert api.rate_limiter.get_stats()['cancelled'] == 1
@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+import requests
+
+from modules.database.dao import MaimaiAccountDAO
+from modules.maimai.api import MaimaiAPI
+from modules.maimai.rate_limiter import DatabaseBucketStore, PublishRateLimiter
+
+
+class RecordingSleep:
+    """替代 time.sleep：记录等待时间，不真正睡眠"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, seconds):
+        self.calls.append(seconds)
+
+
+@pytest.fixture
+def sleep():
+    return RecordingSleep()
+
+
+def test_disabled_limiter_never_waits(sleep):
+    limiter = PublishRateLimiter(rate_per_minute=0, sleep=sleep)
+    assert all(limiter.acquire('acc') == (True, 0.0) for _ in range(10))
+    assert sleep.calls == []
+    assert limiter.get_stats()['enabled'] is False
+
+
+def test_burst_then_queued_waits(sleep):
+    limiter = PublishRateLimiter(rate_per_minute=60, burst=2, max_wait=None, sleep=sleep)
+    results = [limiter.acquire('acc') for _ in range(4)]
+
+    assert [allowed for allowed, _ in results] == [True] * 4
+    assert results[0][1] == 0 and results[1][1] == 0
+    # 令牌不足后按预约顺序排队：每个令牌间隔 1 秒
+    assert results[2][1] == pytest.approx(1, abs=0.05)
+    assert results[3][1] == pytest.approx(2, abs=0.05)
+    assert sleep.calls == [results[2][1], results[3][1]]
+
+    stats = limiter.get_stats()
+    assert stats['acquired'] == 4
+    assert stats['accounts']['acc']['waited'] == 2
+
+
+def test_accounts_have_separate_buckets(sleep):
+    limiter = PublishRateLimiter(rate_per_minute=60, burst=1, sleep=sleep)
+    assert limiter.acquire('a') == (True, 0.0)
+    assert limiter.acquire('b') == (True, 0.0)
+    assert sleep.calls == []
+
+
+def test_rejects_when_wait_exceeds_max_wait(sleep):
+    limiter = PublishRateLimiter(rate_per_minute=60, burst=1, max_wait=0.5, sleep=sleep)
+    assert limiter.acquire('acc')[0] is True
+
+    allowed, wait = limiter.acquire('acc')
+    assert allowed is False
+    assert wait == pytest.approx(1, abs=0.05)
+    assert sleep.calls == []
+    # 被拒绝的请求不占用令牌：不设上限时仍只需等待约 1 秒
+    allowed, wait = limiter.acquire('acc', None)
+    assert allowed is True and wait == pytest.approx(1, abs=0.05)
+    assert limiter.get_stats()['rejected'] == 1
+
+
+def test_cancel_event_interrupts_wait(sleep):
+    limiter = PublishRateLimiter(rate_per_minute=1, burst=1, max_wait=None, sleep=sleep)
+    limiter.acquire('acc')
+    cancel = threading.Event()
+    cancel.set()
+
+    allowed, wait = limiter.acquire('acc', cancel=cancel)
+    assert allowed is False
+    assert wait == pytest.approx(60, abs=0.5)
+    assert sleep.calls == []
+    stats = limiter.get_stats()
+    assert stats['cancelled'] == 1
+    assert stats['waiting'] == 0
+
+
+def test_database_store_shares_bucket_between_limiters(db, sleep):
+    # 两个限流器模拟两个发布进程
+    first = PublishRateLimiter(rate_per_minute=1, burst=2, max_wait=5, store=DatabaseBucketStore(), sleep=sleep)
+    second = PublishRateLimiter(rate_per_minute=1, burst=2, max_wait=5, store=DatabaseBucketStore(), sleep=sleep)
+
+    assert first.acquire('acc') == (True, 0.0)
+    assert second.acquire('acc') == (True, 0.0)
+    allowed, wait = first.acquire('acc')
+    assert allowed is False
+    assert wait == pytest.approx(60, abs=1)
+    assert second.get_stats()['backend'] == 'database'
+
+
+def test_publish_content_reports_retry_after_and_cancel(db, sleep):
+    MaimaiAccountDAO().insert({'id': 'acc0', 'name': 'a', 'access_token': 't', 'is_default': 1, 'is_active': 1})
+    api = MaimaiAPI({}, rate_limiter=PublishRateLimiter(rate_per_minute=1, burst=1, max_wait=10, sleep=sleep))
+    api.rate_limiter.acquire('acc0')
+
+    # 未指定账号时与默认账号共用令牌桶
+    result = api.publish_content('title', 'content')
+    assert result['success'] is False
+    assert result['retry_after'] == pytest.approx(60, abs=0.5)
+
+    cancel = threading.Event()
+    cancel.set()
+    result = api.publish_content('title', 'content', account_id='acc0', wait_for_rate_limit=True,
+                                 cancel_event=cancel)
+    assert result == {'success': False, 'error': '发布已取消', 'cancelled': True}
+
+
+def test_disabled_limiter_skips_account_lookup(db, monkeypatch):
+    class Response:
+        status_code = 200
+        text = '{}'
+
+        def json(self):
+            return {}
+
+    MaimaiAccountDAO().insert({'id': 'acc0', 'name': 'a', 'access_token': 't', 'is_default': 1, 'is_active': 1})
+    monkeypatch.setattr(requests, 'post', lambda *args, **kwargs: Response())
+    api = MaimaiAPI({}, rate_limiter=PublishRateLimiter(rate_per_minute=0))
+    monkeypatch.setattr(api, '_rate_limit_key', lambda account_id=None: pytest.fail('限流关闭时不应解析账号'))
+
+    assert api.publish_content('title', 'content')['success'] is True
@@ -0,0 +1,122 @@
+import threading
+from datetime import timedelta
+
+import pytest
+
+from modules.database.dao import ScheduledPostDAO
+from modules.database.manager import local_now
+
+
+@pytest.fixture
+def post_dao(db):
+    dao = ScheduledPostDAO()
+    past = local_now() - timedelta(minutes=5)
+    for n in range(6):
+        dao.insert({'id': f'p{n}', 'title': f'post {n}', 'content': f'content {n}', 'status': 'pending',
+                    'scheduled_at': past, 'created_at': past + timedelta(seconds=n)})
+    dao.insert({'id': 'future', 'title': 'future', 'content': 'later', 'status': 'pending',
+                'scheduled_at': local_now() + timedelta(hours=1)})
+    return dao
+
+
+@pytest.fixture
+def schedule_changes():
+    changes = []
+
+    def listener(post_id, scheduled_at):
+        changes.append((post_id, scheduled_at))
+
+    ScheduledPostDAO.add_schedule_listener(listener)
+    yield changes
+    ScheduledPostDAO.remove_schedule_listener(listener)
+
+
+def test_claim_returns_due_posts_in_creation_order(post_dao):
+    claimed = post_dao.claim_due_posts('w1', 10, 600)
+    assert [post['id'] for post in claimed] == [f'p{n}' for n in range(6)]
+    assert all(post['status'] == 'claimed' and post['claimed_by'] == 'w1' for post in claimed)
+    # 认领时不读取内容，访问时按主键加载
+    assert claimed[0]['content'] == 'content 0'
+    assert post_dao.claim_due_posts('w2', 10, 600) == []
+    assert post_dao.get_pending_count() == 7
+
+
+def test_claim_respects_limit(post_dao):
+    first = post_dao.claim_due_posts('w1', 4, 600)
+    second = post_dao.claim_due_posts('w2', 4, 600)
+    assert [post['id'] for post in first] == ['p0', 'p1', 'p2', 'p3']
+    assert [post['id'] for post in second] == ['p4', 'p5']
+
+
+def test_concurrent_claims_are_exclusive(post_dao):
+    results = {}
+    barrier = threading.Barrier(3)
+
+    def claim(worker_id):
+        barrier.wait()
+        results[worker_id] = [post['id'] for post in post_dao.claim_due_posts(worker_id, 10, 600)]
+
+    threads = [threading.Thread(target=claim, args=(f'w{n}',)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    claimed = [post_id for ids in results.values() for post_id in ids]
+    assert sorted(claimed) == [f'p{n}' for n in range(6)]
+    owners = {row['id']: row['claimed_by'] for row in post_dao.find_all({'status': 'claimed'})}
+    for worker_id, ids in results.items():
+        assert all(owners[post_id] == worker_id for post_id in ids)
+
+
+def test_renew_extends_lease_only_for_owner(post_dao, schedule_changes):
+    post = post_dao.claim_due_posts('w1', 1, 60)[0]
+    schedule_changes.clear()
+
+    assert post_dao.renew_claim(post['id'], 'w2', 600) is False
+    assert post_dao.renew_claim(post['id'], 'w1', 600) is True
+    renewed = post_dao.find_by_id(post['id'])
+    assert renewed['lease_until'] > post['lease_until']
+    assert schedule_changes == [(post['id'], renewed['lease_until'])]
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_loses_it(post_dao):
+    post_dao.claim_due_posts('w1', 2, -1)
+
+    reclaimed = post_dao.claim_due_posts('w2', 10, 600)
+    assert [post['id'] for post in reclaimed] == [f'p{n}' for n in range(6)]
+    assert post_dao.renew_claim('p0', 'w1', 600) is False
+    assert post_dao.renew_claim('p0', 'w2', 600) is True
+
+
+def test_release_only_listed_posts_owned_by_worker(post_dao, schedule_changes):
+    post_dao.claim_due_posts('w1', 3, 600)
+    post_dao.claim_due_posts('w2', 3, 600)
+    schedule_changes.clear()
+
+    assert post_dao.release_claims('w1', ['p0', 'p3']) == 1
+    rows = {row['id']: row for row in post_dao.find_all()}
+    assert rows['p0']['status'] == 'pending' and rows['p0']['claimed_by'] is None
+    assert rows['p1']['status'] == 'claimed'
+    assert rows['p3']['claimed_by'] == 'w2'
+    assert schedule_changes == [('p0', rows['p0']['scheduled_at'])]
+    assert post_dao.release_claims('w1', []) == 0
+
+
+def test_failed_and_published_posts_leave_the_schedule(post_dao, schedule_changes):
+    post_dao.claim_due_posts('w1', 2, 600)
+    assert post_dao.mark_as_failed('p0', 'boom') is True
+    assert post_dao.mark_as_published('p1') is True
+
+    failed = post_dao.find_by_id('p0')
+    assert failed['status'] == 'failed' and failed['claimed_by'] is None and failed['lease_until'] is None
+    assert post_dao.find_by_id('p1') is None
+    assert ('p0', None) in schedule_changes and ('p1', None) in schedule_changes
+    assert post_dao.renew_claim('p0', 'w1', 600) is False
+
+
+def test_upcoming_schedule_tracks_claims_at_lease_expiry(post_dao):
+    claimed = post_dao.claim_due_posts('w1', 1, 600)[0]
+    upcoming = dict(post_dao.find_upcoming(10))
+    assert upcoming[claimed['id']] == claimed['lease_until']
+    assert post_dao.next_due_time() == post_dao.find_by_id('p1')['scheduled_at']
@@ -0,0 +1,113 @@
+import pytest
+
+from modules.database.dao import AutoPublishConfigDAO
+from modules.database.write_behind import MAX_FLUSH_ATTEMPTS, WriteBehindQueue, merge_op
+
+
+@pytest.fixture
+def queue(db):
+    """合并窗口足够长的队列：测试中只通过 flush() 写入"""
+    db.write_behind = WriteBehindQueue(db, flush_interval=60)
+    return db.write_behind
+
+
+@pytest.fixture
+def config_dao(db):
+    dao = AutoPublishConfigDAO()
+    dao.insert({'id': 'c1', 'publish_type': 'anonymous', 'prompt_key': 'k', 'current_posts': 0})
+    return dao
+
+
+def test_merge_op():
+    assert merge_op(None, ('add', 1)) == ('add', 1)
+    assert merge_op(('add', 1), ('add', 2)) == ('add', 3)
+    assert merge_op(('set', 5), ('add', 2)) == ('set', 7)
+    assert merge_op(('add', 2), ('set', 'x')) == ('set', 'x')
+
+
+def test_submit_merges_per_row_and_flushes_once(queue, config_dao):
+    for _ in range(3):
+        assert config_dao.increment_retry('c1', 'first') is True
+    config_dao.increment_retry('c1', 'last')
+
+    stats = queue.get_stats()
+    assert stats['pending_rows'] == 1
+    assert stats['merged'] == 3
+    # 写入前读取仍是旧值
+    assert config_dao.find_by_id('c1')['retry_count'] == 0
+
+    assert queue.flush() == 1
+    row = config_dao.find_by_id('c1')
+    assert row['retry_count'] == 4
+    assert row['last_error'] == 'last'
+    assert row['version'] == 4
+    assert queue.get_stats()['statements'] == 1
+
+
+def test_flush_failure_requeues_before_newer_ops(queue, config_dao, db, monkeypatch):
+    config_dao.increment_retry('c1', 'old')
+
+    def fail(statements):
+        raise RuntimeError('database down')
+
+    monkeypatch.setattr(db, 'execute_statements', fail)
+    assert queue.flush() == 0
+    assert queue.get_stats()['failures'] == 1
+    monkeypatch.undo()
+
+    config_dao.increment_retry('c1', 'new')
+    assert queue.flush() == 1
+    row = config_dao.find_by_id('c1')
+    assert row['retry_count'] == 2
+    assert row['last_error'] == 'new'
+
+
+def test_flush_drops_after_max_attempts(queue, config_dao, db, monkeypatch):
+    config_dao.increment_retry('c1', 'lost')
+
+    def fail(statements):
+        raise RuntimeError('database down')
+
+    monkeypatch.setattr(db, 'execute_statements', fail)
+    for _ in range(MAX_FLUSH_ATTEMPTS):
+        queue.flush()
+    stats = queue.get_stats()
+    assert stats['dropped'] == 1
+    assert stats['pending_rows'] == 0
+
+
+def test_execute_now_requeues_pending_ops_on_failure(queue, config_dao, db, monkeypatch):
+    config_dao.increment_posts('c1')
+
+    def fail(sql, params=None):
+        raise RuntimeError('database down')
+
+    monkeypatch.setattr(db, 'execute_update', fail)
+    with pytest.raises(RuntimeError):
+        queue.execute_now('auto_publish_configs', 'c1', {'retry_count': ('add', 1)})
+    monkeypatch.undo()
+
+    # 队列中原有的操作仍在，本次调用的操作由调用方处理
+    assert queue.get_stats()['pending_rows'] == 1
+    assert queue.flush() == 1
+    row = config_dao.find_by_id('c1')
+    assert row['current_posts'] == 1
+    assert row['retry_count'] == 0
+
+
+def test_locking_read_flushes_pending_row_first(queue, config_dao):
+    config_dao.increment_posts('c1')
+    config_dao.increment_posts('c1')
+
+    row = config_dao.find_by_id('c1', for_update=True)
+    assert row['current_posts'] == 2
+    assert queue.get_stats()['pending_rows'] == 0
+
+
+def test_close_flushes_remaining_rows(queue, config_dao):
+    config_dao.increment_posts('c1')
+    queue.close()
+    assert config_dao.find_by_id('c1')['current_posts'] == 1
+    # 关闭后不再排队，直接写入
+    assert config_dao.increment_posts('c1') is True
+    assert config_dao.find_by_id('c1')['current_posts'] == 2